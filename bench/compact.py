@@ -0,0 +1,138 @@
+"""
+紧凑模式（compact=True）精度与内存对比，使用合成数据，可离线运行
+在项目根目录执行：
+    python -m bench.compact
+    python -m bench.compact --symbols 100 --bars 8760
+
+对比项目（float64 为基准）：
+    scan_pairs      协整币对集合是否一致、对冲比率最大相对误差、adf 值最大绝对误差、半衰期最大相对误差
+    rolling_coint   协整标志不一致的k线比例、对冲比率最大绝对误差
+    信号 / 仓位     开平仓信号、仓位不一致的k线数
+    资金曲线        期末净值最大相对误差
+    峰值内存        tracemalloc 统计的 numpy 分配峰值（MB），即单个 worker 的额外内存
+
+float32 有效数字约 7 位：价格、残差本身的舍入误差约 1e-7 量级，回归累加和、adf 正规方程为 float64，
+因此对冲比率、adf 值的误差远小于判定阈值附近的统计波动；协整标志、信号只在 p_value 或 z-score 恰好
+贴近阈值的k线上可能翻转，翻转比例应在千分之一量级以内
+"""
+import argparse
+import sys
+import tracemalloc
+import warnings
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from bench.run import pick_pairs
+from bench.synth import make_market
+from program.analyse import scan_pairs
+from program.common import cal_spread
+from program.compact import compact_data, compact_signals, memory_mb
+from program.curve import cal_pair_equity_curve
+from program.function import cal_zscore, cal_signal, cal_position
+from program.rolling import rolling_coint
+
+
+def peak_mb(func: Callable) -> Tuple[object, float]:
+    """
+    函数执行期间新分配内存的峰值（MB）
+    """
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak / 2 ** 20
+
+
+def _max_rel(a, b) -> float:
+    a, b = np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rel = np.abs(a - b) / np.abs(a)
+    rel = rel[np.isfinite(rel)]
+    return float(rel.max()) if rel.size else 0.0
+
+
+def check_scan(prices: pd.DataFrame) -> Dict:
+    """
+    矩阵化扫描：float64 与 compact 的结果、峰值内存
+    """
+    (full, _), full_mb = peak_mb(lambda: scan_pairs(prices))
+    (small, _), small_mb = peak_mb(lambda: scan_pairs(prices.astype(np.float32), compact=True))
+    key = ['base', 'target']
+    both = full.merge(small, on=key, suffixes=('', '_c'))
+    return {
+        'pairs_float64': len(full),
+        'pairs_compact': len(small),
+        'pairs_diff': len(full) + len(small) - 2 * len(both),
+        'hedge_ratio_rel': _max_rel(both['hedge_ratio'], both['hedge_ratio_c']),
+        'adf_abs': float((both['adf_statistic'] - both['adf_statistic_c']).abs().max()) if len(both) else 0.0,
+        'half_life_rel': _max_rel(both['half_life'], both['half_life_c']),
+        'peak_mb_float64': full_mb,
+        'peak_mb_compact': small_mb,
+    }
+
+
+def _chain(base: pd.DataFrame, target: pd.DataFrame, back_hour: int, window: int, compact: bool):
+    coint_list, h_ratio_list, _ = rolling_coint(base['close'], target['close'], back_hour, fast=True,
+                                                compact=compact)
+    spread = cal_spread(base['close'], target['close'], hedge_ratio=h_ratio_list)
+    signal = cal_signal(cal_zscore(spread, window), coint_list, 2, -2)
+    if compact:
+        signal = compact_signals(signal)
+    position = cal_position(signal, compact=compact)
+    curve = cal_pair_equity_curve(base, target, position.fillna(0).to_numpy(), leverage_rate=2)
+    return coint_list, h_ratio_list, signal, position, curve
+
+
+def check_pair(base: pd.DataFrame, target: pd.DataFrame, base_c: pd.DataFrame, target_c: pd.DataFrame,
+               back_hour: int, window: int) -> Dict:
+    """
+    单币对完整流程：float64 与 compact 的逐项差异、峰值内存
+    """
+    full, full_mb = peak_mb(lambda: _chain(base, target, back_hour, window, False))
+    small, small_mb = peak_mb(lambda: _chain(base_c, target_c, back_hour, window, True))
+    (coint, h_ratio, signal, position, curve), (coint_c, h_ratio_c, signal_c, position_c, curve_c) = full, small
+    return {
+        'coint_flip': float((coint.to_numpy() != coint_c.to_numpy()).mean()),
+        'hedge_ratio_abs': float(np.nanmax(np.abs(h_ratio.to_numpy() - h_ratio_c.to_numpy()))),
+        'signal_diff': int((signal.fillna(False).astype(bool).to_numpy() != signal_c.astype(bool).to_numpy()).sum()),
+        'position_diff': int((position.fillna(0).to_numpy() != position_c.to_numpy()).sum()),
+        'equity_rel': abs(curve[-1] / curve_c[-1] - 1),
+        'peak_mb_float64': full_mb,
+        'peak_mb_compact': small_mb,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='compact mode accuracy / memory check on synthetic data')
+    parser.add_argument('--symbols', type=int, default=40)
+    parser.add_argument('--bars', type=int, default=24 * 60)
+    parser.add_argument('--pairs', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    warnings.simplefilter('ignore')
+    pd.set_option('display.expand_frame_repr', False)
+
+    data = make_market(n_symbols=args.symbols, n_bars=args.bars, n_gap=0, n_nan=0, n_late=0, seed=args.seed)
+    data_c = compact_data(data)
+    print(f'data {memory_mb(data):.1f}MB -> compact {memory_mb(data_c):.1f}MB')
+    cols = ['open', 'high', 'low', 'close']
+
+    prices = pd.DataFrame({symbol: df['close'] for symbol, df in data.items()})
+    print('scan_pairs')
+    print(pd.Series(check_scan(prices)).to_string())
+
+    back_hour = min(24 * 30, args.bars // 3)
+    window = min(168, args.bars // 10)
+    rows = {f'{a}/{b}': check_pair(data[a][cols], data[b][cols], data_c[a][cols], data_c[b][cols], back_hour, window)
+            for a, b in pick_pairs(sorted(data), args.pairs)}
+    print('pair chain')
+    print(pd.DataFrame(rows).T)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
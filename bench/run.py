@@ -0,0 +1,200 @@
+"""
+性能基准，使用合成数据，不依赖 config.py 中的数据目录，可离线运行
+在项目根目录执行：
+    python -m bench.run                                 # 全部规模
+    python -m bench.run --sizes small --save            # 保存为基线
+    python -m bench.run --compare                       # 与基线比较，变慢超过容差时返回非 0
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+import warnings
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from bench.synth import make_market
+from program.analyse import process_pair, scan_pairs
+from program.common import build_index, cal_spread, extract_col, extract_cols
+from program.curve import cal_equity_curve, merge_curve
+from program.evaluate import cal_evaluate
+from program.function import cal_zscore, cal_signal, cal_position, invert_position
+from program.hedge import recursive_hedge
+from program.resample import resample_ohlc
+from program.significance import block_bootstrap, curve_returns
+from program.rolling import rolling_coint, rolling_reversion
+
+# 规模名称 -> (币种数, 逐币对环节的币对数, k 线数)；批量扫描使用全部币种两两组合
+SIZES = {
+    'small': (20, 4, 24 * 30),
+    'medium': (50, 8, 24 * 90),
+    'large': (100, 8, 24 * 365),
+}
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+COLS = ['candle_begin_time', 'open', 'high', 'low', 'close']
+
+
+def timeit(func: Callable, repeat: int) -> float:
+    """
+    重复 repeat 次取最短耗时，屏蔽各环节的 print 输出
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            begin = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - begin)
+    return best
+
+
+def pick_pairs(symbols: List[str], n_pairs: int) -> List[Tuple[str, str]]:
+    """
+    交替选取协整组内币对与组间币对，同时覆盖通过和淘汰两条路径
+    """
+    inside = [(symbols[i], symbols[i + 1]) for i in range(0, min(len(symbols), 20) - 1, 2)]
+    across = [(symbols[i], symbols[-1 - i]) for i in range(len(symbols) // 2)]
+    pairs = [pair for pair in itertools.chain(*itertools.zip_longest(inside, across)) if pair is not None]
+    return pairs[:n_pairs]
+
+
+def playback(base: pd.DataFrame, target: pd.DataFrame, back_hour: int, window: int) -> pd.DataFrame:
+    """
+    单币对完整回测，流程同 script/playback.py
+    """
+    coint_list, h_ratio_list, _ = rolling_coint(base['close'], target['close'], back_hour, fast=True)
+    spread = cal_spread(base['close'], target['close'], hedge_ratio=h_ratio_list)
+    signal = cal_signal(cal_zscore(spread, window), coint_list, 2, -2)
+    target_pos = cal_position(signal)
+    base, target = base.copy(), target.copy()
+    target['pos'] = target_pos
+    base['pos'] = invert_position(target_pos)
+    df1 = cal_equity_curve(base, leverage_rate=2)
+    df2 = cal_equity_curve(target, leverage_rate=2)
+    equity_curve = merge_curve(df1['equity_curve'], df2['equity_curve'], base['candle_begin_time'], 1, 1)
+    return cal_evaluate(equity_curve)
+
+
+def run_size(name: str, n_symbols: int, n_pairs: int, n_bars: int, repeat: int, seed: int) -> Dict[str, float]:
+    """
+    一个规模下各环节耗时（秒），逐币对环节为全部币对的总耗时
+    """
+    data = make_market(n_symbols=n_symbols, n_bars=n_bars, seed=seed)
+    start_time, end_time = data['S000-USDT']['candle_begin_time'].iloc[[0, -1]]
+    back_hour = min(24 * 30, n_bars // 3)
+    window = min(168, n_bars // 10)
+    bars = {symbol: extract_cols(data[symbol], COLS, start_time, end_time) for symbol in data}
+    # 有缺陷的币种（缺k线、空值、晚上市）只用于 extract、scan_pairs 环节，不参与逐币对环节
+    pairs = pick_pairs(sorted(symbol for symbol, df in bars.items() if df is not None and len(df) == n_bars), n_pairs)
+
+    # 后续环节的输入：信号、仓位、资金曲线，不计时
+    signals, spreads, positions, curves = [], [], [], []
+    for a, b in pairs:
+        coint_list, h_ratio_list, _ = rolling_coint(bars[a]['close'], bars[b]['close'], back_hour, fast=True)
+        spread = cal_spread(bars[a]['close'], bars[b]['close'], hedge_ratio=h_ratio_list)
+        signal = cal_signal(cal_zscore(spread, window), coint_list, 2, -2)
+        signals.append(signal)
+        spreads.append(spread)
+        df = bars[b].copy()
+        df['pos'] = cal_position(signal)
+        positions.append(df)
+        curves.append(cal_equity_curve(df.copy(), leverage_rate=2)[['candle_begin_time', 'equity_curve']])
+
+    index = build_index(data)
+    closes = {symbol: extract_col(index[symbol], 'close', start_time, end_time) for symbol in data}
+    complete = pd.DataFrame({symbol: s for symbol, s in closes.items() if s is not None and s.size == n_bars})
+
+    stages = {
+        'extract': lambda: [extract_cols(data[symbol], COLS, start_time, end_time) for symbol in data],
+        'extract_index': lambda: [extract_cols(index[symbol], COLS, start_time, end_time) for symbol in data],
+        'resample': lambda: [resample_ohlc(data[symbol], '4h') for symbol in data],
+        'process_pair': lambda: [process_pair((a, b, bars[a]['close'], bars[b]['close'])) for a, b in pairs],
+        'rolling_coint': lambda: [rolling_coint(bars[a]['close'], bars[b]['close'], back_hour, fast=True)
+                                  for a, b in pairs],
+        'rolling_coint_refit': lambda: [rolling_coint(bars[a]['close'], bars[b]['close'], back_hour, fast=True,
+                                                      refit_every=24) for a, b in pairs],
+        'recursive_hedge': lambda: [recursive_hedge(np.stack([bars[a]['close'] for a, _ in pairs]),
+                                                    np.stack([bars[b]['close'] for _, b in pairs]), back_hour, method)
+                                    for method in ('rls', 'kalman')],
+        'rolling_reversion': lambda: [rolling_reversion(spread, window) for spread in spreads],
+        'cal_position': lambda: [cal_position(signal) for signal in signals],
+        'cal_equity_curve': lambda: [cal_equity_curve(df.copy(), leverage_rate=2) for df in positions],
+        'cal_evaluate': lambda: [cal_evaluate(curve) for curve in curves],
+        'block_bootstrap': lambda: [block_bootstrap(curve_returns(curve['equity_curve']), 1000) for curve in curves],
+        'playback': lambda: [playback(bars[a], bars[b], back_hour, window) for a, b in pairs],
+        'scan_pairs': lambda: scan_pairs(complete),
+    }
+    results = {}
+    for stage, func in stages.items():
+        results[f'{name}/{stage}'] = timeit(func, repeat)
+        print(f'{name:<8}{stage:<18}{results[f"{name}/{stage}"]:>10.4f}s', flush=True)
+    return results
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], tolerance: float) -> List[str]:
+    """
+    与基线逐项比较
+    :return: 变慢超过容差的项目
+    """
+    slower = []
+    print(f'{"benchmark":<30}{"baseline":>10}{"current":>10}{"ratio":>8}')
+    for key, value in results.items():
+        if key not in baseline:
+            continue
+        ratio = value / baseline[key] if baseline[key] > 0 else float('inf')
+        flag = ''
+        if ratio > 1 + tolerance:
+            slower.append(key)
+            flag = '  SLOWER'
+        print(f'{key:<30}{baseline[key]:>10.4f}{value:>10.4f}{ratio:>8.2f}{flag}')
+    return slower
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='pipeline benchmarks on synthetic data')
+    parser.add_argument('--sizes', nargs='+', default=list(SIZES), choices=list(SIZES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', nargs='?', const=BASELINE_PATH, help='保存结果为基线 json')
+    parser.add_argument('--compare', nargs='?', const=BASELINE_PATH, help='与基线 json 比较')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='允许变慢的比例')
+    args = parser.parse_args(argv)
+    warnings.simplefilter('ignore')
+
+    results = {}
+    for name in args.sizes:
+        results.update(run_size(name, *SIZES[name], repeat=args.repeat, seed=args.seed))
+
+    report = {
+        'meta': {
+            'time': pd.Timestamp.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeat': args.repeat,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f'saved {args.save}')
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(results, baseline['results'], args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,65 @@
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+
+def make_market(n_symbols: int = 50, n_bars: int = 24 * 30, n_clusters: int = 5, cluster_size: int = 4,
+                n_gap: int = 1, n_nan: int = 1, n_late: int = 1, seed: int = 0,
+                start_time: str = '2024-01-01') -> Dict[str, pd.DataFrame]:
+    """
+    生成合成的 1 小时 k 线，结构与 swap_dict.pkl 相同，用于离线测试和性能测试
+    前 n_clusters * cluster_size 个币种分为若干组，组内共享一条随机游走趋势、叠加平稳 AR(1) 噪声，组内两两协整；
+    其余币种为独立随机游走
+    :param n_symbols: 币种数
+    :param n_bars: k 线数
+    :param n_clusters: 协整组数
+    :param cluster_size: 每组币种数
+    :param n_gap: 中间缺失一段 k 线的币种数
+    :param n_nan: 收盘价含空值的币种数
+    :param n_late: 晚于 start_time 上市的币种数
+    :param seed: 随机种子，相同参数生成的数据完全一致
+    :param start_time: 第一根 k 线时间
+    :return: {symbol: DataFrame}，含 candle_begin_time open high low close volume symbol
+    """
+    rng = np.random.default_rng(seed)
+    times = pd.date_range(start_time, periods=n_bars, freq='h')
+    trends = np.cumsum(rng.normal(0, 0.01, (n_clusters, n_bars)), axis=1)
+    n_cluster_symbols = min(n_clusters * cluster_size, n_symbols)
+
+    # 对数价格
+    log_price = np.cumsum(rng.normal(0, 0.01, (n_symbols, n_bars)), axis=1)
+    if n_cluster_symbols:
+        cluster = np.arange(n_cluster_symbols) // cluster_size
+        noise = rng.normal(0, 0.005, (n_cluster_symbols, n_bars))
+        # AR(1)，系数 0.9
+        ar = np.zeros_like(noise)
+        for i in range(1, n_bars):
+            ar[:, i] = 0.9 * ar[:, i - 1] + noise[:, i]
+        loading = rng.uniform(0.5, 1.5, (n_cluster_symbols, 1))
+        log_price[:n_cluster_symbols] = trends[cluster] * loading + ar
+    close = np.exp(log_price) * rng.uniform(0.1, 100, (n_symbols, 1))
+    open_ = np.concatenate((close[:, :1], close[:, :-1]), axis=1)
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.003, close.shape))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.003, close.shape))
+    volume = rng.uniform(1, 1000, close.shape)
+
+    # 数据缺陷放在末尾的非协整币种上，协整组保持完整
+    special = np.arange(n_symbols)[n_cluster_symbols:][::-1]
+    gap, nan, late = (set(special[:n_gap]), set(special[n_gap:n_gap + n_nan]),
+                      set(special[n_gap + n_nan:n_gap + n_nan + n_late]))
+
+    data = {}
+    for s in range(n_symbols):
+        symbol = f'S{s:03d}-USDT'
+        df = pd.DataFrame({'candle_begin_time': times, 'open': open_[s], 'high': high[s], 'low': low[s],
+                           'close': close[s], 'volume': volume[s], 'symbol': symbol})
+        if s in gap:
+            lo = int(rng.integers(n_bars // 4, n_bars // 2))
+            df = df.drop(index=range(lo, lo + max(n_bars // 100, 1)))
+        if s in nan:
+            df.loc[rng.choice(n_bars, max(n_bars // 500, 1), replace=False), 'close'] = np.nan
+        if s in late:
+            df = df.iloc[n_bars // 3:]
+        data[symbol] = df.reset_index(drop=True)
+    return data
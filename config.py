@@ -2,6 +2,10 @@ import os.path
 
 pre_data_path = r'D:\coin-binance-spot-swap-preprocess-pkl-1h-2025-01-19'
 swap_path = os.path.join(pre_data_path, 'swap_dict.pkl')
+# swap_dict.pkl 转换后的列式存储，见 tools/2_生成列式存储.py
+store_path = os.path.join(pre_data_path, 'swap_store')
 root_path = os.path.abspath(os.path.dirname(__file__))
 min_qty_path = os.path.join(root_path, 'data', '最小下单量.csv')
 plot_path = os.path.join(root_path, 'data', 'graph')
+# 协整计算结果缓存
+cache_path = os.path.join(root_path, 'data', 'cache.sqlite')
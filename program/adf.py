@@ -0,0 +1,175 @@
+from typing import Tuple
+
+import numpy as np
+from scipy.special import ndtr
+
+from program import metrics
+
+# MacKinnon(1994) p_value 近似系数，仅常数项回归、N=1，与 statsmodels.tsa.adfvalues 一致
+_TAU_MAX = 2.74
+_TAU_MIN = -18.83
+_TAU_STAR = -1.61
+_TAU_SMALLP = np.array([2.1659, 1.4412, 0.038269])
+_TAU_LARGEP = np.array([1.7339, 0.93202, -0.12745, -0.010368])
+# MacKinnon(2010) 5% 临界值系数，crit = c0 + c1 / nobs + c2 / nobs² + c3 / nobs³
+_CRIT_5 = np.array([-2.86154, -2.8903, -4.234, -40.04])
+
+
+def adf_maxlag(n: int) -> int:
+    """
+    adfuller 默认最大滞后阶数（Schwert 1989）
+    :param n: 序列长度
+    :return: 最大滞后阶数
+    """
+    maxlag = int(np.ceil(12.0 * np.power(n / 100.0, 1 / 4.0)))
+    return min(n // 2 - 2, maxlag)
+
+
+def mackinnon_p(adf_stat: np.ndarray) -> np.ndarray:
+    """
+    MacKinnon 近似 p_value，向量化
+    :param adf_stat: adf 值
+    :return: p_value
+    """
+    adf_stat = np.asarray(adf_stat, dtype=np.float64)
+    small = np.polyval(_TAU_SMALLP[::-1], adf_stat)
+    large = np.polyval(_TAU_LARGEP[::-1], adf_stat)
+    p_value = ndtr(np.where(adf_stat <= _TAU_STAR, small, large))
+    p_value = np.where(adf_stat > _TAU_MAX, 1.0, p_value)
+    p_value = np.where(adf_stat < _TAU_MIN, 0.0, p_value)
+    return p_value
+
+
+def mackinnon_crit_5(nobs) -> np.ndarray:
+    """
+    5% 临界值
+    :param nobs: adf 回归样本数
+    :return: 临界值
+    """
+    return np.polyval(_CRIT_5[::-1], 1.0 / np.asarray(nobs, dtype=np.float64))
+
+
+def _gram(x: np.ndarray, lag: int, nobs: int, block: int = 32) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    构造 adf 回归 Δx_t = c + γ x_t + Σ β_j Δx_(t-j) 的正规方程
+    :param x: (B, n) 序列，float32 时设计矩阵同为 float32，按 block 个样本分段转为 float64 累加
+    :param lag: 差分滞后阶数
+    :param nobs: 回归样本数，取最后 nobs 个差分
+    :param block: float32 输入每段样本数
+    :return: X'X (B, k, k)、X'y (B, k)、y'y (B,)，均为 float64，列顺序为 常数、水平值、各阶差分
+    """
+    dx = np.diff(x, axis=1)
+    m = dx.shape[1]
+    y = dx[:, m - nobs:]
+    z = np.empty((x.shape[0], nobs, lag + 2), dtype=x.dtype)
+    z[:, :, 0] = 1.0
+    z[:, :, 1] = x[:, m - nobs:m]
+    for j in range(1, lag + 1):
+        z[:, :, j + 1] = dx[:, m - nobs - j:m - j]
+    if x.dtype == np.float64:
+        zt = z.transpose(0, 2, 1)
+        return zt @ z, (zt @ y[:, :, None])[:, :, 0], (y * y).sum(axis=1)
+    xtx = np.zeros((x.shape[0], lag + 2, lag + 2), dtype=np.float64)
+    xty = np.zeros((x.shape[0], lag + 2), dtype=np.float64)
+    for start in range(0, nobs, block):
+        zb = z[:, start:start + block].astype(np.float64)
+        yb = y[:, start:start + block].astype(np.float64)
+        zt = zb.transpose(0, 2, 1)
+        xtx += zt @ zb
+        xty += (zt @ yb[:, :, None])[:, :, 0]
+    return xtx, xty, (y * y).sum(axis=1, dtype=np.float64)
+
+
+def _solve(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    批量求解线性方程组，奇异矩阵退化为伪逆
+    """
+    try:
+        return np.linalg.solve(a, b[..., None])[..., 0]
+    except np.linalg.LinAlgError:
+        return (np.linalg.pinv(a) @ b[..., None])[..., 0]
+
+
+def _adf_chunk(x: np.ndarray, maxlag: int, autolag: str | None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    一块窗口的 adf 值与所用滞后阶数
+    """
+    n_batch, n = x.shape
+    m = n - 1
+    if autolag is None:
+        used_lag = np.full(n_batch, maxlag, dtype=np.int64)
+    else:
+        # 与 adfuller 一致：各阶数使用相同的样本数以便比较 AIC
+        nobs = m - maxlag
+        xtx, xty, yty = _gram(x, maxlag, nobs)
+        aic = np.empty((n_batch, maxlag + 1), dtype=np.float64)
+        for lag in range(maxlag + 1):
+            k = lag + 2
+            beta = _solve(xtx[:, :k, :k], xty[:, :k])
+            ssr = yty - (beta * xty[:, :k]).sum(axis=1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                aic[:, lag] = nobs * (np.log(2 * np.pi * ssr / nobs) + 1) + 2 * k
+        used_lag = np.argmin(np.where(np.isnan(aic), np.inf, aic), axis=1)
+
+    adf_stat = np.empty(n_batch, dtype=np.float64)
+    # 按所选阶数分组，在各自的样本上重新回归
+    for lag in np.unique(used_lag):
+        idx = np.flatnonzero(used_lag == lag)
+        nobs = m - lag
+        k = lag + 2
+        xtx, xty, yty = _gram(x[idx], lag, nobs)
+        beta = _solve(xtx, xty)
+        ssr = yty - (beta * xty).sum(axis=1)
+        e1 = np.zeros((len(idx), k), dtype=np.float64)
+        e1[:, 1] = 1.0
+        inv11 = _solve(xtx, e1)[:, 1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            adf_stat[idx] = beta[:, 1] / np.sqrt(ssr / (nobs - k) * inv11)
+    return adf_stat, used_lag
+
+
+@metrics.timed('adf')
+def adf_batch(windows, maxlag: int | None = None, autolag: str | None = 'AIC',
+              chunk: int = 256) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    批量 adf 检验（常数项回归），等价于逐行调用 adfuller(row, maxlag, autolag=autolag)
+    :param windows: (B, n) 残差窗口矩阵，可以是一个币对的全部窗口，也可以是多个币对的同一窗口；
+                    float32 矩阵不转换，设计矩阵为 float32、正规方程以 float64 累加
+    :param maxlag: 最大滞后阶数，默认与 adfuller 相同
+    :param autolag: 'AIC' 按 AIC 选择阶数；None 为固定阶数 maxlag
+    :param chunk: 每块窗口数，控制内存
+    :return: adf值、p_value、5%临界值、所用滞后阶数
+    """
+    windows = np.atleast_2d(np.asarray(windows))
+    if windows.dtype not in (np.float32, np.float64):
+        windows = windows.astype(np.float64)
+    n_batch, n = windows.shape
+    if maxlag is None:
+        maxlag = adf_maxlag(n)
+    if autolag is not None and autolag.lower() != 'aic':
+        raise ValueError(f'autolag {autolag} not supported')
+    if maxlag < 0 or maxlag > n // 2 - 2:
+        raise ValueError(f'maxlag {maxlag} invalid for window {n}')
+
+    adf_stat = np.empty(n_batch, dtype=np.float64)
+    used_lag = np.empty(n_batch, dtype=np.int64)
+    for start in range(0, n_batch, chunk):
+        stop = start + chunk
+        adf_stat[start:stop], used_lag[start:stop] = _adf_chunk(windows[start:stop], maxlag, autolag)
+    # 常数序列 adfuller 会报错，此处置为 nan
+    adf_stat[np.ptp(windows, axis=1) == 0] = np.nan
+    p_value = mackinnon_p(adf_stat)
+    crit_5 = mackinnon_crit_5(n - 1 - used_lag)
+    return adf_stat, p_value, crit_5, used_lag
+
+
+def adf_coint_batch(windows, maxlag: int | None = None, autolag: str | None = 'AIC') -> np.ndarray:
+    """
+    批量协整判断，规则与 rolling.adf_coint 相同：p_value < 0.05 且 adf 值小于 5% 临界值
+    :param windows: (B, n) 残差窗口矩阵
+    :param maxlag: 最大滞后阶数
+    :param autolag: 'AIC' 或 None
+    :return: (B,) 布尔数组
+    """
+    adf_stat, p_value, crit_5, _ = adf_batch(windows, maxlag, autolag)
+    return (p_value < 0.05) & (adf_stat < crit_5)
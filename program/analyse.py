@@ -1,13 +1,18 @@
-from typing import Dict
+from typing import Dict, Tuple
 
 import numpy as np
 import pandas as pd
 from statsmodels.tsa.stattools import adfuller
-from scipy.stats import spearmanr
+from scipy.stats import spearmanr, rankdata, t as t_dist
 
 import statsmodels.api as sm
 
+from program import metrics
+from program.adf import adf_batch
+from program.cache import ResultCache, data_hash
 from program.common import cal_spread
+from program.compact import PRICE_DTYPE
+from program.panel import PricePanel
 
 
 def cal_cointegration(base: pd.Series, target: pd.Series) -> Dict:
@@ -19,20 +24,23 @@ def cal_cointegration(base: pd.Series, target: pd.Series) -> Dict:
     """
     # 回归分析
     # 添加常数项
-    X = sm.add_constant(base)
-    # 拟合线性回归模型
-    model = sm.OLS(target, X).fit()
-    # 获取残差
-    residuals = model.resid
+    with metrics.stage('ols'):
+        X = sm.add_constant(base)
+        # 拟合线性回归模型
+        model = sm.OLS(target, X).fit()
+        # 获取残差
+        residuals = model.resid
 
     # 残差平稳性检验 (ADF 检验)
-    adf_result = adfuller(residuals, autolag='AIC')
+    with metrics.stage('adf'):
+        adf_result = adfuller(residuals, autolag='AIC')
     # 提取 ADF 检验结果，adf_statistic
     adf_statistic = adf_result[0]
     p_value = adf_result[1]
     # 判断是否协整 (通常 p-value < 0.05 表示残差平稳，即协整)
     is_coint = p_value < 0.05
-    corr, p_value = spearmanr(base, target)
+    with metrics.stage('spearman'):
+        corr, p_value = spearmanr(base, target)
     # 返回结果
     return {
         'is_coint': is_coint,
@@ -54,6 +62,7 @@ def cal_zero_crossings(spread: pd.Series) -> int:
     return zero_crossings
 
 
+@metrics.timed('half_life')
 def cal_half_life(spread: pd.Series) -> float:
     """
     半衰期计算，波峰波谷回到0轴的平均时间
@@ -74,20 +83,15 @@ def cal_half_life(spread: pd.Series) -> float:
     return round(half_life, 5)
 
 
-def process_pair(args):
+def _process_pair(symbol1, symbol2, base, target) -> Tuple[str, dict | None]:
     """
-    币对协整分析
-    :param args: symbol1, symbol2, base, target，两个价格序列
-    :return: 协整则返回 p_value、zero-crossing、半衰期，否则返回None
+    币对协整分析，返回结果及其分类，计数交给调用方，缓存命中时也能按分类计数
+    :return: (spearman / coint / not_coint, process_pair 的返回值)
     """
-    symbol1, symbol2, base, target = args
-    if base is None or target is None or base.size != target.size:
-        print(f'--{symbol1} {symbol2} skip')
-        return None
-    corr, p_value = spearmanr(base, target)
+    with metrics.stage('spearman'):
+        corr, p_value = spearmanr(base, target)
     if p_value > 0.05:
-        print(f'{symbol1} {symbol2} spearman p_value > 0.05')
-        return None
+        return 'spearman', None
     summary = cal_cointegration(base, target)
     if summary['is_coint']:
         summary['base'] = symbol1
@@ -96,7 +100,153 @@ def process_pair(args):
         summary['zero_crossings'] = cal_zero_crossings(spread)
         summary['half_life'] = cal_half_life(spread)
         summary['spearman'] = round(corr, 3)
-        print(f'{symbol1} {symbol2} coint')
-        return summary
-    print(f'--{symbol1} {symbol2} not coint')
-    return None
+        return 'coint', summary
+    return 'not_coint', None
+
+
+def process_pair(args, cache: ResultCache | None = None):
+    """
+    币对协整分析
+    :param args: symbol1, symbol2, base, target，两个价格序列
+    :param cache: 结果缓存，币对与价格序列内容都相同时直接返回上次结果；
+                  分类与结果一起缓存，命中时照常计数 spearman / coint / not_coint，另计 cache_hit
+    :return: 协整则返回 p_value、zero-crossing、半衰期，否则返回None
+    """
+    symbol1, symbol2, base, target = args
+    if base is None or target is None or base.size != target.size:
+        metrics.count('process_pair', 'skip')
+        return None
+    if cache is None:
+        outcome, result = _process_pair(symbol1, symbol2, base, target)
+    else:
+        key = data_hash('process_pair_outcome', symbol1, symbol2, base, target)
+        found, value = cache.get(key)
+        if found:
+            metrics.count('process_pair', 'cache_hit')
+        else:
+            value = _process_pair(symbol1, symbol2, base, target)
+            cache.set(key, value)
+        outcome, result = value
+    metrics.count('process_pair', outcome)
+    return result
+
+
+def process_pair_panel(args, cache: ResultCache | None = None):
+    """
+    共享价格矩阵版本的 process_pair，价格序列从 PricePanel 读取，任务参数只有币种下标
+    :param args: symbol1, symbol2, panel_name, i, j
+    :param cache: 结果缓存
+    :return: 同 process_pair
+    """
+    symbol1, symbol2, name, i, j = args
+    panel = PricePanel.attach(name)
+    return process_pair((symbol1, symbol2, panel.series(i), panel.series(j)), cache)
+
+
+@metrics.timed('spearman')
+def cal_spearman_matrix(prices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    全部币种的 spearman 相关系数矩阵及 p_value，与逐对 spearmanr 一致
+    :param prices: (T, S) 价格矩阵，每列一个币种
+    :return: (S, S) 相关系数、(S, S) p_value
+    """
+    n = prices.shape[0]
+    ranks = rankdata(prices, axis=0)
+    corr = np.corrcoef(ranks, rowvar=False)
+    dof = n - 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t_stat = corr * np.sqrt(dof / ((corr + 1.0) * (1.0 - corr)))
+    p_value = 2 * t_dist.sf(np.abs(t_stat), dof)
+    return corr, p_value
+
+
+def scan_pairs(prices: pd.DataFrame, chunk: int = 2048, cache: ResultCache | None = None,
+               compact: bool = False) -> Tuple[pd.DataFrame, Dict]:
+    """
+    矩阵化批量协整分析，结果与逐对 process_pair 一致
+    逐级淘汰：spearman 显著性 -> adf 检验，昂贵的 adf 只在前一级的幸存者上批量计算
+    :param prices: 价格矩阵，每列一个币种，均完整覆盖同一时间区间且无空值
+    :param chunk: 每批 adf 检验的币对数，控制内存
+    :param cache: 结果缓存，价格矩阵内容相同时直接返回上次结果
+    :param compact: True 时价格矩阵、残差块、价差矩阵为 float32（峰值内存约减半），
+                    协方差、adf 正规方程、半衰期回归仍为 float64，精度对比见 bench/compact.py
+    :return: 协整币对（列同 process_pair 的 summary）、各级淘汰数量
+    """
+    if cache is not None:
+        key = data_hash('scan_pairs_compact' if compact else 'scan_pairs', list(prices.columns),
+                        prices.to_numpy(dtype=np.float64))
+        return cache.get_or_compute(key, lambda: scan_pairs(prices, chunk, compact=compact))
+    symbols = list(prices.columns)
+    dtype = PRICE_DTYPE if compact else np.float64
+    values = prices.to_numpy(dtype=dtype)
+    base_idx, target_idx = np.triu_indices(len(symbols), 1)
+    stats = {'pairs': len(base_idx)}
+
+    # 第一级：spearman 相关性显著
+    corr, corr_p = cal_spearman_matrix(values)
+    keep = corr_p[base_idx, target_idx] <= 0.05
+    stats['spearman'] = int((~keep).sum())
+    base_idx, target_idx = base_idx[keep], target_idx[keep]
+
+    # 对冲比率、截距由协方差矩阵得到：h = cov(x, y) / var(x)
+    with metrics.stage('ols'):
+        mean = values.mean(axis=0, dtype=np.float64)
+        cov = np.cov(values, rowvar=False)
+        hedge_ratio = cov[base_idx, target_idx] / cov[base_idx, base_idx]
+        intercept = mean[target_idx] - hedge_ratio * mean[base_idx]
+
+    # 第二级：残差 adf 检验，分块批量计算
+    adf_stat = np.empty(len(base_idx), dtype=np.float64)
+    adf_p = np.empty(len(base_idx), dtype=np.float64)
+    for start in range(0, len(base_idx), chunk):
+        stop = start + chunk
+        residuals = (values[:, target_idx[start:stop]] - intercept[start:stop].astype(dtype) -
+                     hedge_ratio[start:stop].astype(dtype) * values[:, base_idx[start:stop]]).T
+        adf_stat[start:stop], adf_p[start:stop], _, _ = adf_batch(residuals)
+    keep = adf_p < 0.05
+    stats['not_coint'] = int((~keep).sum())
+    stats['coint'] = int(keep.sum())
+    for reason in ('spearman', 'not_coint', 'coint'):
+        metrics.count('scan_pairs', reason, stats[reason])
+    base_idx, target_idx = base_idx[keep], target_idx[keep]
+    adf_stat, hedge_ratio, intercept = adf_stat[keep], hedge_ratio[keep], intercept[keep]
+    pair_corr = corr[base_idx, target_idx]
+    pair_p = corr_p[base_idx, target_idx]
+
+    # 协整币对的价差统计，价差使用取整后的对冲比率，与 process_pair 一致
+    h_round = np.round(hedge_ratio, 5)
+    with metrics.stage('spread_zscore'):
+        spread = (values[:, target_idx] - h_round.astype(dtype) * values[:, base_idx]).T
+    zero_crossings = np.count_nonzero(np.diff(np.sign(spread), axis=1), axis=1)
+    half_life = cal_half_life_batch(spread)
+
+    df = pd.DataFrame({
+        'is_coint': np.ones(len(base_idx), dtype=bool),
+        'adf_statistic': adf_stat,
+        'p_value': np.round(pair_p, 5),
+        'hedge_ratio': h_round,
+        'intercept': np.round(intercept, 5),
+        'corr': pair_corr,
+        'base': np.array(symbols, dtype=object)[base_idx],
+        'target': np.array(symbols, dtype=object)[target_idx],
+        'zero_crossings': zero_crossings,
+        'half_life': np.round(half_life, 5),
+        'spearman': np.round(pair_corr, 3),
+    })
+    return df, stats
+
+
+@metrics.timed('half_life')
+def cal_half_life_batch(spread: np.ndarray) -> np.ndarray:
+    """
+    批量半衰期计算，Δs_t 对 s_(t-1) 回归的闭式解，与 cal_half_life 一致
+    :param spread: (B, T) 价差矩阵，float32 时逐元素运算保持 float32，求和以 float64 累加
+    :return: (B,) 半衰期
+    """
+    lagged = spread[:, :-1]
+    delta = np.diff(spread, axis=1)
+    lagged = lagged - lagged.mean(axis=1, keepdims=True, dtype=np.float64).astype(spread.dtype)
+    delta = delta - delta.mean(axis=1, keepdims=True, dtype=np.float64).astype(spread.dtype)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        beta = (lagged * delta).sum(axis=1, dtype=np.float64) / (lagged * lagged).sum(axis=1, dtype=np.float64)
+        return -np.log(2) / beta
@@ -0,0 +1,88 @@
+import itertools
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+from program import metrics
+from program.cache import ResultCache
+from program.common import cal_spread
+from program.curve import cal_pair_equity_curve
+from program.evaluate import cal_evaluate, cal_evaluate_array
+from program.function import cal_zscore, cal_signal, cal_position
+from program.rolling import rolling_coint
+
+
+def backtest_pair(base: pd.DataFrame, target: pd.DataFrame, coint: pd.Series, zscore: pd.Series,
+                  upper: float = 2, lower: float = -2, leverage: float = 2,
+                  slippage: float = 1 / 1000) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    z-score 之后的回测流程，与 script/playback.py 相同：信号 -> 仓位 -> 两腿资金曲线 -> 合并 -> 评价
+    :param base: x 的k线，含 candle_begin_time open close high low
+    :param target: y 的k线
+    :param coint: 滚动协整序列
+    :param zscore: 价差 z-score
+    :param upper: 上界
+    :param lower: 下界
+    :param leverage: 杠杆倍数
+    :param slippage: 滑点
+    :return: 资金曲线、评价
+    """
+    signal = cal_signal(zscore, coint, upper, lower)
+    target_pos = cal_position(signal)
+    # 两条腿一次计算
+    curve = cal_pair_equity_curve(base, target, target_pos, leverage_rate=leverage, slippage=slippage)
+    equity_curve = pd.DataFrame({'candle_begin_time': base['candle_begin_time'], 'equity_curve': curve})
+    return equity_curve, cal_evaluate(equity_curve)
+
+
+def _sweep_task(base: pd.DataFrame, target: pd.DataFrame, coint: pd.Series, zscore: pd.Series,
+                params: Dict, costs: List[Tuple[float, float]]) -> List[Dict]:
+    """
+    一组 (回看窗口, z-score窗口, 上界, 下界) 下，全部杠杆和滑点一次计算资金曲线、一次评价
+    """
+    signal = cal_signal(zscore, coint, params['upper'], params['lower'])
+    target_pos = cal_position(signal)
+    leverages = np.array([leverage for leverage, _ in costs])
+    slippages = np.array([slippage for _, slippage in costs])
+    curves = cal_pair_equity_curve(base, target, target_pos, leverage_rate=leverages, slippage=slippages)
+    evaluate = cal_evaluate_array(curves, base['candle_begin_time'])
+    return [{**params, 'leverage': leverage, 'slippage': slippage, **row}
+            for (leverage, slippage), row in zip(costs, evaluate.to_dict('records'))]
+
+
+def sweep_pair(base: pd.DataFrame, target: pd.DataFrame, back_hours=(720,), zscore_windows=(168,),
+               uppers=(2,), lowers=(-2,), leverages=(2,), slippages=(1 / 1000,), n_jobs=-1,
+               cache: ResultCache | None = None, hedge: str = 'ols') -> pd.DataFrame:
+    """
+    单币对参数遍历
+    滚动协整只依赖回看窗口，每个回看窗口只算一次；价差和 z-score 每个 (回看窗口, z-score窗口) 算一次；
+    信号、仓位、资金曲线、评价等便宜的环节分发到进程池
+    :param base: x 的k线，含 candle_begin_time open close high low
+    :param target: y 的k线
+    :param back_hours: 滚动协整回看窗口
+    :param zscore_windows: z-score 窗口
+    :param uppers: 上界
+    :param lowers: 下界
+    :param leverages: 杠杆倍数
+    :param slippages: 滑点
+    :param n_jobs: 进程数
+    :param cache: 滚动协整结果缓存
+    :param hedge: 对冲比率估计方法，ols / rls / kalman，见 rolling_coint
+    :return: 每组参数一行，含参数和评价指标
+    """
+    base_close = base['close']
+    target_close = target['close']
+    costs = list(itertools.product(leverages, slippages))
+    tasks = []
+    for back_hour in back_hours:
+        coint, h_ratio, _ = rolling_coint(base_close, target_close, back_hour, fast=True, cache=cache, hedge=hedge)
+        spread = cal_spread(base_close, target_close, hedge_ratio=h_ratio)
+        for window in zscore_windows:
+            zscore = cal_zscore(spread, window)
+            for upper, lower in itertools.product(uppers, lowers):
+                params = {'back_hour': back_hour, 'zscore_window': window, 'upper': upper, 'lower': lower}
+                tasks.append((base, target, coint, zscore, params, costs))
+    results = Parallel(n_jobs=n_jobs)(delayed(metrics.recorded(_sweep_task))(*task) for task in tasks)
+    return pd.DataFrame([row for rows in map(metrics.collect, results) for row in rows])
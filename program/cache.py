@@ -0,0 +1,195 @@
+import atexit
+import hashlib
+import os
+import pickle
+import sqlite3
+import time
+from typing import Any, Callable, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+import config
+
+
+def data_hash(*items) -> str:
+    """
+    输入数据的内容哈希，ndarray / Series 按值和索引计算，其余按 repr
+    :param items: 价格序列、参数等
+    :return: 十六进制摘要
+    """
+    h = hashlib.blake2b(digest_size=20)
+    for item in items:
+        if isinstance(item, pd.Series):
+            h.update(b'series')
+            _update_array(h, item.to_numpy())
+            _update_array(h, np.asarray(item.index))
+        elif isinstance(item, np.ndarray):
+            _update_array(h, item)
+        else:
+            h.update(repr(item).encode('utf-8'))
+        h.update(b'|')
+    return h.hexdigest()
+
+
+def _update_array(h, a: np.ndarray):
+    if a.dtype == object:
+        h.update(repr(a.tolist()).encode('utf-8'))
+        return
+    h.update(f'{a.dtype.str}{a.shape}'.encode('utf-8'))
+    h.update(np.ascontiguousarray(a).tobytes())
+
+
+class ResultCache:
+    """
+    磁盘缓存，键由 (计算名称, 币对, 参数, 输入数据哈希) 组成，内容相同的重复计算直接读取结果
+    基于 sqlite，多个 joblib worker 可同时读写；超过 max_bytes 时按最近访问时间淘汰
+    总字节数记在 stats 表中，写入、淘汰时增量更新；命中时的访问时间、命中未命中次数先在进程内累积，
+    每 flush_every 次或写入时一并提交，读取不占用写锁。其他进程未提交的访问时间不参与淘汰排序，淘汰为近似 LRU
+    对象可 pickle，传给 worker 后在各进程内重新打开连接
+    """
+
+    def __init__(self, path: str = config.cache_path, max_bytes: int = 1 << 30, flush_every: int = 256):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.flush_every = flush_every
+        self._conn = None
+        self._pid = None
+        # 未提交的访问时间、命中未命中次数
+        self._atime: Dict[str, float] = {}
+        self._counts = {'hit': 0, 'miss': 0}
+
+    def __getstate__(self):
+        return {'path': self.path, 'max_bytes': self.max_bytes, 'flush_every': self.flush_every}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS entries '
+                         '(key TEXT PRIMARY KEY, value BLOB, size INTEGER, atime REAL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS entries_atime ON entries (atime)')
+            conn.execute('CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, count INTEGER)')
+            conn.execute("INSERT OR IGNORE INTO stats VALUES ('hit', 0), ('miss', 0)")
+            # 旧版本的缓存文件没有总字节数，打开时统计一次
+            conn.execute("INSERT OR IGNORE INTO stats SELECT 'bytes', COALESCE(SUM(size), 0) FROM entries")
+            if self._pid is not None:
+                # fork 出的子进程不提交父进程累积的访问记录
+                self._atime = {}
+                self._counts = {'hit': 0, 'miss': 0}
+            self._conn = conn
+            self._pid = os.getpid()
+            atexit.register(self.flush)
+        return self._conn
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """
+        :return: 是否命中、结果
+        """
+        row = self.conn.execute('SELECT value FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self._counts['miss'] += 1
+        else:
+            self._atime[key] = time.time()
+            self._counts['hit'] += 1
+        if self._counts['hit'] + self._counts['miss'] >= self.flush_every:
+            self.flush()
+        return (False, None) if row is None else (True, pickle.loads(row[0]))
+
+    def _write_pending(self):
+        """
+        在当前事务中提交累积的访问时间、命中未命中次数
+        """
+        if self._atime:
+            self.conn.executemany('UPDATE entries SET atime = ? WHERE key = ?',
+                                  [(atime, key) for key, atime in self._atime.items()])
+        self.conn.executemany('UPDATE stats SET count = count + ? WHERE name = ?',
+                              [(n, name) for name, n in self._counts.items() if n])
+        self._atime = {}
+        self._counts = {'hit': 0, 'miss': 0}
+
+    def _transaction(self, func: Callable[[], None]):
+        conn = self.conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            func()
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def flush(self):
+        """
+        提交累积的访问时间、命中未命中次数
+        """
+        if self._conn is None or self._pid != os.getpid():
+            return
+        if self._atime or self._counts['hit'] or self._counts['miss']:
+            self._transaction(self._write_pending)
+
+    def set(self, key: str, value: Any):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+        def write():
+            self._write_pending()
+            row = self.conn.execute('SELECT size FROM entries WHERE key = ?', (key,)).fetchone()
+            self.conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)',
+                              (key, blob, len(blob), time.time()))
+            self.conn.execute("UPDATE stats SET count = count + ? WHERE name = 'bytes'",
+                              (len(blob) - (row[0] if row else 0),))
+            self._evict()
+
+        self._transaction(write)
+
+    def _evict(self):
+        total = self.conn.execute("SELECT count FROM stats WHERE name = 'bytes'").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        while total - freed > self.max_bytes:
+            row = self.conn.execute('SELECT key, size FROM entries ORDER BY atime LIMIT 1').fetchone()
+            if row is None:
+                break
+            self.conn.execute('DELETE FROM entries WHERE key = ?', (row[0],))
+            freed += row[1]
+        self.conn.execute("UPDATE stats SET count = count - ? WHERE name = 'bytes'", (freed,))
+
+    def evict(self):
+        """
+        总大小超过 max_bytes 时，删除最久未访问的条目
+        """
+        def write():
+            self._write_pending()
+            self._evict()
+
+        self._transaction(write)
+
+    def get_or_compute(self, key: str, func: Callable[[], Any]) -> Any:
+        """
+        命中则返回缓存结果，否则计算并写入
+        """
+        found, value = self.get(key)
+        if not found:
+            value = func()
+            self.set(key, value)
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        """
+        命中、未命中次数，条目数，总字节数
+        """
+        self.flush()
+        stats = dict(self.conn.execute('SELECT name, count FROM stats').fetchall())
+        stats['entries'] = self.conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        return stats
+
+    def clear(self):
+        self._atime = {}
+        self._counts = {'hit': 0, 'miss': 0}
+        self.conn.execute('DELETE FROM entries')
+        self.conn.execute('UPDATE stats SET count = 0')
@@ -1,6 +1,14 @@
+from typing import Dict, List
+
+import numpy as np
 import pandas as pd
 
+from program import metrics
+from program.resample import (ResampleCache, default_cache, fingerprint, frame_bytes, is_base, resample,
+                              resample_ohlc, symbol_of)
+
 
+@metrics.timed('spread_zscore')
 def cal_spread(base: pd.Series, target: pd.Series, hedge_ratio: pd.Series) -> pd.Series:
     """
     价差计算
@@ -12,15 +20,116 @@ def cal_spread(base: pd.Series, target: pd.Series, hedge_ratio: pd.Series) -> pd
     return target - base * hedge_ratio
 
 
-def extract_col(df: pd.DataFrame, col: str, start_time, end_time) -> pd.Series | None:
+class SymbolIndex:
+    """
+    单币种时间索引，加载数据后构建一次
+    排序后的时间戳用于二分查找切片，空值、缺k线的前缀和用于 O(1) 判断区间是否完整
+    要求 candle_begin_time 升序
+    """
+
+    def __init__(self, df: pd.DataFrame, symbol: str | None = None):
+        self.df = df
+        self.symbol = symbol or symbol_of(df)
+        self.times = df['candle_begin_time'].to_numpy().astype('datetime64[ns]').view(np.int64)
+        diff = np.diff(self.times)
+        # 最常见的时间间隔视为k线周期，间隔大于它即为缺k线
+        steps, counts = np.unique(diff, return_counts=True)
+        self.step = steps[counts.argmax()] if len(diff) else 0
+        self._gap_cum = np.concatenate(([0], np.cumsum(diff > self.step)))
+        self._values = {}
+        self._nan_cum = {}
+
+    def _column(self, col: str):
+        if col not in self._values:
+            values = self.df[col].to_numpy()
+            self._values[col] = values
+            self._nan_cum[col] = np.concatenate(([0], np.cumsum(pd.isna(values))))
+        return self._values[col], self._nan_cum[col]
+
+    def locate(self, start_time, end_time) -> tuple[int, int] | None:
+        """
+        区间 [start_time, end_time] 对应的行号 [lo, hi)，开头或结尾k线缺失返回 None
+        """
+        start = pd.Timestamp(start_time).value
+        end = pd.Timestamp(end_time).value
+        lo = int(np.searchsorted(self.times, start, 'left'))
+        hi = int(np.searchsorted(self.times, end, 'right'))
+        if hi <= lo or self.times[lo] != start or self.times[hi - 1] != end:
+            return None
+        return lo, hi
+
+    def covers(self, cols: List[str], start_time, end_time, no_gap: bool = False) -> bool:
+        """
+        币种在 [start_time, end_time] 是否完整：首尾k线存在、各列无空值，no_gap 时还要求中间不缺k线
+        """
+        return self._complete(self.locate(start_time, end_time), cols, no_gap)
+
+    def _complete(self, loc: tuple[int, int] | None, cols: List[str], no_gap: bool = False) -> bool:
+        if loc is None:
+            return False
+        lo, hi = loc
+        if no_gap and self._gap_cum[hi - 1] - self._gap_cum[lo] > 0:
+            return False
+        for col in cols:
+            _, nan_cum = self._column(col)
+            if nan_cum[hi] - nan_cum[lo] > 0:
+                return False
+        return True
+
+    def resampled(self, timeframe: str, cache: ResampleCache | None = default_cache) -> 'SymbolIndex':
+        """
+        timeframe 周期k线的时间索引，按 (symbol, timeframe) 缓存，多个币对、多次扫描共用
+        """
+        if is_base(timeframe):
+            return self
+        if cache is None or self.symbol is None:
+            return SymbolIndex(resample_ohlc(self.df, timeframe), self.symbol)
+        return cache.get_or_compute((self.symbol, pd.Timedelta(timeframe), 'index'), fingerprint(self.df),
+                                    lambda: SymbolIndex(resample_ohlc(self.df, timeframe), self.symbol),
+                                    lambda index: frame_bytes(index.df))
+
+    def extract(self, cols: List[str], start_time, end_time) -> Dict[str, np.ndarray] | None:
+        """
+        区间完整时返回各列的零拷贝切片，否则返回 None
+        """
+        loc = self.locate(start_time, end_time)
+        if not self._complete(loc, cols):
+            return None
+        lo, hi = loc
+        return {col: self._column(col)[0][lo:hi] for col in cols}
+
+
+def build_index(data: Dict[str, pd.DataFrame]) -> Dict[str, SymbolIndex]:
+    """
+    为全部币种构建时间索引，结果可直接替代 data 传给 extract_col / extract_cols
+    :param data: {symbol: DataFrame}
+    :return: {symbol: SymbolIndex}
+    """
+    return {symbol: SymbolIndex(df, symbol) for symbol, df in data.items()}
+
+
+def _timeframe(df: pd.DataFrame | SymbolIndex, timeframe: str | None) -> pd.DataFrame | SymbolIndex:
+    if is_base(timeframe):
+        return df
+    return df.resampled(timeframe) if isinstance(df, SymbolIndex) else resample(df, timeframe)
+
+
+@metrics.timed('extract')
+def extract_col(df: pd.DataFrame | SymbolIndex, col: str, start_time, end_time,
+                timeframe: str | None = None) -> pd.Series | None:
     """
     从 df 提取一段 pd.Series，pd.Series计算比带着df计算快很多
-    :param df: dataframe
+    :param df: dataframe，或 build_index 构建的 SymbolIndex（二分查找，零拷贝）
     :param col: 列名
     :param start_time: 序列开始时间
-    :param end_time: 序列结束时间
+    :param end_time: 序列结束时间（timeframe 周期下为最后一根k线的开始时间）
+    :param timeframe: k线周期，如 '4h'、'1d'，由 1h 数据重采样并按 (symbol, timeframe) 缓存，默认 1h
     :return: 提取后的序列，完整覆盖时间区间，没有空值
     """
+    df = _timeframe(df, timeframe)
+    if isinstance(df, SymbolIndex):
+        values = df.extract([col], start_time, end_time)
+        return None if values is None else pd.Series(values[col], name=col, copy=False)
     # 过滤数据
     filtered_df = df[(df['candle_begin_time'] >= start_time) & (df['candle_begin_time'] <= end_time)]
     # 检查数据是否为空、开头或结尾是否缺失、是否有空值
@@ -32,15 +141,22 @@ def extract_col(df: pd.DataFrame, col: str, start_time, end_time) -> pd.Series |
     return filtered_df[col].reset_index(drop=True)
 
 
-def extract_cols(df: pd.DataFrame, cols: list[str], start_time, end_time) -> pd.Series | None:
+@metrics.timed('extract')
+def extract_cols(df: pd.DataFrame | SymbolIndex, cols: list[str], start_time, end_time,
+                 timeframe: str | None = None) -> pd.DataFrame | None:
     """
     从 df 提取一段 pd.Series，pd.Series计算比带着df计算快很多
-    :param df: dataframe
+    :param df: dataframe，或 build_index 构建的 SymbolIndex（二分查找，零拷贝）
     :param cols: 列名
     :param start_time: 序列开始时间
-    :param end_time: 序列结束时间
+    :param end_time: 序列结束时间（timeframe 周期下为最后一根k线的开始时间）
+    :param timeframe: k线周期，如 '4h'、'1d'，由 1h 数据重采样并按 (symbol, timeframe) 缓存，默认 1h
     :return: 提取后的序列，完整覆盖时间区间，没有空值
     """
+    df = _timeframe(df, timeframe)
+    if isinstance(df, SymbolIndex):
+        values = df.extract(cols, start_time, end_time)
+        return None if values is None else pd.DataFrame(values, copy=False)
     # 过滤数据
     filtered_df = df[(df['candle_begin_time'] >= start_time) & (df['candle_begin_time'] <= end_time)]
     # 检查数据是否为空、开头或结尾是否缺失、是否有空值
@@ -0,0 +1,58 @@
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+# 紧凑模式下价格及中间结果（残差窗口、价差矩阵）的精度，回归累加和、adf 正规方程、资金曲线仍为 float64
+PRICE_DTYPE = np.float32
+# 信号、仓位的存储类型
+SIGNAL_DTYPE = np.int8
+# 紧凑模式下滚动残差、滚动 spearman 的每块窗口数，秩矩阵等临时数组随之缩小
+COMPACT_CHUNK = 256
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    单币种k线转为紧凑存储：浮点列 float32，布尔列 int8，字符串列（如 symbol）转为 category，时间列不变
+    :param df: k线 DataFrame
+    :return: 新的 DataFrame，内存约为原来的一半
+    """
+    cols = {}
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.is_float_dtype(values):
+            cols[col] = values.astype(PRICE_DTYPE)
+        elif pd.api.types.is_bool_dtype(values):
+            cols[col] = values.astype(SIGNAL_DTYPE)
+        elif values.dtype == object or pd.api.types.is_string_dtype(values):
+            cols[col] = values.astype('category')
+        else:
+            cols[col] = values
+    return pd.DataFrame(cols, index=df.index)
+
+
+def compact_data(data: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+    """
+    {symbol: DataFrame} 全部转为紧凑存储，结构与 load_data 的结果一致
+    """
+    return {symbol: compact_frame(df) for symbol, df in data.items()}
+
+
+def compact_signals(signals: pd.DataFrame) -> pd.DataFrame:
+    """
+    cal_signal 的结果转为 int8，可直接传给 cal_position
+    """
+    return signals.fillna(False).astype(SIGNAL_DTYPE)
+
+
+def memory_mb(obj) -> float:
+    """
+    DataFrame、Series、ndarray 或它们组成的 dict 的内存占用（MB）
+    """
+    if isinstance(obj, dict):
+        return sum(memory_mb(v) for v in obj.values())
+    if isinstance(obj, pd.DataFrame):
+        return obj.memory_usage(index=True, deep=True).sum() / 2 ** 20
+    if isinstance(obj, pd.Series):
+        return obj.memory_usage(index=True, deep=True) / 2 ** 20
+    return np.asarray(obj).nbytes / 2 ** 20
@@ -1,9 +1,10 @@
-from typing import Dict
+from typing import Dict, Tuple
 
 import numpy as np
 import pandas as pd
 
 import config
+from program import metrics
 
 
 def cal_min_qty() -> Dict:
@@ -14,6 +15,135 @@ def cal_min_qty() -> Dict:
     return min_qty_df['最小下单量'].to_dict()
 
 
+def _trade_masks(pos: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    持仓、开仓、平仓k线，规则与逐列 DataFrame 计算一致（首根k线之前、末根k线之后视为空值）
+    :param pos: (B, n) 仓位
+    :return: 持仓、开仓、平仓布尔矩阵
+    """
+    nan_col = np.full((pos.shape[0], 1), np.nan)
+    prev = np.concatenate((nan_col, pos[:, :-1]), axis=1)
+    nxt = np.concatenate((pos[:, 1:], nan_col), axis=1)
+    in_pos = pos != 0
+    return in_pos, in_pos & (pos != prev), in_pos & (pos != nxt)
+
+
+def _broadcast(value, shape) -> np.ndarray:
+    """
+    标量、每行一个或逐根k线的参数扩展为 (B, n)
+    """
+    value = np.asarray(value, dtype=np.float64)
+    return np.broadcast_to(value.reshape(-1, 1) if value.ndim == 1 else value, shape)
+
+
+@metrics.timed('equity')
+def cal_equity_curve_array(open_, high, low, close, pos, slippage=1 / 1000, c_rate=5 / 10000, leverage_rate=1,
+                           min_amount=0.01, min_margin_ratio=1 / 100,
+                           initial_cash=1000) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    邢大资金曲线计算方法的数组实现，结果与 cal_equity_curve 一致
+    只在持仓k线上计算，可一次计算多条腿、多个币对或多组参数（每行一条）
+    :param open_: (n,) 或 (B, n) 开盘价
+    :param high: 最高价
+    :param low: 最低价
+    :param close: 收盘价
+    :param pos: 仓位
+    :param slippage: 滑点，标量或 (B,)
+    :param c_rate: 手续费，标量或 (B,)
+    :param leverage_rate: 杠杆倍数，标量、(B,) 或 (B, n)，(B, n) 时每笔交易取开仓k线的值
+    :param min_amount: 最小下单量，标量或 (B,)
+    :param min_margin_ratio: 最低保证金率，低于就会爆仓
+    :param initial_cash: 初始资金
+    :return: equity_change、equity_curve，形状同输入
+    """
+    pos = np.asarray(pos, dtype=np.float64)
+    squeeze = pos.ndim == 1
+    pos = np.atleast_2d(pos)
+    shape = pos.shape
+    open_, high, low, close = (np.atleast_2d(np.asarray(a, dtype=np.float64)) for a in (open_, high, low, close))
+    slippage, c_rate, leverage_rate, min_amount, min_margin_ratio, initial_cash = (
+        _broadcast(v, shape) for v in (slippage, c_rate, leverage_rate, min_amount, min_margin_ratio, initial_cash))
+
+    # 下根k线开盘价，最后一根用收盘价
+    next_open = np.concatenate((open_[:, 1:], np.full((shape[0], 1), np.nan)), axis=1)
+    next_open = np.where(np.isnan(next_open), close, next_open)
+    in_pos, open_pos, close_pos = _trade_masks(pos)
+
+    # 只取持仓k线，展平后各行首尾相接，交易编号全局递增
+    idx = np.flatnonzero(in_pos)
+    is_open = open_pos.ravel()[idx]
+    is_close = close_pos.ravel()[idx]
+    trade_id = np.cumsum(is_open)
+    start = idx[is_open][trade_id - 1]
+
+    def take(a, at=idx):
+        return a.ravel()[at]
+
+    p = take(pos)
+    ma, c, ic = take(min_amount), take(c_rate), take(initial_cash)
+    # 开仓k线以开盘价计算合约张数、开仓价格、扣除手续费后的保证金，持仓期间不变
+    contract_num = np.floor(take(initial_cash, start) * take(leverage_rate, start) /
+                            (take(min_amount, start) * take(open_, start)))
+    open_pos_price = take(open_, start) * (1 + take(slippage, start) * p)
+    cash = ic - open_pos_price * ma * contract_num * c
+
+    # 平仓价格、平仓手续费
+    close_pos_price = take(next_open) * (1 - take(slippage) * p)
+    close_pos_fee = close_pos_price * ma * contract_num * c
+    # 持仓盈亏，平仓k线按平仓价格计算
+    price = np.where(is_close, close_pos_price, take(close))
+    net_value = cash + ma * contract_num * (price - open_pos_price) * p
+
+    # 爆仓：最不利价格下的保证金率
+    price_min = np.where(p == 1, take(low), np.where(p == -1, take(high), np.nan))
+    net_value_min = cash + ma * contract_num * (price_min - open_pos_price) * p
+    with np.errstate(divide='ignore', invalid='ignore'):
+        margin_ratio = net_value_min / (ma * contract_num * price_min)
+    liquidate = margin_ratio <= (take(min_margin_ratio) + c)
+    net_value = np.where(is_close, net_value - close_pos_fee, net_value)
+    liquidate |= is_close & (net_value < 0)
+    # 同一笔交易中，爆仓之后全部归零
+    liquidated = np.maximum.accumulate(np.where(liquidate, trade_id, 0)) == trade_id
+    net_value = np.where(liquidated, 0, net_value)
+
+    # 资金曲线：开仓k线相对初始资金，其余持仓k线相对上一根
+    prev_value = np.concatenate(([np.nan], net_value[:-1]))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = np.where(is_open, net_value / ic - 1, net_value / prev_value - 1)
+    equity_change = np.zeros(shape, dtype=np.float64)
+    equity_change.ravel()[idx] = np.where(np.isnan(change), 0, change)
+    equity_curve = np.cumprod(1 + equity_change, axis=1)
+    if squeeze:
+        return equity_change[0], equity_curve[0]
+    return equity_change, equity_curve
+
+
+def cal_pair_equity_curve(base: pd.DataFrame, target: pd.DataFrame, target_pos, weight1: float = 1,
+                          weight2: float = 1, **kwargs) -> np.ndarray:
+    """
+    配对交易两条腿一次计算并合并，base 仓位为 target 的相反仓位
+    :param base: x 的k线，含 open high low close
+    :param target: y 的k线
+    :param target_pos: target 仓位
+    :param weight1: base 权重
+    :param weight2: target 权重
+    :param kwargs: cal_equity_curve_array 的其余参数，可以是长度为 K 的数组，一次计算 K 组参数
+    :return: 合并后的资金曲线，参数均为标量时 (n,)，否则 (K, n)
+    """
+    target_pos = np.asarray(target_pos, dtype=np.float64)
+    base_pos = np.where(target_pos == 1, -1, np.where(target_pos == -1, 1, 0))
+    k = max([np.size(v) for v in kwargs.values()] + [1])
+    # 前 K 行为 base，后 K 行为 target
+    cols = [np.repeat(np.stack((base[col].to_numpy(dtype=np.float64), target[col].to_numpy(dtype=np.float64))),
+                      k, axis=0) for col in ('open', 'high', 'low', 'close')]
+    pos = np.repeat(np.stack((base_pos, target_pos)), k, axis=0)
+    params = {key: np.tile(np.broadcast_to(np.asarray(v, dtype=np.float64), (k,)), 2) for key, v in kwargs.items()}
+    _, curve = cal_equity_curve_array(*cols, pos, **params)
+    total_weight = weight1 + weight2
+    curve = weight1 / total_weight * curve[:k] + weight2 / total_weight * curve[k:]
+    return curve if any(np.ndim(v) for v in kwargs.values()) else curve[0]
+
+
 def cal_equity_curve(df: pd.DataFrame, slippage: float = 1 / 1000, c_rate: float = 5 / 10000,
                      leverage_rate: float = 1, min_amount: float = 0.01,
                      min_margin_ratio: float = 1 / 100, initial_cash: float = 1000) -> pd.DataFrame:
@@ -26,88 +156,21 @@ def cal_equity_curve(df: pd.DataFrame, slippage: float = 1 / 1000, c_rate: float
     :param min_amount:  最小下单量
     :param min_margin_ratio: 最低保证金率，低于就会爆仓
     :param initial_cash:
-    :return: curve
+    :return: curve，在 df 上增加 start_time、equity_change、equity_curve 列
     """
-    # 下根k线开盘价
-    df['next_open'] = df['open'].shift(-1)  # 下根K线的开盘价
-    df['next_open'] = df['next_open'].fillna(value=df['close'])
-
-    # 找出开仓、平仓的k线
-    condition1 = df['pos'] != 0  # 当前周期不为空仓
-    condition2 = df['pos'] != df['pos'].shift(1)  # 当前周期和上个周期持仓方向不一样。
-    open_pos_condition = condition1 & condition2
-
-    condition1 = df['pos'] != 0  # 当前周期不为空仓
-    condition2 = df['pos'] != df['pos'].shift(-1)  # 当前周期和下个周期持仓方向不一样。
-    close_pos_condition = condition1 & condition2
+    pos = df['pos'].to_numpy(dtype=np.float64)
+    equity_change, equity_curve = cal_equity_curve_array(
+        df['open'].to_numpy(dtype=np.float64), df['high'].to_numpy(dtype=np.float64),
+        df['low'].to_numpy(dtype=np.float64), df['close'].to_numpy(dtype=np.float64), pos,
+        slippage, c_rate, leverage_rate, min_amount, min_margin_ratio, initial_cash)
 
     # 对每次交易进行分组
-    df.loc[open_pos_condition, 'start_time'] = df['candle_begin_time']
+    in_pos, open_pos, _ = _trade_masks(pos[None, :])
+    df.loc[open_pos[0], 'start_time'] = df['candle_begin_time']
     df['start_time'] = df['start_time'].ffill()
-    df.loc[df['pos'] == 0, 'start_time'] = pd.NaT
-
-    # 开始计算资金曲线
-    # 在open_pos_condition的K线，以开盘价计算买入合约的数量。（当资金量大的时候，可以用5分钟均价）
-    df.loc[open_pos_condition, 'contract_num'] = initial_cash * leverage_rate / (min_amount * df['open'])
-    df['contract_num'] = np.floor(df['contract_num'])  # 对合约张数向下取整
-    # 开仓价格：理论开盘价加上相应滑点
-    df.loc[open_pos_condition, 'open_pos_price'] = df['open'] * (1 + slippage * df['pos'])
-    # 开仓之后剩余的钱，扣除手续费
-    df['cash'] = initial_cash - df['open_pos_price'] * min_amount * df['contract_num'] * c_rate  # 即保证金
-
-    # 开仓之后每根K线结束时
-    # 买入之后cash，contract_num，open_pos_price不再发生变动
-    df['contract_num'] = df['contract_num'].ffill()
-    df['open_pos_price'] = df['open_pos_price'].ffill()
-    df['cash'] = df['cash'].ffill()
-    df.loc[df['pos'] == 0, ['contract_num', 'open_pos_price', 'cash']] = None
-
-    # 在平仓时
-    # 平仓价格
-    df.loc[close_pos_condition, 'close_pos_price'] = df['next_open'] * (1 - slippage * df['pos'])
-    # 平仓之后剩余的钱，扣除手续费
-    df.loc[close_pos_condition, 'close_pos_fee'] = df['close_pos_price'] * min_amount * df['contract_num'] * c_rate
-
-    # 计算利润
-    # 开仓至今持仓盈亏
-    df['profit'] = min_amount * df['contract_num'] * (df['close'] - df['open_pos_price']) * df['pos']
-    # 平仓时理论额外处理
-    df.loc[close_pos_condition, 'profit'] = min_amount * df['contract_num'] * (
-            df['close_pos_price'] - df['open_pos_price']) * df['pos']
-    # 账户净值
-    df['net_value'] = df['cash'] + df['profit']
-
-    # 计算爆仓
-    # 至今持仓盈亏最小值
-    df.loc[df['pos'] == 1, 'price_min'] = df['low']
-    df.loc[df['pos'] == -1, 'price_min'] = df['high']
-    df['profit_min'] = min_amount * df['contract_num'] * (df['price_min'] - df['open_pos_price']) * df['pos']
-    # 账户净值最小值
-    df['net_value_min'] = df['cash'] + df['profit_min']
-    # 计算保证金率
-    df['margin_ratio'] = df['net_value_min'] / (min_amount * df['contract_num'] * df['price_min'])
-    # 计算爆仓
-    df.loc[df['margin_ratio'] <= (min_margin_ratio + c_rate), 'liquidate'] = 1
-
-    # 平仓时扣除手续费
-    df.loc[close_pos_condition, 'net_value'] -= df['close_pos_fee']
-    # 应对偶然情况：下一根K线开盘价格价格突变，在平仓的时候爆仓。此处处理有省略，不够精确。
-    df.loc[close_pos_condition & (df['net_value'] < 0), 'liquidate'] = 1
-
-    # 对爆仓进行处理
-    df['liquidate'] = df.groupby('start_time')['liquidate'].ffill()
-    df.loc[df['liquidate'] == 1, 'net_value'] = 0
-
-    # 计算资金曲线
-    df['equity_change'] = df['net_value'].pct_change(fill_method=None)
-    df.loc[open_pos_condition, 'equity_change'] = df.loc[open_pos_condition, 'net_value'] / initial_cash - 1  # 开仓日的收益率
-    df['equity_change'] = df['equity_change'].fillna(value=0)
-    df['equity_curve'] = (1 + df['equity_change']).cumprod()
-    # 删除不必要的数据，并存储
-    df.drop(['next_open', 'contract_num', 'open_pos_price', 'cash', 'close_pos_price', 'close_pos_fee',
-             'profit', 'net_value', 'price_min', 'profit_min', 'net_value_min', 'margin_ratio', 'liquidate'],
-            axis=1, inplace=True)
-
+    df.loc[~in_pos[0], 'start_time'] = pd.NaT
+    df['equity_change'] = equity_change
+    df['equity_curve'] = equity_curve
     return df
 
 
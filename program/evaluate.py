@@ -1,4 +1,3 @@
-import itertools
 import os
 
 import numpy as np
@@ -6,6 +5,108 @@ import pandas as pd
 from plotly.subplots import make_subplots
 import plotly.graph_objects as go
 
+from program import metrics
+from program.report import downsample
+
+
+EVALUATE_COLS = ['累积净值', '年化收益', '月化收益', '月信息比', '月化波动', '月化收益回撤比', '最大回撤',
+                 '最大回撤开始时间', '最大回撤结束时间', '盈利周期数',
+                 '亏损周期数', '胜率', '每周期平均收益', '盈亏收益比', '单周期最大盈利', '单周期大亏损',
+                 '最大连续盈利周期数',
+                 '最大连续亏损周期数']
+
+
+def _max_run(mask: np.ndarray) -> np.ndarray:
+    """
+    每行最长连续 True 的长度
+    """
+    n = mask.shape[1]
+    idx = np.arange(n)
+    last_false = np.maximum.accumulate(np.where(mask, -1, idx), axis=1)
+    return np.where(mask, idx - last_false, 0).max(axis=1)
+
+
+@metrics.timed('evaluate')
+def cal_evaluate_array(curves, times) -> pd.DataFrame:
+    """
+    F神（FreeStep）策略评价函数的数组实现，指标与 cal_evaluate 相同，每条曲线 O(n) 计算、不写文件
+    :param curves: (n,) 或 (B, n) 净值曲线，共用同一时间轴
+    :param times: (n,) candle_begin_time
+    :return: 每条曲线一行评价
+    """
+    eps = 1e-9
+    curves = np.atleast_2d(np.asarray(curves, dtype=np.float64))
+    times = pd.DatetimeIndex(times)
+    n_curve, n = curves.shape
+    rows = np.arange(n_curve)
+    hour_diff = (times[-1] - times[0]).total_seconds() / 3600
+    # k线周期（小时），月化波动按每月k线数折算
+    bar_hours = (times[1:] - times[:-1]).median().total_seconds() / 3600 if n > 1 else 1.0
+
+    # 本周期多空涨跌幅
+    with np.errstate(divide='ignore', invalid='ignore'):
+        raw = curves[:, 1:] / curves[:, :-1] - 1
+    change = np.zeros_like(curves)
+    change[:, 1:] = np.where(np.isnan(raw), 0, raw)
+
+    # 最大回撤及结束时间，最大回撤开始时间为此前净值最高点（并列时取最早）
+    max2here = np.maximum.accumulate(curves, axis=1)
+    dd2here = curves / max2here - 1
+    end = np.argmin(dd2here, axis=1)
+    max_draw_down = dd2here[rows, end]
+    start = np.argmax(curves == max2here[rows, end][:, None], axis=1)
+
+    # 统计每个周期
+    win = change > 0
+    lose = change <= 0
+    win_num = win.sum(axis=1).astype(np.float64)
+    loss_num = (change < 0).sum(axis=1).astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        win_mean = np.where(win, change, 0).sum(axis=1) / win.sum(axis=1)
+        lose_mean = np.where(lose, change, 0).sum(axis=1) / lose.sum(axis=1)
+        profit_loss_ratio = np.where(lose_mean != 0, np.round(win_mean / lose_mean * (-1), 2), np.nan)
+
+    # 相对年化、月化、波动率，波动率不含无效的涨跌幅
+    final = curves[:, -1]
+    annual = np.power(final, 365 * 24 / hour_diff) - 1
+    monthly = np.power(final, 30.4 * 24 / hour_diff) - 1
+    valid = ~np.isnan(raw)
+    valid_num = valid.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        valid_mean = np.where(valid, raw, 0).sum(axis=1) / valid_num
+        var = np.where(valid, (raw - valid_mean[:, None]) ** 2, 0).sum(axis=1) / (valid_num - 1)
+    volatility = np.sqrt(var) * np.sqrt(30.5 * 24 / bar_hours)
+    info_ratio = monthly / (volatility + eps)
+
+    def f32(a):
+        return np.round(np.asarray(a, dtype=np.float32), 3)
+
+    draw_down_str = [format(x, '.2%') for x in max_draw_down]
+    draw_down_num = np.array([float(x[:-1]) for x in draw_down_str], dtype=np.float32)
+    monthly32 = f32(monthly)
+    data = pd.DataFrame({
+        '累积净值': np.round(final, 3),
+        '年化收益': f32(annual),
+        '月化收益': monthly32,
+        '月信息比': f32(info_ratio),
+        '月化波动': f32(volatility),
+        '月化收益回撤比': monthly32 / (np.abs(draw_down_num) + eps) * 100,
+        '最大回撤': draw_down_str,
+        '最大回撤开始时间': [str(times[i]) for i in start],
+        '最大回撤结束时间': [str(times[i]) for i in end],
+        '盈利周期数': win_num,
+        '亏损周期数': loss_num,
+        '胜率': [format(x, '.2%') for x in win_num / (win_num + loss_num + eps)],
+        '每周期平均收益': [format(x, '.3%') for x in change.mean(axis=1)],
+        '盈亏收益比': profit_loss_ratio,
+        '单周期最大盈利': [format(x, '.2%') for x in change.max(axis=1)],
+        '单周期大亏损': [format(x, '.2%') for x in change.min(axis=1)],
+        # 与 itertools.groupby 写法一致，至少为1
+        '最大连续盈利周期数': np.maximum(_max_run(win), 1).astype(np.float64),
+        '最大连续亏损周期数': np.maximum(_max_run(lose), 1).astype(np.float64),
+    })
+    return data[EVALUATE_COLS]
+
 
 def cal_evaluate(df: pd.DataFrame):
     """
@@ -13,76 +114,8 @@ def cal_evaluate(df: pd.DataFrame):
     :param df: 净值曲线
     :return: 评价
     """
-    # 计算统计指标
-    key = '策略评价'
-    eps = 1e-9
-    results = pd.DataFrame()
-    ls_df = df.copy()
-    ls_df.set_index('candle_begin_time', inplace=True)
-    curve = ls_df['equity_curve'].to_frame(key)
-    curve.index.name = 'candle_begin_time'
-    time_diff = curve.index[-1] - curve.index[0]
-    hour_diff = time_diff.total_seconds() / 3600
-    curve_ = curve.copy()
-    curve.reset_index(inplace=True)
-    curve['本周期多空涨跌幅'] = curve[key].pct_change().fillna(0)
-    # 累积净值
-    results.loc[key, '累积净值'] = round(curve[key].iloc[-1], 3)
-    # 计算当日之前的资金曲线的最高点
-    curve['max2here'] = curve[key].expanding().max()
-    # 计算到历史最高值到当日的跌幅,drowdwon
-    curve['dd2here'] = curve[key] / curve['max2here'] - 1
-    # 计算最大回撤,以及最大回撤结束时间
-    end_date, max_draw_down = tuple(curve.sort_values(by=['dd2here']).iloc[0][['candle_begin_time', 'dd2here']])
-    # 计算最大回撤开始时间
-    start_date = curve[curve['candle_begin_time'] <= end_date].sort_values(by=key, ascending=False).iloc[0][
-        'candle_begin_time']
-    # 将无关的变量删除
-    curve.drop(['max2here', 'dd2here'], axis=1, inplace=True)
-    results.loc[key, '最大回撤'] = format(max_draw_down, '.2%')
-    results.loc[key, '最大回撤开始时间'] = str(start_date)
-    results.loc[key, '最大回撤结束时间'] = str(end_date)
-    # ===统计每个周期
-    results.loc[key, '盈利周期数'] = len(curve.loc[curve['本周期多空涨跌幅'] > 0])  # 盈利笔数
-    results.loc[key, '亏损周期数'] = len(curve.loc[curve['本周期多空涨跌幅'] < 0])  # 亏损笔数
-    results.loc[key, '胜率'] = format(
-        results.loc[key, '盈利周期数'] / (results.loc[key, '盈利周期数'] + results.loc[key, '亏损周期数'] + eps),
-        '.2%')  # 胜率
-    results.loc[key, '每周期平均收益'] = format(curve['本周期多空涨跌幅'].mean(), '.3%')  # 每笔交易平均盈亏
-    if curve.loc[curve['本周期多空涨跌幅'] <= 0]['本周期多空涨跌幅'].mean() != 0:
-        results.loc[key, '盈亏收益比'] = round(
-            curve.loc[curve['本周期多空涨跌幅'] > 0]['本周期多空涨跌幅'].mean() / curve
-            .loc[curve['本周期多空涨跌幅'] <= 0]['本周期多空涨跌幅'].mean() * (-1), 2)  # 盈亏比
-    else:
-        results.loc[key, '盈亏收益比'] = np.nan
-    results.loc[key, '单周期最大盈利'] = format(curve['本周期多空涨跌幅'].max(), '.2%')  # 单笔最大盈利
-    results.loc[key, '单周期大亏损'] = format(curve['本周期多空涨跌幅'].min(), '.2%')  # 单笔最大亏损
-    # ===连续盈利亏损
-    results.loc[key, '最大连续盈利周期数'] = max(
-        [len(list(v)) for k, v in itertools.groupby(np.where(curve['本周期多空涨跌幅'] > 0, 1, np.nan))])  # 最大连续盈利次数
-    results.loc[key, '最大连续亏损周期数'] = max(
-        [len(list(v)) for k, v in itertools.groupby(np.where(curve['本周期多空涨跌幅'] <= 0, 1, np.nan))])  # 最大连续亏损次数
-    # ===每年、每月收益率
-    curve.set_index('candle_begin_time', inplace=True)
-
-    # 计算相对年化 最大回撤 信息系数 波动率
-    result_stats = pd.DataFrame(index=['年化收益', '月化收益', '月信息比', '月化波动'], columns=curve_.columns)
-
-    result_stats.loc['年化收益'] = np.power(curve_.iloc[-1], 365 * 24 / hour_diff) - 1
-    result_stats.loc['月化收益'] = np.power(curve_.iloc[-1], 30.4 * 24 / hour_diff) - 1
-    result_stats.loc['月化波动'] = curve_.pct_change().dropna().apply(lambda x: x.std() * np.sqrt(30.5 * 24))
-    result_stats.loc['月信息比'] = (result_stats.loc['月化收益'] / (result_stats.loc['月化波动'] + eps))
-    result_stats = result_stats.astype('float32').round(3)
-
-    data = multi_list_merge([result_stats.T, results])
-    data['月化收益回撤比'] = data['月化收益'] / (abs(data['最大回撤'].str[:-1].astype('float32')) + eps) * 100
-
-    data = data[['累积净值', '年化收益', '月化收益', '月信息比', '月化波动', '月化收益回撤比', '最大回撤',
-                 '最大回撤开始时间', '最大回撤结束时间', '盈利周期数',
-                 '亏损周期数', '胜率', '每周期平均收益', '盈亏收益比', '单周期最大盈利', '单周期大亏损',
-                 '最大连续盈利周期数',
-                 '最大连续亏损周期数']]
-    data.to_csv('data.csv')
+    data = cal_evaluate_array(df['equity_curve'].to_numpy(dtype=np.float64), df['candle_begin_time'])
+    data.index = ['策略评价']
     return data
 
 
@@ -96,9 +129,11 @@ def multi_list_merge(df_list):
     return merge_df
 
 
-def plot_output(x, data, data_path, save_html=True):
+def plot_output(x, data, data_path, save_html=True, n_points: int = 5000):
+    """
+    资金曲线、回撤、评价表，折线使用 WebGL 并降采样到 n_points 以内，html 大小与历史长度无关
+    """
     x = x.copy()
-    print(x)
     data.index.name = ''
     data = data[['累积净值', '年化收益', '月化收益', '月信息比', '月化波动', '月化收益回撤比', '累积净值',
                  '最大回撤', '最大回撤开始时间',
@@ -122,15 +157,18 @@ def plot_output(x, data, data_path, save_html=True):
     )
 
     # 主图
+    times, net_value = downsample(x['candle_begin_time'], x['net_value'], n_points, 'lttb')
     fig.add_trace(
-        go.Scatter(x=x['candle_begin_time'], y=x['net_value'], mode='lines', name='策略净值'),
+        go.Scattergl(x=times, y=net_value, mode='lines', name='策略净值'),
         secondary_y=False, row=2, col=1,
     )
 
+    times, draw_down = downsample(x['candle_begin_time'], (x['net_value'] / x['net_value'].cummax() - 1).round(4),
+                                  n_points, 'minmax')
     fig.add_trace(
-        go.Scatter(x=x['candle_begin_time'], y=(x['net_value'] / x['net_value'].cummax() - 1).round(4), mode='lines',
-                   name='最大回撤',
-                   line={'color': 'rgba(192,192,192,0.6)', 'width': 1}),
+        go.Scattergl(x=times, y=draw_down, mode='lines',
+                     name='最大回撤',
+                     line={'color': 'rgba(192,192,192,0.6)', 'width': 1}),
         secondary_y=True, row=2, col=1,
     )
 
@@ -1,11 +1,14 @@
 import numpy as np
 import pandas as pd
 
+from program import metrics
+
 pd.set_option('display.max_columns', None)  # 显示所有列
 pd.set_option('display.max_rows', None)  # 显示所有行
 pd.set_option('display.expand_frame_repr', False)  # 不换行
 
 
+@metrics.timed('spread_zscore')
 def cal_zscore(spread: pd.Series, window: int = 24) -> pd.Series:
     """
     z-score计算
@@ -61,48 +64,75 @@ def cal_signal(zscore_series: pd.Series, coint: pd.Series, upper: float, lower:
     })
 
 
-def cal_position(signals: pd.DataFrame):
+def _position_table() -> np.ndarray:
+    """
+    仓位状态转移表，table[当前仓位 + 1, 信号编码] = 新仓位
+    信号编码 = long * 8 + short * 4 + exit_long * 2 + exit_short
+    """
+    table = np.zeros((3, 16), dtype=np.int8)
+    for code in range(16):
+        long, short, exit_long, exit_short = (code >> 3) & 1, (code >> 2) & 1, (code >> 1) & 1, code & 1
+        # 当前是做多 long 和 exit_short 无效，平多后可开空
+        table[2, code] = -1 if short else (0 if exit_long else 1)
+        # 当前是做空 short 和 exit_long 无效，平空后可开多
+        table[0, code] = 1 if long else (0 if exit_short else -1)
+        # 当前是空仓，exit_short 和 exit_long 无效，做多优先
+        table[1, code] = 1 if long else (-1 if short else 0)
+    return table
+
+
+POSITION_TABLE = _position_table()
+
+
+@metrics.timed('position')
+def cal_position_array(long, short, exit_long, exit_short) -> np.ndarray:
+    """
+    仓位状态机的数组实现，规则与 cal_position 相同，可一次计算多个币对/多组参数
+    只在出现信号的k线上转移状态，其余k线沿用上一状态
+    :param long: 开多信号，(n,) 或 (P, n) 布尔数组
+    :param short: 开空信号
+    :param exit_long: 平多信号
+    :param exit_short: 平空信号
+    :return: int8 仓位数组，形状同输入，已右移一根k线（第一根为0），最后一根k线平仓；空输入返回空数组
+    """
+    code = (np.asarray(long, dtype=np.int8) << 3) | (np.asarray(short, dtype=np.int8) << 2) | \
+           (np.asarray(exit_long, dtype=np.int8) << 1) | np.asarray(exit_short, dtype=np.int8)
+    squeeze = code.ndim == 1
+    code = np.atleast_2d(code)
+    n_pair, n = code.shape
+    state = np.zeros(n_pair, dtype=np.int8)
+    position = np.zeros((n_pair, n), dtype=np.int8)
+    # 第0根k线不处理信号，与原循环一致
+    active = np.flatnonzero(code[:, 1:].any(axis=0)) + 1
+    last = 0
+    for i in active:
+        # 上一次信号至今仓位不变，出现信号后下根k线调整
+        position[:, last + 1:i + 1] = state[:, None]
+        state = POSITION_TABLE[state + 1, code[:, i]]
+        last = i
+    position[:, last + 1:] = state[:, None]
+    if n:
+        position[:, 0] = 0
+        # 最后一根k线平仓
+        position[:, -1] = 0
+    return position[0] if squeeze else position
+
+
+def cal_position(signals: pd.DataFrame, compact: bool = False):
     """
     根据信号计算仓位，考虑平仓和开仓信号同时发生的情况
-    :param signals: 包含开多、平多、开空、平空信号的DataFrame
+    :param signals: 包含开多、平多、开空、平空信号的DataFrame（布尔或 int8）
+    :param compact: True 时返回 int8 序列，第一根k线为 0
     :return: 仓位序列，1表示做多，-1表示做空，0表示空仓
     """
-    # 初始化仓位序列，初始状态为0（空仓）
-    position = pd.Series(0, index=signals.index)
-
-    # 遍历信号
-    for i in range(1, len(signals)):
-        # 当前仓位状态
-        current_position = position.iloc[i - 1]
-
-        # 信号
-        long = signals['long'].iloc[i]
-        short = signals['short'].iloc[i]
-        exit_long = signals['exit_long'].iloc[i]
-        exit_short = signals['exit_short'].iloc[i]
-
-        # 处理信号
-        if current_position == 1:  # 当前是做多 long 和 exit_short 无效
-            if exit_long:  # 平多
-                current_position = 0
-            if short:  # 做空信号（平多后开空）
-                current_position = -1
-        elif current_position == -1:  # 当前是做空 short 和 exit_long 无效
-            if exit_short:  # 平空
-                current_position = 0
-            if long:  # 做多信号（平空后开多）
-                current_position = 1
-        else:  # 当前是空仓，exit_short 和 exit_long 无效
-            if long:  # 做多信号
-                current_position = 1
-            elif short:  # 做空信号
-                current_position = -1
-
-        # 更新仓位
-        position.iloc[i] = current_position
-    # 仓位在出现信号后下根K线调整
-    position = position.shift()
-    # 最后一根k线平仓
+    position = cal_position_array(signals['long'].to_numpy(dtype=bool), signals['short'].to_numpy(dtype=bool),
+                                  signals['exit_long'].to_numpy(dtype=bool),
+                                  signals['exit_short'].to_numpy(dtype=bool))
+    if compact:
+        return pd.Series(position, index=signals.index)
+    position = pd.Series(position.astype(np.float64), index=signals.index)
+    # 与逐根循环版本一致，第一根k线无仓位信息，随后最后一根k线平仓（只有一根k线时为0，空输入报 IndexError）
+    position.iloc[0] = np.nan
     position.iloc[-1] = 0
     return position
 
@@ -111,7 +141,9 @@ def invert_position(position_series: pd.Series) -> pd.Series:
     """
     配对交易，对手合约的相反仓位
     :param position_series: target的仓位
-    :return: base的仓位
+    :return: base的仓位，int8 仓位的结果同为 int8
     """
     invert_series = np.where(position_series == 1, -1, np.where(position_series == -1, 1, 0))
+    if position_series.dtype == np.int8:
+        invert_series = invert_series.astype(np.int8)
     return pd.Series(invert_series)
@@ -0,0 +1,152 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from program import metrics
+
+# 对冲比率估计方法：ols 为 rolling_coint 的回看窗口OLS，其余为递推估计
+HEDGE_METHODS = ('ols', 'rls', 'kalman')
+
+
+class RecursiveHedge:
+    """
+    递推估计 y = a + h * x 的对冲比率和截距，每根k线 O(1)、内存与回看长度无关，按币对向量化
+    rls：带遗忘因子的递推最小二乘，lam 越小越偏重近期数据，等效窗口约 1 / (1 - lam) 根k线
+    kalman：(h, a) 为随机游走的状态空间模型，delta 越大对冲比率变化越快
+    先用预热窗口的OLS结果初始化，之后逐根更新；内部按预热窗口均价归一化价格，参数对不同价位的币对通用
+    """
+
+    def __init__(self, method: str = 'rls', lam: float | None = None, delta: float = 1e-4,
+                 obs_var: float | None = None):
+        """
+        :param method: rls / kalman
+        :param lam: rls 遗忘因子，默认 1 - 1 / 预热窗口长度，与回看窗口OLS的记忆长度相当
+        :param delta: kalman 状态噪声，状态协方差每根k线增加 delta / (1 - delta)（归一化价格下）
+        :param obs_var: kalman 观测噪声方差（归一化价格下），默认为预热窗口OLS的残差方差
+        """
+        if method not in ('rls', 'kalman'):
+            raise ValueError(f'unknown hedge method: {method}')
+        self.method = method
+        self.lam = lam
+        self.q = delta / (1 - delta)
+        self.obs_var = obs_var
+
+    def warm_start(self, x: np.ndarray, y: np.ndarray):
+        """
+        :param x: (P, window) 预热窗口的 x 价格
+        :param y: (P, window) 预热窗口的 y 价格
+        """
+        window = x.shape[1]
+        self.sx = x.mean(axis=1)
+        self.sy = y.mean(axis=1)
+        xn = x / self.sx[:, None]
+        yn = y / self.sy[:, None]
+        sum_x, sum_y = xn.sum(axis=1), yn.sum(axis=1)
+        sum_xx, sum_xy = (xn * xn).sum(axis=1), (xn * yn).sum(axis=1)
+        det = window * sum_xx - sum_x * sum_x
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.h = (window * sum_xy - sum_x * sum_y) / det
+            self.a = (sum_y - self.h * sum_x) / window
+            # 协方差取 (XᵀX)⁻¹，kalman 再乘残差方差
+            self.p = np.stack((window / det, -sum_x / det, sum_xx / det))
+        if self.method == 'rls':
+            self.noise = 1 - 1 / window if self.lam is None else self.lam
+        else:
+            residuals = yn - self.a[:, None] - self.h[:, None] * xn
+            var = (residuals ** 2).sum(axis=1) / max(window - 2, 1)
+            self.p = self.p * var
+            self.noise = var if self.obs_var is None else np.full_like(var, self.obs_var)
+
+    def update(self, x: np.ndarray, y: np.ndarray):
+        """
+        加入一根k线
+        :param x: (P,) x 价格
+        :param y: (P,) y 价格
+        """
+        x = x / self.sx
+        y = y / self.sy
+        p11, p12, p22 = self.p
+        if self.method == 'kalman':
+            p11, p22 = p11 + self.q, p22 + self.q
+        error = y - self.h * x - self.a
+        g1 = p11 * x + p12
+        g2 = p12 * x + p22
+        # rls 分母为遗忘因子，kalman 为观测噪声
+        s = self.noise + x * g1 + g2
+        k1, k2 = g1 / s, g2 / s
+        self.h = self.h + k1 * error
+        self.a = self.a + k2 * error
+        self.p = np.stack((p11 - k1 * g1, p12 - k1 * g2, p22 - k2 * g2))
+        if self.method == 'rls':
+            self.p /= self.noise
+
+    @property
+    def hedge_ratio(self) -> np.ndarray:
+        return self.h * self.sy / self.sx
+
+    @property
+    def intercept(self) -> np.ndarray:
+        return self.a * self.sy
+
+
+@metrics.timed('hedge')
+def recursive_hedge(x, y, warmup: int, method: str = 'rls', **params) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    多个币对一次递推，对齐方式与 rolling_coint 相同：第 i 根k线的结果只用到第 i 根之前的数据
+    :param x: (n,) 或 (P, n) 价格 x
+    :param y: (n,) 或 (P, n) 价格 y
+    :param warmup: 预热窗口，一般取 rolling_coint 的回看窗口
+    :param method: rls / kalman
+    :param params: RecursiveHedge 的参数
+    :return: 对冲比率、截距，(n - warmup,) 或 (P, n - warmup)，对应第 warmup 根k线起
+    """
+    squeeze = np.ndim(x) == 1
+    x = np.atleast_2d(np.asarray(x, dtype=np.float64))
+    y = np.atleast_2d(np.asarray(y, dtype=np.float64))
+    n_out = max(x.shape[1] - warmup, 0)
+    h_ratio = np.full((x.shape[0], n_out), np.nan)
+    intercept = np.full((x.shape[0], n_out), np.nan)
+    if n_out:
+        model = RecursiveHedge(method, **params)
+        model.warm_start(x[:, :warmup], y[:, :warmup])
+        # 按k线逐列更新，转为 (n, P) 使每列连续
+        xt = np.ascontiguousarray(x[:, warmup:].T)
+        yt = np.ascontiguousarray(y[:, warmup:].T)
+        for i in range(n_out):
+            h_ratio[:, i] = model.hedge_ratio
+            intercept[:, i] = model.intercept
+            model.update(xt[i], yt[i])
+    if squeeze:
+        return h_ratio[0], intercept[0]
+    return h_ratio, intercept
+
+
+def hedge_series(s1: pd.Series, s2: pd.Series, back_hour: int, method: str = 'rls', **params) -> pd.Series:
+    """
+    单币对递推对冲比率，索引、名称、精度与 rolling_coint 的对冲比率相同，可直接用于 cal_spread
+    """
+    h_ratio, _ = recursive_hedge(s1.to_numpy(dtype=np.float64), s2.to_numpy(dtype=np.float64), back_hour,
+                                 method, **params)
+    return pd.Series(np.round(h_ratio, 5), index=s1.index[back_hour:], name='hedge_ratio')
+
+
+def hedge_panel(prices: pd.DataFrame, pairs: List[Tuple[str, str]], back_hour: int, method: str = 'rls',
+                **params) -> pd.DataFrame:
+    """
+    多币对递推对冲比率，全部币对一次计算
+    :param prices: 收盘价，每列一个币种，同一时间轴，无空值
+    :param pairs: [(base, target), ...]
+    :param back_hour: 预热窗口
+    :param method: rls / kalman
+    :param params: RecursiveHedge 的参数
+    :return: 每列一个币对（base_target），索引为 prices.index[back_hour:]；
+             价差为 prices[target] - prices[base] * 对冲比率，与 cal_spread 相同
+    """
+    values = prices.to_numpy(dtype=np.float64).T
+    loc: Dict[str, int] = {symbol: i for i, symbol in enumerate(prices.columns)}
+    base_idx = [loc[a] for a, _ in pairs]
+    target_idx = [loc[b] for _, b in pairs]
+    h_ratio, _ = recursive_hedge(values[base_idx], values[target_idx], back_hour, method, **params)
+    return pd.DataFrame(np.round(h_ratio, 5).T, index=prices.index[back_hour:],
+                        columns=[f'{a}_{b}' for a, b in pairs])
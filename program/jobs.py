@@ -0,0 +1,200 @@
+import os
+import pickle
+import struct
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+from joblib import Parallel, delayed
+
+from program import metrics
+
+# 记录头：键长度（uint32）、值长度（uint64）
+_HEADER = struct.Struct('<IQ')
+# 第一条记录保存任务参数，重启时校验
+_META_KEY = '__meta__'
+
+
+class JobStore:
+    """
+    只追加的结果文件，每条记录为 记录头 + 键（utf-8）+ 值（pickle）
+    打开时只读取记录头和键、跳过值，重启的开销与已完成结果的大小无关；
+    末尾写了一半的记录（进程被杀、OOM）在打开时截掉，其余记录不受影响
+    只在主进程写入，worker 不访问
+    """
+
+    def __init__(self, path: str, meta: Dict | None = None, sync: bool = False):
+        """
+        :param path: 文件路径，不存在时创建
+        :param meta: 任务参数（窗口、时间区间等），与文件中已有的不一致时报错，避免不同参数的结果混在一起
+        :param sync: True 时每条记录 fsync，断电也不丢；False 时只 flush，进程崩溃不丢
+        """
+        self.path = path
+        self.sync = sync
+        # key -> (值的偏移, 值的长度)
+        self._offsets: Dict[str, Tuple[int, int]] = {}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, 'a+b')
+        self._scan()
+        if meta is not None:
+            if _META_KEY in self._offsets:
+                if self.get(_META_KEY) != meta:
+                    raise ValueError(f'{path} was written with different parameters: {self.get(_META_KEY)}')
+            else:
+                self.append(_META_KEY, meta)
+
+    def _scan(self):
+        """
+        读取全部记录头建立索引，截掉末尾不完整的记录
+        """
+        f = self._file
+        size = f.seek(0, os.SEEK_END)
+        f.seek(0)
+        offset = 0
+        while offset + _HEADER.size <= size:
+            key_len, value_len = _HEADER.unpack(f.read(_HEADER.size))
+            value_offset = offset + _HEADER.size + key_len
+            if value_offset + value_len > size:
+                break
+            key = f.read(key_len).decode('utf-8')
+            self._offsets[key] = (value_offset, value_len)
+            offset = value_offset + value_len
+            f.seek(offset)
+        if offset < size:
+            f.truncate(offset)
+
+    def append(self, key: str, value: Any):
+        """
+        追加一条结果，同一个键再次写入时以最后一次为准
+        """
+        key_bytes = key.encode('utf-8')
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        f = self._file
+        offset = f.seek(0, os.SEEK_END)
+        f.write(_HEADER.pack(len(key_bytes), len(blob)) + key_bytes + blob)
+        f.flush()
+        if self.sync:
+            os.fsync(f.fileno())
+        self._offsets[key] = (offset + _HEADER.size + len(key_bytes), len(blob))
+
+    def get(self, key: str) -> Any:
+        offset, length = self._offsets[key]
+        self._file.seek(offset)
+        return pickle.loads(self._file.read(length))
+
+    def keys(self) -> List[str]:
+        """
+        已完成的任务，按写入顺序
+        """
+        return [key for key in self._offsets if key != _META_KEY]
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        """
+        逐条读取结果，不一次载入内存
+        """
+        for key in self.keys():
+            yield key, self.get(key)
+
+    def values(self) -> Iterator[Any]:
+        for _, value in self.items():
+            yield value
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - (_META_KEY in self._offsets)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _run_chunk(func: Callable, chunk: List[Tuple[str, tuple]]) -> List[Tuple[str, bool, Any, float]]:
+    """
+    worker 中依次执行一块任务，单个任务出错不影响同一块的其他任务
+    :return: [(key, 是否成功, 结果或错误信息, 耗时)]
+    """
+    results = []
+    for key, args in chunk:
+        begin = time.perf_counter()
+        try:
+            results.append((key, True, func(*args), time.perf_counter() - begin))
+        except Exception as e:
+            results.append((key, False, repr(e), time.perf_counter() - begin))
+    return results
+
+
+def run_jobs(func: Callable, jobs: Iterable[Tuple[str, tuple]], store: JobStore, n_jobs: int = -1,
+             target_seconds: float = 2.0, max_chunk: int = 256, pre_dispatch: str = '2 * n_jobs',
+             verbose: bool = True) -> Dict:
+    """
+    可断点续跑的币对任务调度：结果完成一个写入一个，重启时跳过已完成的任务
+    每块任务数按已完成任务的平均耗时调整，使每块约 target_seconds 秒：
+    开头几块只含 1 个任务用于测量，耗时短的任务合并成大块以减少调度开销，耗时长的任务单独成块
+    同时在途的块数由 pre_dispatch 限制，结果写盘后即释放，内存与任务总数无关
+    :param func: 任务函数 func(*args)，需可 pickle（模块级函数）
+    :param jobs: [(key, args)]，key 唯一标识任务，如 'BTC-USDT_ETH-USDT'
+    :param store: 结果文件
+    :param n_jobs: 进程数
+    :param target_seconds: 每块目标耗时
+    :param max_chunk: 每块任务数上限
+    :param pre_dispatch: 同时在途的块数，同 joblib.Parallel
+    :param verbose: 打印进度
+    :return: 统计：总任务数、跳过（已完成）、本次完成、失败任务及错误信息、平均耗时、总耗时
+    """
+    begin = time.time()
+    pending = []
+    total = skipped = 0
+    for key, args in jobs:
+        total += 1
+        if key in store:
+            skipped += 1
+        else:
+            pending.append((key, args))
+    metrics.count('jobs', 'skipped', skipped)
+    stats = {'total': total, 'skipped': skipped, 'done': 0, 'failed': {}, 'mean_cost': 0.0}
+    if not pending:
+        stats['seconds'] = time.time() - begin
+        return stats
+
+    cost = {'seconds': 0.0, 'n': 0}
+
+    def chunk_size() -> int:
+        if cost['n'] == 0:
+            return 1
+        return max(1, min(max_chunk, int(target_seconds * cost['n'] / max(cost['seconds'], 1e-9))))
+
+    def chunks():
+        # 由 joblib 按需取用，每块的大小在派发时根据当时的平均耗时决定
+        i = 0
+        while i < len(pending):
+            size = chunk_size()
+            yield delayed(metrics.recorded(_run_chunk))(func, pending[i:i + size])
+            i += size
+
+    parallel = Parallel(n_jobs=n_jobs, return_as='generator_unordered', pre_dispatch=pre_dispatch)
+    last_print = time.time()
+    for results in parallel(chunks()):
+        # worker 内的环节耗时、计数合并到主进程
+        for key, ok, value, seconds in metrics.collect(results):
+            cost['seconds'] += seconds
+            cost['n'] += 1
+            if ok:
+                store.append(key, value)
+                stats['done'] += 1
+            else:
+                stats['failed'][key] = value
+        if verbose and time.time() - last_print > 10:
+            last_print = time.time()
+            print(f'jobs {skipped + stats["done"]}/{total} failed {len(stats["failed"])} '
+                  f'chunk {chunk_size()} elapsed {last_print - begin:.0f}s', flush=True)
+    metrics.count('jobs', 'done', stats['done'])
+    metrics.count('jobs', 'failed', len(stats['failed']))
+    stats['mean_cost'] = cost['seconds'] / cost['n']
+    stats['seconds'] = time.time() - begin
+    return stats
@@ -0,0 +1,213 @@
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from program.adf import adf_coint_batch
+from program.common import extract_col
+from program.function import POSITION_TABLE
+from program.hedge import RecursiveHedge
+
+
+class RingBuffer:
+    """
+    (P, window) 滑动窗口，每个值同时写入 k 和 k + window 两个位置，任何时刻最近 window 个值都是连续切片
+    """
+
+    def __init__(self, n_pair: int, window: int):
+        self.window = window
+        self.buf = np.zeros((n_pair, 2 * window), dtype=np.float64)
+        self.count = 0
+
+    def push(self, values: np.ndarray) -> np.ndarray | None:
+        """
+        写入一列新值
+        :return: 被挤出窗口的旧值，窗口未满时为 None
+        """
+        k = self.count % self.window
+        old = self.buf[:, k].copy() if self.count >= self.window else None
+        self.buf[:, k] = values
+        self.buf[:, k + self.window] = values
+        self.count += 1
+        return old
+
+    def window_view(self) -> np.ndarray:
+        """
+        最近 window 个值，按时间先后排列，零拷贝
+        """
+        k = self.count % self.window
+        return self.buf[:, k:k + self.window]
+
+
+class LiveEngine:
+    """
+    逐根k线增量计算的配对交易引擎，结果与 rolling_coint -> cal_spread -> cal_zscore -> cal_signal -> cal_position
+    的批量计算逐根一致
+    每个币对保存：回归累加和、价差 z-score 的滑动均值方差、上一根 z-score、协整状态、当前仓位，全部按币对向量化
+    回归、z-score、信号、仓位每根k线 O(1)；累加和每满一个窗口按窗口精确重算一次以消除误差（均摊 O(1)）；
+    协整 adf 检验不是增量计算：需要整个回看窗口的残差，每次对全部币对批量重算，O(back_hour × P)，是每根k线的主要开销；
+    refit_every > 1 时只每 refit_every 根k线重算一次 adf，其间沿用上次的协整状态和OLS对冲比率，
+    均摊为 O(back_hour × P / refit_every)，与 rolling_coint(refit_every=...) 逐根一致
+    hedge 为 rls、kalman 时对冲比率改用递推估计，与 rolling_coint(hedge=...) 一致
+    """
+
+    def __init__(self, pairs: List[Tuple[str, str]], back_hour: int = 24 * 30, zscore_window: int = 168,
+                 upper: float = 2, lower: float = -2, hedge: str = 'ols', hedge_params: Dict | None = None,
+                 refit_every: int = 1):
+        self.pairs = pairs
+        self.symbols = sorted({symbol for pair in pairs for symbol in pair})
+        loc = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.base_idx = np.array([loc[a] for a, _ in pairs])
+        self.target_idx = np.array([loc[b] for _, b in pairs])
+        self.back_hour = back_hour
+        self.zscore_window = zscore_window
+        self.upper = upper
+        self.lower = lower
+        self.refit_every = refit_every
+
+        n_pair = len(pairs)
+        self.x = RingBuffer(n_pair, back_hour)
+        self.y = RingBuffer(n_pair, back_hour)
+        # 回归累加和，以第一根k线价格为原点，降低精度损失
+        self.x0 = None
+        self.y0 = None
+        self.sums = np.zeros((4, n_pair), dtype=np.float64)
+        # 递推对冲比率，第一个回看窗口满时预热
+        self.hedge = None if hedge == 'ols' else RecursiveHedge(hedge, **(hedge_params or {}))
+        # 价差滑动窗口的均值、离差平方和
+        self.spread = RingBuffer(n_pair, zscore_window)
+        self.mean = np.zeros(n_pair, dtype=np.float64)
+        self.m2 = np.zeros(n_pair, dtype=np.float64)
+        self.prev_z = np.full(n_pair, np.nan)
+        # 上一根k线协整状态，-1 表示尚无结果
+        self.prev_coint = np.full(n_pair, -1, dtype=np.int8)
+        # 上次重算的协整状态、OLS对冲比率
+        self.coint = np.zeros(n_pair, dtype=bool)
+        self.h = np.full(n_pair, np.nan)
+        self.state = np.zeros(n_pair, dtype=np.int8)
+        self.n_bar = 0
+
+    def _update_sums(self, x: np.ndarray, y: np.ndarray):
+        old_x = self.x.push(x)
+        old_y = self.y.push(y)
+        if self.x.count % self.back_hour == 0:
+            # 每满一个窗口精确重算
+            xc = self.x.window_view() - self.x0[:, None]
+            yc = self.y.window_view() - self.y0[:, None]
+            self.sums = np.stack((xc.sum(axis=1), yc.sum(axis=1), (xc * xc).sum(axis=1), (xc * yc).sum(axis=1)))
+            return
+        xc, yc = x - self.x0, y - self.y0
+        self.sums += np.stack((xc, yc, xc * xc, xc * yc))
+        if old_x is not None:
+            xc, yc = old_x - self.x0, old_y - self.y0
+            self.sums -= np.stack((xc, yc, xc * xc, xc * yc))
+
+    def _update_zscore(self, spread: np.ndarray) -> np.ndarray:
+        window = self.zscore_window
+        old = self.spread.push(spread)
+        n = min(self.spread.count, window)
+        if self.spread.count % window == 0:
+            values = self.spread.window_view()
+            self.mean = values.mean(axis=1)
+            self.m2 = ((values - self.mean[:, None]) ** 2).sum(axis=1)
+        else:
+            # 滑动窗口 Welford：先移除旧值，再加入新值
+            if old is not None:
+                delta = old - self.mean
+                self.mean -= delta / (n - 1)
+                self.m2 -= delta * (old - self.mean)
+            delta = spread - self.mean
+            self.mean += delta / n
+            self.m2 += delta * (spread - self.mean)
+            self.m2 = np.maximum(self.m2, 0)
+        if self.spread.count < window:
+            return np.full(len(spread), np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (spread - self.mean) / np.sqrt(self.m2 / (window - 1))
+
+    def on_bar(self, closes: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        输入一根新k线的收盘价，输出本根k线的协整状态、对冲比率、价差、z-score、信号，以及下一根k线的目标仓位
+        :param closes: 各币种收盘价，顺序同 self.symbols
+        :return: 每项为 (P,) 数组
+        """
+        closes = np.asarray(closes, dtype=np.float64)
+        x = closes[self.base_idx]
+        y = closes[self.target_idx]
+        n_pair = len(self.pairs)
+        if self.x0 is None:
+            self.x0, self.y0 = x.copy(), y.copy()
+
+        is_coint = np.zeros(n_pair, dtype=bool)
+        has_coint = self.x.count >= self.back_hour
+        hedge_ratio = np.full(n_pair, np.nan)
+        spread = np.full(n_pair, np.nan)
+        zscore = np.full(n_pair, np.nan)
+        if has_coint:
+            # 回归窗口为之前 back_hour 根k线，不含当前k线
+            w = self.back_hour
+            if (self.x.count - w) % self.refit_every == 0:
+                sx, sy, sxx, sxy = self.sums
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    h = (w * sxy - sx * sy) / (w * sxx - sx * sx)
+                intercept = self.y0 + (sy - h * sx) / w - h * self.x0
+                residuals = self.y.window_view() - intercept[:, None] - h[:, None] * self.x.window_view()
+                self.coint = adf_coint_batch(residuals)
+                self.h = h
+            is_coint = self.coint
+            if self.hedge is None:
+                hedge_ratio = np.round(self.h, 5)
+            else:
+                if self.x.count == w:
+                    self.hedge.warm_start(self.x.window_view(), self.y.window_view())
+                hedge_ratio = np.round(self.hedge.hedge_ratio, 5)
+                self.hedge.update(x, y)
+            spread = y - x * hedge_ratio
+            zscore = self._update_zscore(spread)
+        self._update_sums(x, y)
+
+        # 信号，与 cal_signal 相同，空值比较均为 False
+        prev_z = self.prev_z
+        with np.errstate(invalid='ignore'):
+            coint_false = (self.prev_coint == 1) & ~is_coint & has_coint
+            exit_long = ((prev_z <= 0) & (zscore > 0)) | coint_false
+            exit_short = ((prev_z >= 0) & (zscore < 0)) | coint_false
+            long = (prev_z >= self.lower) & (zscore < self.lower) & is_coint
+            short = (prev_z <= self.upper) & (zscore > self.upper) & is_coint
+        # 仓位，与 cal_position 相同，第一根k线不处理信号
+        if self.n_bar > 0:
+            code = (long.astype(np.int8) << 3) | (short.astype(np.int8) << 2) | \
+                   (exit_long.astype(np.int8) << 1) | exit_short.astype(np.int8)
+            self.state = POSITION_TABLE[self.state + 1, code]
+
+        self.prev_z = zscore
+        if has_coint:
+            self.prev_coint = is_coint.astype(np.int8)
+        self.n_bar += 1
+        return {
+            'is_coint': is_coint,
+            'hedge_ratio': hedge_ratio,
+            'spread': spread,
+            'zscore': zscore,
+            'long': long,
+            'short': short,
+            'exit_long': exit_long,
+            'exit_short': exit_short,
+            'position': self.state.copy(),
+        }
+
+
+def replay_feed(data: Dict[str, pd.DataFrame], symbols: List[str], start_time,
+                end_time) -> Iterator[Tuple[pd.Timestamp, np.ndarray]]:
+    """
+    用历史数据模拟实时k线推送
+    :param data: {symbol: DataFrame}，load_data 的结果
+    :param symbols: 币种，顺序同 LiveEngine.symbols
+    :param start_time: 开始时间
+    :param end_time: 结束时间
+    :return: 逐根产出 (candle_begin_time, 各币种收盘价)
+    """
+    closes = np.column_stack([extract_col(data[symbol], 'close', start_time, end_time) for symbol in symbols])
+    times = extract_col(data[symbols[0]], 'candle_begin_time', start_time, end_time)
+    for t, row in zip(times, closes):
+        yield t, row
@@ -0,0 +1,259 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, Tuple
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# 未开启时 stage 返回的空上下文，不计时、不分配对象
+_NULL = nullcontext()
+
+
+def _rss() -> int | None:
+    """
+    当前进程常驻内存（字节），psutil 不可用时读取 /proc，均不可用时返回 None
+    """
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class _Stage:
+    __slots__ = ('recorder', 'name', 'begin')
+
+    def __init__(self, recorder: 'Recorder', name: str):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.begin = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.recorder.add_time(self.name, time.perf_counter() - self.begin)
+
+
+class Recorder:
+    """
+    运行统计：各环节耗时、各类淘汰原因计数、内存峰值采样
+    只统计本进程；joblib 任务经 recorded 包装后在 worker 内统计，snapshot 随结果返回，由 collect 在主进程 merge
+    """
+
+    def __init__(self, sample_interval: float | None = 0.5):
+        self.begin = time.time()
+        # name -> [调用次数, 总耗时, 单次最大耗时]
+        self.timers: Dict[str, list] = {}
+        # group -> {reason: 次数}
+        self.counters: Dict[str, Dict[str, int]] = {}
+        self.peak_rss = 0
+        self.samples = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        if sample_interval:
+            self._thread = threading.Thread(target=self._sample_loop, args=(sample_interval,), daemon=True)
+            self._thread.start()
+
+    def stage(self, name: str) -> _Stage:
+        return _Stage(self, name)
+
+    def add_time(self, name: str, seconds: float, calls: int = 1):
+        with self._lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                self.timers[name] = [calls, seconds, seconds]
+            else:
+                timer[0] += calls
+                timer[1] += seconds
+                timer[2] = max(timer[2], seconds)
+
+    def count(self, group: str, reason: str, n: int = 1):
+        with self._lock:
+            counter = self.counters.setdefault(group, {})
+            counter[reason] = counter.get(reason, 0) + n
+
+    def sample_memory(self):
+        rss = _rss()
+        if rss is not None:
+            self.peak_rss = max(self.peak_rss, rss)
+            self.samples.append((round(time.time() - self.begin, 3), rss))
+
+    def _sample_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            self.sample_memory()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.sample_memory()
+
+    def snapshot(self) -> Dict:
+        """
+        可 json 序列化的运行报告
+        """
+        with self._lock:
+            stages = {name: {'calls': calls, 'seconds': seconds, 'mean': seconds / calls, 'max': longest}
+                      for name, (calls, seconds, longest) in self.timers.items()}
+            counters = {group: dict(counter) for group, counter in self.counters.items()}
+        memory = {'peak_rss_mb': self.peak_rss / 2 ** 20,
+                  'samples': [(t, rss / 2 ** 20) for t, rss in self.samples]}
+        if resource is not None:
+            # linux 下 ru_maxrss 单位为 KB
+            memory['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        return {'wall_seconds': time.time() - self.begin, 'pid': os.getpid(), 'stages': stages,
+                'counters': counters, 'memory': memory}
+
+    def merge(self, snapshot: Dict):
+        """
+        合并其他进程的 snapshot（耗时、计数累加，内存取峰值）
+        """
+        for name, stage in snapshot['stages'].items():
+            self.add_time(name, stage['seconds'], stage['calls'])
+            self.timers[name][2] = max(self.timers[name][2], stage['max'])
+        for group, counter in snapshot['counters'].items():
+            for reason, n in counter.items():
+                self.count(group, reason, n)
+        self.peak_rss = max(self.peak_rss, int(snapshot['memory']['peak_rss_mb'] * 2 ** 20))
+
+
+# 当前进程的统计，None 表示关闭
+_recorder: Recorder | None = None
+
+
+def enable(sample_interval: float | None = 0.5) -> Recorder:
+    """
+    开启统计，重复调用时返回已有的 Recorder
+    :param sample_interval: 内存采样间隔（秒），None 不采样
+    """
+    global _recorder
+    if _recorder is None:
+        _recorder = Recorder(sample_interval)
+    return _recorder
+
+
+def disable() -> Dict | None:
+    """
+    关闭统计
+    :return: 关闭前的运行报告
+    """
+    global _recorder
+    if _recorder is None:
+        return None
+    _recorder.close()
+    report = _recorder.snapshot()
+    _recorder = None
+    return report
+
+
+def enabled() -> bool:
+    return _recorder is not None
+
+
+def stage(name: str):
+    """
+    环节计时，with metrics.stage('adf'): ...，关闭时为空上下文
+    """
+    return _NULL if _recorder is None else _Stage(_recorder, name)
+
+
+def timed(name: str) -> Callable:
+    """
+    函数级环节计时装饰器，关闭时直接调用原函数
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return func(*args, **kwargs)
+            with _Stage(_recorder, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(group: str, reason: str, n: int = 1):
+    """
+    计数，如 count('process_pair', 'skip')，关闭时不做任何事
+    """
+    if _recorder is not None:
+        _recorder.count(group, reason, n)
+
+
+def _run_recorded(func: Callable, *args, **kwargs) -> Tuple[Any, Dict]:
+    global _recorder
+    outer = _recorder
+    _recorder = Recorder(None)
+    try:
+        result = func(*args, **kwargs)
+        _recorder.sample_memory()
+        return result, _recorder.snapshot()
+    finally:
+        _recorder = outer
+
+
+def recorded(func: Callable) -> Callable:
+    """
+    joblib 任务函数的包装：统计开启时任务在 worker 内单独统计，返回 (结果, snapshot)，需用 collect 取回结果；
+    关闭时原样返回 func。用法 delayed(metrics.recorded(func))(...)，func 需可 pickle
+    """
+    return func if _recorder is None else functools.partial(_run_recorded, func)
+
+
+def collect(result):
+    """
+    recorded 任务的返回值：把 worker 的统计合并到本进程，返回任务结果；统计关闭时原样返回
+    """
+    if _recorder is None:
+        return result
+    value, snapshot = result
+    _recorder.merge(snapshot)
+    return value
+
+
+def report() -> Dict | None:
+    """
+    当前运行报告，未开启时返回 None
+    """
+    if _recorder is None:
+        return None
+    _recorder.sample_memory()
+    return _recorder.snapshot()
+
+
+def save_report(path: str) -> Dict | None:
+    """
+    运行报告写入 json 文件
+    """
+    data = report()
+    if data is not None:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+    return data
+
+
+def format_report(data: Dict) -> str:
+    """
+    运行报告的简要文字版本：各环节耗时、计数、内存峰值
+    """
+    lines = [f'wall {data["wall_seconds"]:.2f}s  peak rss {data["memory"]["peak_rss_mb"]:.0f}MB']
+    for name, stage_ in sorted(data['stages'].items(), key=lambda item: -item[1]['seconds']):
+        lines.append(f'  {name:<16}{stage_["seconds"]:>10.3f}s {stage_["calls"]:>10} calls')
+    for group, counter in data['counters'].items():
+        lines.append(f'  {group}: ' + ' '.join(f'{reason}={n}' for reason, n in counter.items()))
+    return '\n'.join(lines)
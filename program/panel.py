@@ -0,0 +1,108 @@
+import json
+import os
+import tempfile
+import uuid
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+
+def _panel_dir() -> str:
+    """
+    共享价格矩阵的存放目录，linux 下优先使用内存文件系统 /dev/shm
+    """
+    return '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+
+class PricePanel:
+    """
+    共享价格矩阵：一个连续的 (时间 × 币种) float 数组，存放于内存映射文件
+    主进程 create 一次，并行 worker 通过 name attach，任务参数只传币种下标，不再逐币对 pickle 价格序列
+    数组按列存储（fortran order），每个币种的序列在内存中连续
+    """
+
+    def __init__(self, name: str, values: np.ndarray, symbols: List[str], index: np.ndarray, owner: bool = False):
+        self.name = name
+        self.values = values
+        self.symbols = symbols
+        self.index = index
+        self.owner = owner
+        self._loc = {symbol: i for i, symbol in enumerate(symbols)}
+
+    @classmethod
+    def create(cls, prices: pd.DataFrame, name: str | None = None, dtype=np.float64) -> 'PricePanel':
+        """
+        由价格矩阵创建共享文件
+        :param prices: 价格矩阵，每列一个币种
+        :param name: 文件路径前缀，默认在 /dev/shm 下随机生成
+        :param dtype: 存储精度
+        :return: PricePanel，退出 with 或调用 unlink 时删除文件
+        """
+        name = name or os.path.join(_panel_dir(), f'price_panel_{uuid.uuid4().hex}')
+        values = np.lib.format.open_memmap(name + '.npy', mode='w+', dtype=dtype, shape=prices.shape,
+                                           fortran_order=True)
+        values[:] = prices.to_numpy(dtype=dtype)
+        values.flush()
+        index = np.asarray(prices.index)
+        np.save(name + '.index.npy', index, allow_pickle=False)
+        symbols = [str(c) for c in prices.columns]
+        with open(name + '.json', 'w', encoding='utf-8') as f:
+            json.dump(symbols, f)
+        return cls(name, values, symbols, index, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> 'PricePanel':
+        """
+        按名称挂载已创建的共享价格矩阵（只读），每个进程只打开一次
+        :param name: create 返回的 name
+        :return: PricePanel
+        """
+        panel = _attached.get(name)
+        if panel is None:
+            values = np.load(name + '.npy', mmap_mode='r')
+            index = np.load(name + '.index.npy', allow_pickle=False)
+            with open(name + '.json', encoding='utf-8') as f:
+                symbols = json.load(f)
+            panel = cls(name, values, symbols, index)
+            _attached[name] = panel
+        return panel
+
+    def loc(self, symbol: str) -> int:
+        """
+        币种下标
+        """
+        return self._loc[symbol]
+
+    def column(self, i: int) -> np.ndarray:
+        """
+        第 i 个币种的价格序列，零拷贝
+        """
+        return self.values[:, i]
+
+    def series(self, i: int) -> pd.Series:
+        """
+        第 i 个币种的价格序列，RangeIndex，与 extract_col 返回值一致
+        """
+        return pd.Series(self.values[:, i], name=self.symbols[i], copy=False)
+
+    def unlink(self):
+        """
+        删除共享文件，仅创建者调用
+        """
+        _attached.pop(self.name, None)
+        self.values = None
+        for suffix in ('.npy', '.index.npy', '.json'):
+            if os.path.exists(self.name + suffix):
+                os.remove(self.name + suffix)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.owner:
+            self.unlink()
+
+
+# 本进程已挂载的共享价格矩阵，worker 复用同一份映射
+_attached: Dict[str, PricePanel] = {}
@@ -0,0 +1,204 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+from program import metrics
+from program.cache import ResultCache
+from program.common import cal_spread, extract_cols
+from program.curve import cal_equity_curve_array, _trade_masks
+from program.evaluate import cal_evaluate_array
+from program.function import cal_zscore, cal_signal, cal_position_array
+from program.rolling import rolling_coint
+
+
+def load_pairs(path: str, top_n: int | None = None) -> List[Tuple[str, str]]:
+    """
+    读取批量协整计算结果（coint_pairs.csv）的前 top_n 个协整币对
+    :param path: csv 路径
+    :param top_n: 币对数，默认全部
+    :return: [(base, target), ...]
+    """
+    df = pd.read_csv(path)
+    df = df[df['is_coint'] == True]
+    if top_n is not None:
+        df = df.head(top_n)
+    return list(zip(df['base'], df['target']))
+
+
+def _pair_position(base_close: np.ndarray, target_close: np.ndarray, back_hour: int, zscore_window: int,
+                   upper: float, lower: float, cache: ResultCache | None = None, trade_start: int = 0,
+                   hedge: str = 'ols') -> np.ndarray:
+    """
+    单币对 target 仓位，流程同 script/playback.py
+    trade_start 之前的k线只用于预热，信号置空，从空仓开始交易
+    """
+    base_close = pd.Series(base_close, name='close')
+    target_close = pd.Series(target_close, name='close')
+    coint, h_ratio, _ = rolling_coint(base_close, target_close, back_hour, fast=True, cache=cache, hedge=hedge)
+    spread = cal_spread(base_close, target_close, hedge_ratio=h_ratio)
+    signal = cal_signal(cal_zscore(spread, zscore_window), coint, upper, lower)
+    signal.iloc[:trade_start] = False
+    return cal_position_array(*(signal[col].to_numpy(dtype=bool)
+                                for col in ('long', 'short', 'exit_long', 'exit_short')))
+
+
+def _pair_weight(ret: np.ndarray, base_idx: np.ndarray, target_idx: np.ndarray, weighting: str,
+                 warmup: int) -> np.ndarray:
+    """
+    各币对资金权重，和为 1
+    equal：等权；vol：按滚动协整预热期（尚无仓位）内多空组合收益波动率倒数分配，不使用未来数据
+    """
+    n_pair = len(base_idx)
+    if weighting == 'equal':
+        return np.full(n_pair, 1 / n_pair)
+    if weighting == 'vol':
+        vol = np.std(ret[target_idx, :warmup] - ret[base_idx, :warmup], axis=1)
+        inv = np.where(vol > 0, 1 / np.where(vol > 0, vol, 1), 0)
+        return inv / inv.sum()
+    raise ValueError(f'unknown weighting: {weighting}')
+
+
+def _sum_by_symbol(values: np.ndarray, sym_idx: np.ndarray, n_symbol: int) -> np.ndarray:
+    """
+    各条腿 (L, n) 按币种求和为 (S, n)
+    """
+    out = np.zeros((n_symbol, values.shape[1]))
+    np.add.at(out, sym_idx, values)
+    return out
+
+
+def backtest_portfolio(data: Dict[str, pd.DataFrame], pairs: List[Tuple[str, str]], start_time, end_time,
+                       back_hour: int = 24 * 30, zscore_window: int = 168, upper: float = 2, lower: float = -2,
+                       leverage: float = 2, slippage: float = 1 / 1000, c_rate: float = 5 / 10000,
+                       weighting: str = 'equal', symbol_cap: float | None = None, trade_start=None,
+                       n_jobs: int = -1, cache: ResultCache | None = None, hedge: str = 'ols',
+                       cost_rebate: bool = True,
+                       delisted: Dict[str, pd.Timestamp] | None = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    多币对组合回测，merge_curve 的推广：每个币对是一个子账户，两条腿按 cal_equity_curve_array 计算，组合为各子账户按权重静态加权
+    各币对信号、仓位并行计算，全部 2P 条腿一次计算资金曲线
+    cost_rebate 为只作用于手续费的近似：同一根k线上多个币对在同一币种上的成交相互抵消，组合只按净成交量支付手续费和滑点，
+    抵消部分的成本返还给组合；持仓不按币种净额，保证金、爆仓仍按各币对子账户的每条腿分别计算（逐仓）。
+    因此两个币对在同一币种上方向相反时，即使该币种净持仓为 0，其中一条腿仍可能单独爆仓，而真实的净额账户不会；
+    不爆仓时净持仓的盈亏等于各腿盈亏之和，资金曲线只在成本和爆仓上与净额账户不同；
+    net_exposure 为按币种净额后的敞口，仅作统计
+    :param data: {symbol: DataFrame 或 SymbolIndex}，含 candle_begin_time open high low close
+    :param pairs: [(base, target), ...]
+    :param start_time: 开始时间
+    :param end_time: 结束时间
+    :param back_hour: 滚动协整回看窗口，未指定 trade_start 时同时作为 vol 权重的预热期
+    :param zscore_window: z-score 窗口
+    :param upper: 上界
+    :param lower: 下界
+    :param leverage: 杠杆倍数
+    :param slippage: 滑点
+    :param c_rate: 手续费
+    :param weighting: equal 等权 / vol 波动率倒数加权
+    :param symbol_cap: 单币种净持仓上限（占组合初始资金比例），按开仓时的目标持仓估算，
+                       超出时该k线开仓的交易按比例降低杠杆，默认不限制
+    :param trade_start: 开始交易时间，之前的k线只用于滚动协整、z-score 预热，结果从该时间开始；默认 start_time
+    :param n_jobs: 进程数
+    :param cache: 滚动协整结果缓存
+    :param hedge: 对冲比率估计方法，ols / rls / kalman，见 rolling_coint
+    :param cost_rebate: 是否返还同币种反向成交抵消部分的手续费和滑点（只影响成本，不影响持仓和爆仓），
+                        False 时各腿按自身成交付费
+    :param delisted: {symbol: 最后一根有效k线时间}，如交易期内下架的币种，之后的价格应填为该k线收盘价；
+                     所在币对持仓在该k线以收盘价强制平仓，之后不再开仓
+    :return: 组合资金曲线（candle_begin_time、equity_curve、gross_exposure、net_exposure），
+             每个币对一行的归因（权重、收益贡献、返还成本，以及组合内该币对资金曲线的评价指标）
+    :raises ValueError: 没有任何币对在时间区间内数据完整
+    """
+    cols = ['candle_begin_time', 'open', 'high', 'low', 'close']
+    # 时间区间内数据不完整（缺失、中间断档）的币对跳过
+    bars = {symbol: extract_cols(data[symbol], cols, start_time, end_time)
+            for symbol in {symbol for pair in pairs for symbol in pair} if symbol in data}
+    bars = {symbol: df for symbol, df in bars.items() if df is not None}
+    size = pd.Series([len(df) for df in bars.values()]).mode()[0] if bars else 0
+    pairs = [pair for pair in pairs if all(symbol in bars and len(bars[symbol]) == size for symbol in pair)]
+    if not pairs:
+        raise ValueError(f'no pair has complete data in [{start_time}, {end_time}]')
+    symbols = sorted({symbol for pair in pairs for symbol in pair})
+    loc = {symbol: i for i, symbol in enumerate(symbols)}
+    base_idx = np.array([loc[a] for a, _ in pairs], dtype=np.int64)
+    target_idx = np.array([loc[b] for _, b in pairs], dtype=np.int64)
+    times = bars[symbols[0]]['candle_begin_time']
+    ohlc = {col: np.stack([bars[symbol][col].to_numpy(dtype=np.float64) for symbol in symbols])
+            for col in ('open', 'high', 'low', 'close')}
+    n_pair, n = len(pairs), ohlc['open'].shape[1]
+    t0 = 0 if trade_start is None else int(np.searchsorted(times.to_numpy(), np.datetime64(trade_start)))
+
+    # 各币对 target 仓位
+    target_pos = np.stack([metrics.collect(result) for result in Parallel(n_jobs=n_jobs)(
+        delayed(metrics.recorded(_pair_position))(ohlc['close'][i], ohlc['close'][j], back_hour, zscore_window,
+                                                  upper, lower, cache, t0, hedge)
+        for i, j in zip(base_idx, target_idx))]).astype(np.float64)
+    if delisted:
+        # 下架后仓位为 0：最后一根有效k线为平仓k线，平仓价为下一根开盘价，即填充的收盘价
+        last = np.full(len(symbols), n - 1)
+        for symbol, time in delisted.items():
+            if symbol in loc:
+                last[loc[symbol]] = int(np.searchsorted(times.to_numpy(), np.datetime64(time), 'right')) - 1
+        target_pos[np.arange(n) > np.minimum(last[base_idx], last[target_idx])[:, None]] = 0
+
+    next_open = np.concatenate((ohlc['open'][:, 1:], ohlc['close'][:, -1:]), axis=1)
+    weight = _pair_weight(next_open / ohlc['open'] - 1, base_idx, target_idx, weighting, t0 or back_hour)
+
+    # 前 P 行为 base 腿，后 P 行为 target 腿，每条腿占子账户一半资金
+    sym_idx = np.concatenate((base_idx, target_idx))
+    leg_pos = np.concatenate((-target_pos, target_pos))
+    leg_weight = np.tile(weight, 2) / 2
+    in_pos, open_pos, _ = _trade_masks(leg_pos)
+    bar = np.arange(n)
+    entry = np.maximum.accumulate(np.where(open_pos, bar, 0), axis=1)
+
+    # 单币种净持仓上限：开仓k线按目标持仓估算净额，超限时该笔交易两条腿同比例降低杠杆
+    leg_leverage = np.full(leg_pos.shape, float(leverage))
+    if symbol_cap is not None:
+        net = np.abs(_sum_by_symbol(leg_pos * leverage * leg_weight[:, None], sym_idx, len(symbols)))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scale = np.where(net > symbol_cap, symbol_cap / net, 1)[sym_idx]
+        scale = np.minimum(scale[:n_pair], scale[n_pair:])
+        scale = np.take_along_axis(np.tile(scale, (2, 1)), entry, axis=1)
+        leg_leverage *= scale
+
+    leg_ohlc = {col: values[sym_idx] for col, values in ohlc.items()}
+    _, leg_curve = cal_equity_curve_array(leg_ohlc['open'], leg_ohlc['high'], leg_ohlc['low'], leg_ohlc['close'],
+                                          leg_pos, slippage=slippage, c_rate=c_rate, leverage_rate=leg_leverage)
+    pair_curve = (leg_curve[:n_pair] + leg_curve[n_pair:]) / 2
+
+    # 每条腿的持仓数量（以组合初始资金为 1 计），开仓时按子账户当时权益和杠杆确定，持仓期间不变
+    prev_curve = np.concatenate((np.ones((2 * n_pair, 1)), leg_curve[:, :-1]), axis=1)
+    qty = np.take_along_axis(leg_leverage * prev_curve / leg_ohlc['open'], entry, axis=1)
+    qty = np.where(in_pos, leg_pos * qty * leg_weight[:, None], 0)
+
+    # 净额成交：每根k线开盘调仓，同一币种上方向相反的成交相互抵消，返还抵消部分的成本（只影响成本，不影响爆仓）
+    trade = np.diff(qty, axis=1, prepend=0)
+    gross_trade = _sum_by_symbol(np.abs(trade), sym_idx, len(symbols))
+    net_trade = np.abs(_sum_by_symbol(trade, sym_idx, len(symbols)))
+    rebate = (slippage + c_rate) * ohlc['open'] * (gross_trade - net_trade)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        share = np.where(gross_trade > 0, rebate / gross_trade, 0)
+    leg_rebate = np.abs(trade) * share[sym_idx] if cost_rebate else np.zeros_like(trade)
+    pair_rebate = np.cumsum(leg_rebate[:n_pair] + leg_rebate[n_pair:], axis=1)
+
+    # trade_start 之前无仓位，资金曲线均为 1
+    times, pair_curve, pair_rebate = times.iloc[t0:].reset_index(drop=True), pair_curve[:, t0:], pair_rebate[:, t0:]
+    equity_curve = weight @ pair_curve + pair_rebate.sum(axis=0)
+    notional = qty[:, t0:] * leg_ohlc['close'][:, t0:]
+    curve = pd.DataFrame({
+        'candle_begin_time': times,
+        'equity_curve': equity_curve,
+        'gross_exposure': np.abs(notional).sum(axis=0) / equity_curve,
+        'net_exposure': np.abs(_sum_by_symbol(notional, sym_idx, len(symbols))).sum(axis=0) / equity_curve,
+    })
+    attribution = pd.DataFrame({
+        'base': [a for a, _ in pairs],
+        'target': [b for _, b in pairs],
+        'weight': weight,
+        'contribution': weight * (pair_curve[:, -1] - 1) + pair_rebate[:, -1],
+        'rebate': pair_rebate[:, -1],
+    })
+    attribution = pd.concat([attribution, cal_evaluate_array(pair_curve, times)], axis=1)
+    return curve, attribution
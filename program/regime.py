@@ -0,0 +1,171 @@
+from typing import Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+
+class RegimeStore:
+    """
+    协整状态矩阵（币对 × k线），按位压缩存储，全部币对共用一条时间轴
+    每根k线 1 bit，500 个币对一年的小时线约 0.5MB，是逐币对 pd.Series 布尔序列的几十分之一
+    """
+
+    def __init__(self, pairs: List[str], times: np.ndarray, packed: np.ndarray, n_bars: int):
+        """
+        :param pairs: 币对名称，行顺序
+        :param times: 时间轴（k线时间或下标）
+        :param packed: np.packbits(matrix, axis=1) 的结果，(P, ceil(n_bars / 8)) uint8
+        :param n_bars: k线数
+        """
+        self.pairs = list(pairs)
+        self.times = np.asarray(times)
+        self.packed = packed
+        self.n_bars = n_bars
+
+    @classmethod
+    def from_matrix(cls, pairs: List[str], times, matrix: np.ndarray) -> 'RegimeStore':
+        """
+        :param matrix: (P, T) 布尔矩阵
+        """
+        matrix = np.asarray(matrix, dtype=bool)
+        return cls(pairs, times, np.packbits(matrix, axis=1), matrix.shape[1])
+
+    @classmethod
+    def from_results(cls, results: Iterable[Dict], key: str = 'coint') -> 'RegimeStore':
+        """
+        由 study/3 的逐币对结果（{'pair': ..., 'coint': pd.Series}）逐条压缩构建，可直接传入 JobStore.values()
+        时间轴取第一个币对的索引，其余币对按该时间轴对齐，缺失视为非协整
+        """
+        pairs, rows, times = [], [], None
+        for result in results:
+            series = result[key]
+            if times is None:
+                times = series.index
+            elif not series.index.equals(times):
+                series = series.reindex(times)
+            pairs.append(result['pair'])
+            rows.append(np.packbits(series.fillna(False).to_numpy(dtype=bool)))
+        if times is None:
+            return cls([], np.empty(0), np.empty((0, 0), dtype=np.uint8), 0)
+        return cls(pairs, np.asarray(times), np.stack(rows), len(times))
+
+    def save(self, path: str):
+        np.savez(path, pairs=np.asarray(self.pairs, dtype=str), times=self.times, packed=self.packed,
+                 n_bars=self.n_bars)
+
+    @classmethod
+    def load(cls, path: str) -> 'RegimeStore':
+        with np.load(path, allow_pickle=False) as f:
+            return cls(f['pairs'].tolist(), f['times'], f['packed'], int(f['n_bars']))
+
+    def matrix(self, rows=slice(None)) -> np.ndarray:
+        """
+        解压为布尔矩阵
+        :param rows: 行号或切片，默认全部币对
+        :return: (P, T) 布尔矩阵
+        """
+        return np.unpackbits(self.packed[rows], axis=1, count=self.n_bars).astype(bool)
+
+    def __len__(self) -> int:
+        return len(self.pairs)
+
+
+def time_in_regime(store: RegimeStore) -> pd.Series:
+    """
+    各币对处于协整状态的k线数，直接对压缩后的字节计数，不解压
+    """
+    counts = np.bitwise_count(store.packed).sum(axis=1, dtype=np.int64)
+    return pd.Series(counts, index=store.pairs, name='sum')
+
+
+def regime_runs(store: RegimeStore, chunk: int = 4096) -> pd.DataFrame:
+    """
+    全部币对的协整区间（连续为 True 的k线段），分块解压后一次差分得到所有区间的起止
+    :param store: RegimeStore
+    :param chunk: 每块币对数，控制解压后的内存
+    :return: 每个区间一行：pair、row（币对行号）、start、end（不含）、length、start_time、end_time（最后一根k线）、
+             censored（区间在时间轴首或尾被截断，真实长度未知）
+    """
+    rows, starts, ends = [], [], []
+    for lo in range(0, len(store), chunk):
+        matrix = store.matrix(slice(lo, lo + chunk)).astype(np.int8)
+        # 两端补 0，差分为 1 处为区间开始，为 -1 处为区间结束
+        edges = np.diff(np.pad(matrix, ((0, 0), (1, 1))), axis=1)
+        row, start = np.nonzero(edges == 1)
+        _, end = np.nonzero(edges == -1)
+        rows.append(row + lo)
+        starts.append(start)
+        ends.append(end)
+    row = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+    start = np.concatenate(starts) if starts else np.empty(0, dtype=np.int64)
+    end = np.concatenate(ends) if ends else np.empty(0, dtype=np.int64)
+    return pd.DataFrame({
+        'pair': np.asarray(store.pairs, dtype=object)[row],
+        'row': row,
+        'start': start,
+        'end': end,
+        'length': end - start,
+        'start_time': store.times[start],
+        'end_time': store.times[end - 1],
+        'censored': (start == 0) | (end == store.n_bars),
+    })
+
+
+def regime_events(store: RegimeStore, runs: pd.DataFrame | None = None) -> pd.DataFrame:
+    """
+    协整开始、结束事件，按时间排序；时间轴首尾截断处不产生事件
+    :param store: RegimeStore
+    :param runs: regime_runs 的结果，不传时重新计算
+    :return: pair、bar（时间轴下标）、time、event（'start' / 'stop'）、length（所属区间长度）
+    """
+    if runs is None:
+        runs = regime_runs(store)
+    starts = runs[runs['start'] > 0]
+    stops = runs[runs['end'] < store.n_bars]
+    events = pd.concat([
+        pd.DataFrame({'pair': starts['pair'], 'bar': starts['start'], 'time': starts['start_time'],
+                      'event': 'start', 'length': starts['length']}),
+        # 结束事件记在区间之后的第一根k线，即协整失效的那根
+        pd.DataFrame({'pair': stops['pair'], 'bar': stops['end'], 'time': store.times[stops['end'].to_numpy()],
+                      'event': 'stop', 'length': stops['length']}),
+    ], ignore_index=True)
+    return events.sort_values(['bar', 'pair'], kind='stable').reset_index(drop=True)
+
+
+def run_length_distribution(runs: pd.DataFrame, by_pair: bool = False,
+                            include_censored: bool = True) -> pd.Series | pd.DataFrame:
+    """
+    协整区间长度分布，对应原 study/4 的 len_dist
+    :param runs: regime_runs 的结果
+    :param by_pair: True 时按币对分别统计
+    :param include_censored: 是否包含首尾被截断的区间
+    :return: 长度 -> 区间数；by_pair 时为 (pair, length) -> 区间数
+    """
+    if not include_censored:
+        runs = runs[~runs['censored']]
+    if by_pair:
+        return runs.groupby(['pair', 'length']).size().rename('count')
+    return runs['length'].value_counts().sort_index().rename('count')
+
+
+def rank_regimes(store: RegimeStore, runs: pd.DataFrame | None = None) -> pd.DataFrame:
+    """
+    币对排名，按处于协整状态的k线数从多到少，列 pair、sum 与 rank168.csv 一致，另附区间统计
+    :param store: RegimeStore
+    :param runs: regime_runs 的结果，不传时重新计算
+    :return: 索引为币对在 store 中的行号
+    """
+    if runs is None:
+        runs = regime_runs(store)
+    total = time_in_regime(store).to_numpy()
+    stats = runs.groupby('row')['length'].agg(['size', 'mean', 'median', 'max']).reindex(range(len(store)))
+    df = pd.DataFrame({
+        'pair': store.pairs,
+        'sum': total,
+        'ratio': total / store.n_bars if store.n_bars else np.nan,
+        'runs': stats['size'].fillna(0).astype(np.int64).to_numpy(),
+        'mean_run': stats['mean'].to_numpy(),
+        'median_run': stats['median'].to_numpy(),
+        'max_run': stats['max'].fillna(0).astype(np.int64).to_numpy(),
+    })
+    return df.sort_values('sum', ascending=False, kind='stable')
@@ -0,0 +1,217 @@
+import html
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.offline import get_plotlyjs, get_plotlyjs_version
+from plotly.subplots import make_subplots
+
+SIGNAL_MARKERS = {
+    'long': ('开多', 'triangle-up', 'red'),
+    'short': ('开空', 'triangle-down', 'green'),
+    'exit_long': ('平多', 'x', 'orange'),
+    'exit_short': ('平空', 'x', 'purple'),
+}
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets 降采样，保留曲线形状（峰谷、拐点）
+    :param x: 横坐标（时间转为 int64 后传入）
+    :param y: 纵坐标，不含空值
+    :param n_out: 输出点数
+    :return: 选中点的下标，含首尾
+    """
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # 首尾之外的点分为 n_out - 2 个桶
+    edges = np.floor(np.arange(n_out - 1) * (n - 2) / (n_out - 2)).astype(np.int64) + 1
+    edges[-1] = n - 1
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # 下一个桶的均值点，最后一个桶用末点
+        next_start, next_end = (end, edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax(y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    最大最小值分桶降采样，每个桶保留最高点和最低点，完全向量化
+    :param y: 纵坐标，不含空值
+    :param n_out: 输出点数上限
+    :return: 选中点的下标（升序），含首尾
+    """
+    n = len(y)
+    if n <= n_out or n_out < 4:
+        return np.arange(n)
+    n_bucket = (n_out - 2) // 2
+    size = -(-n // n_bucket)
+    padded = np.full(n_bucket * size, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(n_bucket, size)
+    offset = np.arange(n_bucket) * size
+    valid = ~np.isnan(padded).all(axis=1)
+    lo = np.nanargmin(padded[valid], axis=1) + offset[valid]
+    hi = np.nanargmax(padded[valid], axis=1) + offset[valid]
+    return np.unique(np.concatenate(([0, n - 1], lo, hi)))
+
+
+def downsample(times, values, n_points: int = 2000, method: str = 'lttb') -> Tuple[pd.DatetimeIndex, np.ndarray]:
+    """
+    时间序列降采样，空值不参与，输出点数不超过 n_points
+    :param times: candle_begin_time
+    :param values: 数值序列
+    :param n_points: 输出点数
+    :param method: lttb / minmax
+    :return: 时间、数值
+    """
+    times = pd.DatetimeIndex(times)
+    values = np.asarray(values, dtype=np.float64)
+    finite = np.flatnonzero(np.isfinite(values))
+    t, v = times.asi8[finite], values[finite]
+    if method == 'lttb':
+        idx = lttb(t, v, n_points)
+    elif method == 'minmax':
+        idx = minmax(v, n_points)
+    else:
+        raise ValueError(f'unknown method: {method}')
+    return times[finite[idx]], v[idx]
+
+
+def thin_markers(mask: np.ndarray, n_points: int = 2000) -> np.ndarray:
+    """
+    离散信号的抽稀：整个时间轴按k线等分为 n_points 个桶，每个桶只保留第一个信号
+    :param mask: 信号布尔序列
+    :param n_points: 保留的信号数上限
+    :return: 保留信号的下标（升序），不超过 n_points 个；信号数不超过 n_points 时全部保留
+    """
+    idx = np.flatnonzero(mask)
+    if len(idx) <= n_points:
+        return idx
+    _, first = np.unique(idx * n_points // len(mask), return_index=True)
+    return idx[first]
+
+
+def _line(times, values, name: str, n_points: int, method: str, **kwargs) -> go.Scattergl:
+    x, y = downsample(times, values, n_points, method)
+    return go.Scattergl(x=x, y=np.round(y, 6), mode='lines', name=name, **kwargs)
+
+
+def build_pair_figure(name: str, df: pd.DataFrame, evaluate: pd.DataFrame | None = None, n_points: int = 2000,
+                      method: str = 'lttb') -> go.Figure:
+    """
+    单币对图表：资金曲线 + 回撤；两个币种收盘价 + 信号；价差 + z-score + 信号
+    全部为 WebGL 图，每条折线降采样到 n_points 以内，每种信号抽稀到 n_points 个以内，文件大小与历史长度无关
+    :param name: 币对名称
+    :param df: candle_begin_time、close1、close2、spread、zscore、equity_curve，以及 long short exit_long exit_short
+               信号列，缺少的列不画
+    :param evaluate: cal_evaluate 的结果，显示在标题
+    :param n_points: 每条折线的点数上限，同时为每种信号标记数的上限
+    :param method: 降采样方法 lttb / minmax
+    :return: Figure
+    """
+    times = df['candle_begin_time']
+    fig = make_subplots(rows=3, cols=1, shared_xaxes=True, vertical_spacing=0.03, row_heights=[0.4, 0.3, 0.3],
+                        specs=[[{'secondary_y': True}]] * 3)
+    if 'equity_curve' in df:
+        curve = df['equity_curve'].to_numpy(dtype=np.float64)
+        fig.add_trace(_line(times, curve, '策略净值', n_points, method), row=1, col=1)
+        # 回撤保留最低点，使用最大最小值分桶
+        fig.add_trace(_line(times, curve / np.maximum.accumulate(curve) - 1, '回撤', n_points, 'minmax',
+                            line={'color': 'rgba(192,192,192,0.6)', 'width': 1}), secondary_y=True, row=1, col=1)
+    for col, secondary in (('close1', False), ('close2', True)):
+        if col in df:
+            fig.add_trace(_line(times, df[col], col, n_points, method), secondary_y=secondary, row=2, col=1)
+    if 'spread' in df:
+        fig.add_trace(_line(times, df['spread'], 'spread', n_points, method), row=3, col=1)
+    if 'zscore' in df:
+        fig.add_trace(_line(times, df['zscore'], 'zscore', n_points, method), secondary_y=True, row=3, col=1)
+
+    # 信号为离散事件，交易很多时按时间分桶抽稀，标在 close2 和 zscore 上
+    for col, (label, symbol, color) in SIGNAL_MARKERS.items():
+        if col not in df:
+            continue
+        keep = thin_markers(df[col].fillna(False).to_numpy(dtype=bool), n_points)
+        for row, ref, secondary in ((2, 'close2', True), (3, 'zscore', True)):
+            if ref in df:
+                fig.add_trace(go.Scattergl(x=times.iloc[keep], y=df[ref].iloc[keep], mode='markers', name=label,
+                                           legendgroup=col, showlegend=row == 2,
+                                           marker={'symbol': symbol, 'color': color, 'size': 8}),
+                              secondary_y=secondary, row=row, col=1)
+
+    title = name
+    if evaluate is not None:
+        row = evaluate.iloc[0]
+        # 累积净值、年化收益、月化收益、月信息比、月化波动、月化收益回撤比、最大回撤
+        title += '　' + '　'.join(f'{col}: {row[col]}' for col in evaluate.columns[:7])
+    fig.update_layout(title=title, template='none', hovermode='x', height=950, yaxis_type='log',
+                      legend={'orientation': 'h'})
+    return fig
+
+
+_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+{plotlyjs}
+<style>body {{font-family: sans-serif; margin: 8px;}} #pair {{font-size: 14px; min-width: 320px;}}</style>
+</head>
+<body>
+<select id="pair">{options}</select>
+<div id="chart" style="width: 100%; height: 950px;"></div>
+{data}
+<script>
+// 各币对数据以 json 文本嵌入，选中时才解析、绘制
+var select = document.getElementById('pair');
+function show() {{
+    var fig = JSON.parse(document.getElementById('pair-' + select.value).textContent);
+    Plotly.react('chart', fig.data, fig.layout, {{scrollZoom: true, responsive: true}});
+}}
+select.addEventListener('change', show);
+show();
+</script>
+</body>
+</html>
+"""
+
+
+def write_report(pairs: Dict[str, Tuple[pd.DataFrame, pd.DataFrame | None]], path: str, n_points: int = 2000,
+                 method: str = 'lttb', include_plotlyjs: bool = True, title: str = '配对回测') -> str:
+    """
+    多币对回测报告，一个 html 文件，下拉框切换币对
+    :param pairs: {币对名称: (build_pair_figure 的 df, evaluate)}
+    :param path: html 路径
+    :param n_points: 每条折线的点数上限、每种信号标记数的上限
+    :param method: 降采样方法 lttb / minmax
+    :param include_plotlyjs: True 时内嵌 plotly.js（可离线打开），False 时从 cdn 加载
+    :param title: 页面标题
+    :return: path
+    """
+    options, blocks = [], []
+    for i, (name, (df, evaluate)) in enumerate(pairs.items()):
+        fig = build_pair_figure(name, df, evaluate, n_points, method)
+        options.append(f'<option value="{i}">{html.escape(name)}</option>')
+        # 防止数据中的 </script> 提前结束标签
+        data = fig.to_json().replace('</', '<\\/')
+        blocks.append(f'<script type="application/json" id="pair-{i}">{data}</script>')
+    if include_plotlyjs:
+        plotlyjs = f'<script type="text/javascript">{get_plotlyjs()}</script>'
+    else:
+        plotlyjs = f'<script src="https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"></script>'
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(_TEMPLATE.format(title=html.escape(title), plotlyjs=plotlyjs, options=''.join(options),
+                                 data='\n'.join(blocks)))
+    return path
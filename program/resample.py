@@ -0,0 +1,186 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable
+
+import numpy as np
+import pandas as pd
+
+from program import metrics
+
+# 原始数据的k线周期
+BASE_TIMEFRAME = '1h'
+# 各列的聚合方式，未列出的数值列取最后一根
+AGG = {
+    'open': 'first',
+    'high': 'max',
+    'low': 'min',
+    'close': 'last',
+    'volume': 'sum',
+    'quote_volume': 'sum',
+    'trade_num': 'sum',
+    'taker_buy_base_asset_volume': 'sum',
+    'taker_buy_quote_asset_volume': 'sum',
+}
+
+
+def is_base(timeframe: str | None) -> bool:
+    """
+    是否为原始周期（不需要重采样）
+    """
+    return timeframe is None or pd.Timedelta(timeframe) == pd.Timedelta(BASE_TIMEFRAME)
+
+
+@metrics.timed('resample')
+def resample_ohlc(df: pd.DataFrame, timeframe: str, complete: bool = True) -> pd.DataFrame:
+    """
+    1h k线合成更大周期的k线，按时间分桶后用 reduceat 一次完成各列聚合，不使用 groupby
+    分桶以 1970-01-01 00:00 UTC 为起点（4h 为 0、4、8 点……，1d 为 0 点）；只支持能整除 1 天的周期，
+    此时每天的桶都从 0 点开始，与 pandas resample 的默认分桶（origin='start_day'）一致，
+    5h、7h、3d 等周期两者的分桶不同，直接报错
+    :param df: 含 candle_begin_time 的k线，时间升序
+    :param timeframe: 目标周期，1h 的整数倍且能整除 1 天，如 '2h'、'4h'、'8h'、'1d'
+    :param complete: True 时只保留k线齐全的桶（中间缺k线、首尾不足一个周期的桶丢弃），
+                     与 1h 数据缺k线时 extract_cols 返回 None 的规则一致
+    :return: 新的 DataFrame，列与 df 相同，candle_begin_time 为桶的开始时间
+    """
+    step = pd.Timedelta(timeframe)
+    base = pd.Timedelta(BASE_TIMEFRAME)
+    if step % base != pd.Timedelta(0):
+        raise ValueError(f'timeframe {timeframe} is not a multiple of {BASE_TIMEFRAME}')
+    if pd.Timedelta('1d') % step != pd.Timedelta(0):
+        raise ValueError(f'timeframe {timeframe} does not divide 1 day')
+    times = pd.DatetimeIndex(df['candle_begin_time'])
+    ticks = times.as_unit('ns').asi8
+    bucket = ticks // step.value
+    if len(bucket) == 0:
+        return df.iloc[:0].copy()
+    # 时间升序时同一桶连续，每个桶的首行
+    starts = np.flatnonzero(np.concatenate(([True], bucket[1:] != bucket[:-1])))
+    ends = np.concatenate((starts[1:], [len(bucket)]))
+    if complete:
+        full = (ends - starts) == step // base
+        starts, ends = starts[full], ends[full]
+        if len(starts) == 0:
+            return df.iloc[:0].copy()
+
+    cols = {'candle_begin_time': pd.DatetimeIndex(bucket[starts] * step.value).as_unit(times.unit)}
+    for col in df.columns:
+        if col == 'candle_begin_time':
+            continue
+        values = df[col].to_numpy()
+        how = AGG.get(col, 'last') if np.issubdtype(values.dtype, np.number) else 'last'
+        if how == 'first':
+            cols[col] = values[starts]
+        elif how == 'last':
+            cols[col] = values[ends - 1]
+        elif complete:
+            # 只保留了齐全的桶，桶之间可能有间隔，按首尾下标分别聚合
+            reduce = {'max': np.fmax, 'min': np.fmin, 'sum': np.add}[how]
+            bounds = np.stack((starts, ends), axis=1).ravel()
+            if bounds[-1] == len(values):
+                bounds = bounds[:-1]
+            cols[col] = reduce.reduceat(values, bounds)[::2]
+        else:
+            reduce = {'max': np.fmax, 'min': np.fmin, 'sum': np.add}[how]
+            cols[col] = reduce.reduceat(values, starts)
+    return pd.DataFrame(cols)
+
+
+class ResampleCache:
+    """
+    重采样结果的内存缓存，键为 (symbol, timeframe)，总大小超过 max_bytes 时淘汰最久未使用的条目
+    同一进程内对同一币种的多次扫描、多个币对、多个周期只重采样一次
+    条目附带源数据指纹（行数、首尾时间），源数据变化时重新计算
+    """
+
+    def __init__(self, max_bytes: int = 1 << 30):
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key: Hashable, fingerprint, func: Callable, size: Callable) -> object:
+        """
+        :param key: (symbol, timeframe, ...)
+        :param fingerprint: 源数据指纹，与缓存的不同时视为未命中
+        :param func: 计算函数
+        :param size: 结果占用的字节数
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == fingerprint:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+        value = func()
+        nbytes = size(value)
+        with self._lock:
+            self.misses += 1
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (fingerprint, value, nbytes)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        return {'hit': self.hits, 'miss': self.misses, 'entries': len(self._entries), 'bytes': self._bytes}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+# 进程内共享的重采样缓存
+default_cache = ResampleCache()
+
+
+def symbol_of(df: pd.DataFrame) -> str | None:
+    """
+    DataFrame 对应的币种：load_data 写入的 attrs['symbol']，或 symbol 列
+    """
+    symbol = df.attrs.get('symbol')
+    if symbol is None and 'symbol' in df.columns and len(df):
+        symbol = df['symbol'].iloc[0]
+    return symbol
+
+
+def fingerprint(df: pd.DataFrame) -> tuple:
+    times = df['candle_begin_time']
+    return (len(df), tuple(df.columns), times.iloc[0] if len(df) else None, times.iloc[-1] if len(df) else None)
+
+
+def frame_bytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=True).sum())
+
+
+def resample(df: pd.DataFrame, timeframe: str | None, symbol: str | None = None,
+             cache: ResampleCache | None = default_cache) -> pd.DataFrame:
+    """
+    单币种k线转为 timeframe 周期，原始周期直接返回 df
+    :param df: 1h k线
+    :param timeframe: 目标周期
+    :param symbol: 币种，用作缓存键，默认取 symbol_of(df)；无法确定币种时不缓存
+    :param cache: 重采样缓存，None 不缓存
+    """
+    if is_base(timeframe):
+        return df
+    symbol = symbol or symbol_of(df)
+    if cache is None or symbol is None:
+        return resample_ohlc(df, timeframe)
+    return cache.get_or_compute((symbol, pd.Timedelta(timeframe)), fingerprint(df),
+                                lambda: resample_ohlc(df, timeframe), frame_bytes)
+
+
+def resample_data(data: Dict[str, pd.DataFrame], timeframe: str | None,
+                  cache: ResampleCache | None = default_cache) -> Dict[str, pd.DataFrame]:
+    """
+    {symbol: DataFrame} 全部转为 timeframe 周期
+    """
+    return {symbol: resample(df, timeframe, symbol, cache) for symbol, df in data.items()}
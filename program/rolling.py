@@ -1,7 +1,19 @@
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
 import pandas as pd
 import statsmodels.api as sm
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.stats import rankdata
 from statsmodels.tsa.stattools import adfuller
 
+from program import metrics
+from program.adf import adf_coint_batch
+from program.cache import ResultCache, data_hash
+from program.compact import COMPACT_CHUNK, PRICE_DTYPE
+from program.hedge import hedge_series
+
 
 def cal_coint(base: pd.Series, target: pd.Series):
     """
@@ -12,25 +24,229 @@ def cal_coint(base: pd.Series, target: pd.Series):
     """
     # 回归分析
     # 添加常数项
-    X = sm.add_constant(base)
-    # 拟合线性回归模型
-    model = sm.OLS(target, X).fit()
-    # 获取残差
-    residuals = model.resid
+    with metrics.stage('ols'):
+        X = sm.add_constant(base)
+        # 拟合线性回归模型
+        model = sm.OLS(target, X).fit()
+        # 获取残差
+        residuals = model.resid
     # adf检测
-    adf_result = adfuller(residuals, autolag='AIC')
-    p_value = adf_result[1]
-    is_coint = p_value < 0.05 and adf_result[0] < adf_result[4]['5%']
+    is_coint = adf_coint(residuals)
     h_ratio = round(model.params.iloc[1], 5)
     return is_coint, h_ratio
 
 
-def rolling_coint(s1: pd.Series, s2: pd.Series, back_hour=24 * 30):
+@metrics.timed('adf')
+def adf_coint(residuals) -> bool:
+    """
+    残差 adf 检测，p_value < 0.05 且 adf 值小于 5% 临界值视为协整
+    :param residuals: 回归残差
+    :return: true/false
+    """
+    adf_result = adfuller(residuals, autolag='AIC')
+    p_value = adf_result[1]
+    return p_value < 0.05 and adf_result[0] < adf_result[4]['5%']
+
+
+def window_sum(a: np.ndarray, window: int) -> np.ndarray:
+    """
+    基于累加和的滑动窗口求和
+    :param a: 一维数组，float32 输入同样以 float64 累加
+    :param window: 窗口
+    :return: 第k个元素为 a[k:k + window] 的和，长度 len(a) - window + 1
+    """
+    cum = np.empty(len(a) + 1, dtype=np.float64)
+    cum[0] = 0
+    np.cumsum(a, dtype=np.float64, out=cum[1:])
+    return cum[window:] - cum[:-window]
+
+
+@metrics.timed('ols')
+def rolling_ols(x, y, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    滚动OLS y = a + h * x，由 x、y、x²、xy 的滑动累加和直接求解，每个窗口 O(1)
+    第k个窗口为 [k, k + window)，结果与逐窗口 sm.OLS 一致
+    :param x: 价格序列 x
+    :param y: 价格序列 y
+    :param window: 窗口
+    :return: 对冲比率、截距，长度 len(x) - window + 1
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if len(x) < window:
+        return np.empty(0), np.empty(0)
+    # 先去全局均值，降低累加和相减时的精度损失
+    x0 = x.mean()
+    y0 = y.mean()
+    xc = x - x0
+    yc = y - y0
+    sx = window_sum(xc, window)
+    sy = window_sum(yc, window)
+    sxx = window_sum(xc * xc, window)
+    sxy = window_sum(xc * yc, window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        h_ratio = (window * sxy - sx * sy) / (window * sxx - sx * sx)
+    # 还原到原始坐标下的截距
+    intercept = y0 - h_ratio * x0 + (sy - h_ratio * sx) / window
+    return h_ratio, intercept
+
+
+def rolling_residuals(x, y, h_ratio: np.ndarray, intercept: np.ndarray, window: int,
+                      start: int = 0, stop: int | None = None, dtype=np.float64,
+                      index: np.ndarray | None = None) -> np.ndarray:
+    """
+    按滚动OLS结果计算各窗口残差
+    :param x: 价格序列 x
+    :param y: 价格序列 y
+    :param h_ratio: rolling_ols 对冲比率
+    :param intercept: rolling_ols 截距
+    :param window: 窗口
+    :param start: 起始窗口编号
+    :param stop: 结束窗口编号（不含），默认到最后一个窗口
+    :param dtype: 残差矩阵精度，紧凑模式为 float32
+    :param index: 指定窗口编号，给定时忽略 start、stop
+    :return: (stop - start, window) 残差矩阵，每行一个窗口
+    """
+    if index is None:
+        index = slice(start, len(h_ratio) if stop is None else stop)
+    xw = sliding_window_view(np.asarray(x, dtype=dtype), window)[index]
+    yw = sliding_window_view(np.asarray(y, dtype=dtype), window)[index]
+    return yw - intercept[index, None].astype(dtype) - h_ratio[index, None].astype(dtype) * xw
+
+
+@metrics.timed('spearman')
+def rolling_spearman(x, y, window: int, chunk: int = 1024, index: np.ndarray | None = None) -> np.ndarray:
+    """
+    滚动 spearman 相关系数，分块对窗口矩阵求秩后计算 pearson
+    :param x: 价格序列 x
+    :param y: 价格序列 y
+    :param window: 窗口
+    :param chunk: 每块窗口数，控制内存
+    :param index: 只计算指定编号的窗口
+    :return: 长度 len(x) - window + 1，指定 index 时长度 len(index)
+    """
+    xw = sliding_window_view(np.asarray(x, dtype=np.float64), window)
+    yw = sliding_window_view(np.asarray(y, dtype=np.float64), window)
+    n = len(xw) if index is None else len(index)
+    corr = np.empty(n, dtype=np.float64)
+    for start in range(0, n, chunk):
+        rows = slice(start, start + chunk) if index is None else index[start:start + chunk]
+        rx = rankdata(xw[rows], axis=1)
+        ry = rankdata(yw[rows], axis=1)
+        rx -= rx.mean(axis=1, keepdims=True)
+        ry -= ry.mean(axis=1, keepdims=True)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr[start:start + chunk] = (rx * ry).sum(axis=1) / np.sqrt(
+                (rx * rx).sum(axis=1) * (ry * ry).sum(axis=1))
+    return corr
+
+
+def _valid_window_sum(a: np.ndarray, valid: np.ndarray, window: int) -> np.ndarray:
+    """
+    滑动窗口求和，窗口内含无效值时为 nan
+    """
+    total = window_sum(np.where(valid, a, 0.0), window)
+    total[window_sum(~valid, window) > 0] = np.nan
+    return total
+
+
+@metrics.timed('half_life')
+def rolling_half_life(spread: pd.Series, window: int) -> pd.Series:
+    """
+    滚动半衰期，Δs_t 对 s_(t-1) 回归的斜率由滑动累加和求得，不逐窗口拟合
+    第 i 根k线的结果与 cal_half_life(spread[i - window + 1:i + 1]) 一致（不取整），与 cal_zscore 一样包含当前k线
+    :param spread: 价差序列，可含空值（如滚动对冲比率的预热期），含空值的窗口结果为空值
+    :param window: 窗口，窗口内 window - 1 组回归样本
+    :return: 半衰期序列，索引同 spread
+    """
+    s = spread.to_numpy(dtype=np.float64)
+    result = np.full(len(s), np.nan)
+    if len(s) < window or window < 3:
+        return pd.Series(result, index=spread.index, name='half_life')
+    # 先去均值，降低累加和相减时的精度损失
+    finite = np.isfinite(s)
+    s = s - (s[finite].mean() if finite.any() else 0.0)
+    lagged = s[:-1]
+    delta = np.diff(s)
+    valid = finite[:-1] & finite[1:]
+    m = window - 1
+    sl = _valid_window_sum(lagged, valid, m)
+    sd = _valid_window_sum(delta, valid, m)
+    sll = _valid_window_sum(lagged * lagged, valid, m)
+    sld = _valid_window_sum(lagged * delta, valid, m)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        beta = (m * sld - sl * sd) / (m * sll - sl * sl)
+        result[window - 1:] = -np.log(2) / beta
+    return pd.Series(result, index=spread.index, name='half_life')
+
+
+@metrics.timed('zero_crossings')
+def rolling_zero_crossings(spread: pd.Series, window: int) -> pd.Series:
+    """
+    滚动穿越0轴次数，逐根k线的穿越标记做滑动计数
+    第 i 根k线的结果与 cal_zero_crossings(spread[i - window + 1:i + 1]) 一致
+    :param spread: 价差序列，可含空值，含空值的窗口结果为空值
+    :param window: 窗口
+    :return: 次数序列（含空值，为 float），索引同 spread
+    """
+    s = spread.to_numpy(dtype=np.float64)
+    result = np.full(len(s), np.nan)
+    if len(s) < window or window < 2:
+        return pd.Series(result, index=spread.index, name='zero_crossings')
+    sign = np.sign(s)
+    valid = np.isfinite(s[:-1]) & np.isfinite(s[1:])
+    crossed = (sign[1:] != sign[:-1]).astype(np.float64)
+    result[window - 1:] = _valid_window_sum(crossed, valid, window - 1)
+    return pd.Series(result, index=spread.index, name='zero_crossings')
+
+
+def rolling_reversion(spread: pd.Series, window: int = 168) -> Tuple[pd.Series, pd.Series]:
+    """
+    价差的滚动均值回归指标，与 rolling_coint 的协整标志一起作为随时间变化的过滤条件
+    :param spread: 价差序列，一般为 cal_spread(s1, s2, hedge_ratio=rolling_coint 的对冲比率)
+    :param window: 窗口
+    :return: 半衰期序列、穿越0轴次数序列
+    """
+    return rolling_half_life(spread, window), rolling_zero_crossings(spread, window)
+
+
+def rolling_coint(s1: pd.Series, s2: pd.Series, back_hour=24 * 30, fast=False,
+                  cache: ResultCache | None = None, compact=False, refit_every: int | None = 1,
+                  refit_drift: float | None = None, hedge: str = 'ols', hedge_params: Dict | None = None):
     """
     滚动计算协整、对冲比率、相关系数，并确保索引与s1对齐
+    :param fast: True 时使用累加和滚动OLS，不再逐窗口拟合 sm.OLS
+    :param cache: 结果缓存，价格序列（值和索引）与参数相同时直接返回上次结果
+    :param compact: True 时使用累加和实现，残差窗口为 float32，对冲比率、相关系数为 float32 序列，
+                    回归累加和、adf 正规方程仍为 float64，精度对比见 bench/compact.py
+    :param refit_every: 每隔几根k线重新计算协整、对冲比率、相关系数，两次之间沿用上次结果；
+                        1 为逐根计算，None 为只按 refit_drift 触发
+    :param refit_drift: 残差均方相对上次重算时的变化超过该比例时提前重算，None 不启用；
+                        与 refit_every 任一满足即重算。降频时使用累加和实现，与逐根结果的差异见 recalibration_report
+    :param hedge: 对冲比率估计方法：ols 为回看窗口OLS；rls、kalman 为递推估计（见 program/hedge.py），
+                  以第一个回看窗口预热、之后逐根更新，协整判断、相关系数仍按回看窗口计算
+    :param hedge_params: 递推估计的参数，如 {'lam': 0.999}、{'delta': 1e-5}
     """
     # 确保s1和s2索引一致
     s1_aligned, s2_aligned = s1.align(s2, join='inner')
+    if hedge != 'ols':
+        coint_series, h_ratio_series, corr_series = rolling_coint(s1_aligned, s2_aligned, back_hour, fast, cache,
+                                                                  compact, refit_every, refit_drift)
+        h_ratio = hedge_series(s1_aligned, s2_aligned, back_hour, hedge, **(hedge_params or {}))
+        return coint_series, h_ratio.astype(h_ratio_series.dtype), corr_series
+    every_bar = refit_every == 1 and refit_drift is None
+    if cache is not None:
+        key = data_hash('rolling_coint_compact' if compact else 'rolling_coint', back_hour, fast,
+                        s1_aligned, s2_aligned, *(() if every_bar else (refit_every, refit_drift)))
+        return cache.get_or_compute(key, lambda: rolling_coint(s1_aligned, s2_aligned, back_hour, fast,
+                                                               compact=compact, refit_every=refit_every,
+                                                               refit_drift=refit_drift))
+    if fast or compact or not every_bar:
+        if compact:
+            return _rolling_coint_fast(s1_aligned, s2_aligned, back_hour, COMPACT_CHUNK, PRICE_DTYPE,
+                                       refit_every, refit_drift)
+        return _rolling_coint_fast(s1_aligned, s2_aligned, back_hour, refit_every=refit_every,
+                                   refit_drift=refit_drift)
 
     # 初始化结果列表
     coint_list = []
@@ -45,7 +261,8 @@ def rolling_coint(s1: pd.Series, s2: pd.Series, back_hour=24 * 30):
 
         # 计算协整关系
         is_coint, h_ratio = cal_coint(base, target)
-        corr = base.corr(target, method="spearman")
+        with metrics.stage('spearman'):
+            corr = base.corr(target, method="spearman")
 
         # 保存结果
         coint_list.append(is_coint)
@@ -58,4 +275,130 @@ def rolling_coint(s1: pd.Series, s2: pd.Series, back_hour=24 * 30):
     h_ratio_series = pd.Series(h_ratio_list, index=result_index, name='hedge_ratio')
     corr_series = pd.Series(corr_list, index=result_index, name='corr')
 
-    return coint_series, h_ratio_series, corr_series
\ No newline at end of file
+    return coint_series, h_ratio_series, corr_series
+
+
+def refit_windows(x, y, h_ratio: np.ndarray, intercept: np.ndarray, window: int, refit_every: int | None = 1,
+                  refit_drift: float | None = None) -> np.ndarray:
+    """
+    降频重算的窗口编号：距上次重算满 refit_every 个窗口，或当前窗口按上次的对冲比率、截距计算的残差均方
+    相对上次重算窗口自身的残差均方变化超过 refit_drift 时重算
+    残差均方由滑动累加和得到，每个窗口 O(1)
+    :param x: 价格序列 x
+    :param y: 价格序列 y
+    :param h_ratio: rolling_ols 对冲比率
+    :param intercept: rolling_ols 截距
+    :param window: 窗口
+    :param refit_every: 重算间隔，None 为只按残差漂移触发
+    :param refit_drift: 残差均方变化比例阈值，None 不启用
+    :return: 升序的窗口编号，第一个为 0
+    """
+    n_win = len(h_ratio)
+    if n_win == 0:
+        return np.empty(0, dtype=np.int64)
+    if refit_drift is None:
+        return np.arange(0, n_win, refit_every or n_win)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    x0, y0 = x.mean(), y.mean()
+    xc, yc = x - x0, y - y0
+    sums = [window_sum(a, window)[:n_win].tolist() for a in (xc, yc, xc * xc, yc * yc, xc * yc)]
+    # 截距换到去均值坐标下：e = yc - h * xc - c
+    c = (np.asarray(intercept) - y0 + np.asarray(h_ratio) * x0).tolist()
+    h = np.asarray(h_ratio).tolist()
+
+    def mse(i, j):
+        # 窗口 i 按窗口 j 的回归系数计算的残差均方
+        sx, sy, sxx, syy, sxy = (s[i] for s in sums)
+        return (syy + h[j] * h[j] * sxx + window * c[j] * c[j] - 2 * h[j] * sxy - 2 * c[j] * sy +
+                2 * h[j] * c[j] * sx) / window
+
+    refit = [0]
+    base = mse(0, 0)
+    for i in range(1, n_win):
+        last = refit[-1]
+        if (refit_every and i - last >= refit_every) or abs(mse(i, last) - base) > refit_drift * base:
+            refit.append(i)
+            base = mse(i, i)
+    return np.asarray(refit, dtype=np.int64)
+
+
+def _rolling_coint_fast(s1: pd.Series, s2: pd.Series, back_hour: int, chunk: int = 1024, dtype=np.float64,
+                        refit_every: int | None = 1, refit_drift: float | None = None):
+    """
+    rolling_coint 的累加和实现，结果为预分配的 numpy 数组，adf 检验按块批量计算
+    :param chunk: 残差窗口、spearman 每块窗口数
+    :param dtype: 价格、残差窗口及输出序列的精度
+    :param refit_every: 重算间隔，见 rolling_coint
+    :param refit_drift: 残差漂移阈值，见 rolling_coint
+    """
+    x = s1.to_numpy(dtype=dtype)
+    y = s2.to_numpy(dtype=dtype)
+    # 第 i 根k线使用 [i - back_hour, i) 窗口，最后一个完整窗口不参与
+    n_win = max(len(x) - back_hour, 0)
+    h_ratio, intercept = rolling_ols(x, y, back_hour)
+    h_ratio = h_ratio[:n_win]
+    intercept = intercept[:n_win]
+
+    if refit_every == 1 and refit_drift is None:
+        coint_arr = np.zeros(n_win, dtype=bool)
+        for start in range(0, n_win, chunk):
+            stop = min(start + chunk, n_win)
+            residuals = rolling_residuals(x, y, h_ratio, intercept, back_hour, start, stop, dtype)
+            coint_arr[start:stop] = adf_coint_batch(residuals)
+        corr_arr = rolling_spearman(x, y, back_hour, chunk)[:n_win]
+    else:
+        # 只在重算窗口上做 adf、spearman，其余窗口沿用上一次重算的协整、对冲比率、相关系数
+        refit = refit_windows(x, y, h_ratio, intercept, back_hour, refit_every, refit_drift)
+        coint_arr = np.zeros(len(refit), dtype=bool)
+        for start in range(0, len(refit), chunk):
+            residuals = rolling_residuals(x, y, h_ratio, intercept, back_hour, dtype=dtype,
+                                          index=refit[start:start + chunk])
+            coint_arr[start:start + chunk] = adf_coint_batch(residuals)
+        corr_arr = rolling_spearman(x, y, back_hour, chunk, index=refit)
+        owner = np.searchsorted(refit, np.arange(n_win), 'right') - 1
+        coint_arr, corr_arr, h_ratio = coint_arr[owner], corr_arr[owner], h_ratio[refit][owner]
+
+    result_index = s1.index[back_hour:]
+    coint_series = pd.Series(coint_arr, index=result_index, name='is_coint')
+    h_ratio_series = pd.Series(np.round(h_ratio, 5).astype(dtype), index=result_index, name='hedge_ratio')
+    corr_series = pd.Series(corr_arr.astype(dtype), index=result_index, name='corr')
+
+    return coint_series, h_ratio_series, corr_series
+
+
+def recalibration_report(s1: pd.Series, s2: pd.Series, back_hour: int = 24 * 30,
+                         settings: List[Tuple[int | None, float | None]] = ((6, None), (24, None), (None, 0.1)),
+                         compact: bool = False) -> pd.DataFrame:
+    """
+    降频重算与逐根计算的差异：协整标志不一致的k线比例、对冲比率误差、重算次数、耗时
+    :param s1: 价格序列 x
+    :param s2: 价格序列 y
+    :param back_hour: 回看窗口
+    :param settings: [(refit_every, refit_drift)]
+    :param compact: 是否使用紧凑模式
+    :return: 每个设置一行，第一行为逐根计算
+    """
+    s1, s2 = s1.align(s2, join='inner')
+    begin = time.perf_counter()
+    coint, h_ratio, _ = rolling_coint(s1, s2, back_hour, fast=True, compact=compact)
+    base_seconds = time.perf_counter() - begin
+    n_win = len(coint)
+    rows = [{'refit_every': 1, 'refit_drift': None, 'refits': n_win, 'flag_diff': 0.0, 'flag_diff_bars': 0,
+             'hedge_ratio_abs': 0.0, 'seconds': base_seconds, 'speedup': 1.0}]
+    x, y = s1.to_numpy(dtype=np.float64), s2.to_numpy(dtype=np.float64)
+    h_full, a_full = rolling_ols(x, y, back_hour)
+    for refit_every, refit_drift in settings:
+        begin = time.perf_counter()
+        coint_r, h_ratio_r, _ = rolling_coint(s1, s2, back_hour, fast=True, compact=compact,
+                                              refit_every=refit_every, refit_drift=refit_drift)
+        seconds = time.perf_counter() - begin
+        diff = coint.to_numpy() != coint_r.to_numpy()
+        refits = len(refit_windows(x, y, h_full[:n_win], a_full[:n_win], back_hour, refit_every, refit_drift))
+        rows.append({'refit_every': refit_every, 'refit_drift': refit_drift, 'refits': refits,
+                     'flag_diff': float(diff.mean()) if n_win else 0.0, 'flag_diff_bars': int(diff.sum()),
+                     'hedge_ratio_abs': float(np.nanmax(np.abs(h_ratio.to_numpy(dtype=np.float64) -
+                                                               h_ratio_r.to_numpy(dtype=np.float64))))
+                     if n_win else 0.0,
+                     'seconds': seconds, 'speedup': base_seconds / seconds})
+    return pd.DataFrame(rows)
@@ -0,0 +1,277 @@
+from typing import Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+
+from program import metrics
+from program.curve import _trade_masks
+
+# 重采样评价的指标，定义与 cal_evaluate 相同（最大回撤、胜率为数值而非百分比字符串）
+METRIC_COLS = ['累积净值', '年化收益', '月化收益', '月化波动', '月信息比', '最大回撤', '胜率']
+# 交易顺序重排的指标，以笔为单位
+TRADE_COLS = ['累积净值', '最大回撤', '最大连续亏损笔数']
+# 计算 p 值时各指标的优劣方向：1 越大越好，-1 越小越好；最大回撤按幅度（绝对值）比较
+BETTER = {'累积净值': 1, '年化收益': 1, '月化收益': 1, '月化波动': -1, '月信息比': 1, '最大回撤': -1, '胜率': 1,
+          '最大连续亏损笔数': -1}
+
+
+def bar_hours_of(times) -> float:
+    """
+    k线周期（小时），取相邻k线时间差的中位数，与 cal_evaluate_array 一致
+    """
+    times = pd.DatetimeIndex(times)
+    if len(times) < 2:
+        return 1.0
+    return (times[1:] - times[:-1]).median().total_seconds() / 3600
+
+
+def curve_returns(curve) -> np.ndarray:
+    """
+    资金曲线转为相邻k线之间的收益，n 根k线得到 n - 1 个，与 cal_evaluate 的涨跌幅相同（无效值记为 0）
+    """
+    curve = np.asarray(curve, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = curve[1:] / curve[:-1] - 1
+    return np.where(np.isfinite(returns), returns, 0)
+
+
+def _max_drawdown(curve: np.ndarray, start: float = 1.0) -> np.ndarray:
+    """
+    每行最大回撤，起点净值为 start
+    """
+    peak = np.maximum(np.maximum.accumulate(curve, axis=1), start)
+    return np.minimum((curve / peak - 1).min(axis=1), 0)
+
+
+def _metrics(returns: np.ndarray, bar_hours: float, start: float = 1.0) -> np.ndarray:
+    """
+    (B, m) 收益矩阵每行一组评价指标，列顺序同 METRIC_COLS
+    m 个收益对应 m + 1 根k线，时间跨度为 m 根k线，与 cal_evaluate_array 的 times[-1] - times[0] 相同
+    :param start: 第一根k线的净值，累积净值、回撤从该值开始
+    """
+    eps = 1e-9
+    hour_diff = max(returns.shape[1], 1) * bar_hours
+    curve = start * np.cumprod(1 + returns, axis=1)
+    final = curve[:, -1]
+    monthly = np.power(final, 30.4 * 24 / hour_diff) - 1
+    volatility = returns.std(axis=1, ddof=1) * np.sqrt(30.5 * 24 / bar_hours)
+    win = (returns > 0).sum(axis=1)
+    loss = (returns < 0).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        win_rate = win / (win + loss)
+    return np.stack((final, np.power(final, 365 * 24 / hour_diff) - 1, monthly, volatility,
+                     monthly / (volatility + eps), _max_drawdown(curve, start), win_rate), axis=1)
+
+
+def _trade_metrics(trades: np.ndarray) -> np.ndarray:
+    """
+    (B, m) 逐笔收益矩阵每行一组指标，列顺序同 TRADE_COLS
+    """
+    curve = np.cumprod(1 + trades, axis=1)
+    lose = trades < 0
+    idx = np.arange(trades.shape[1])
+    last_win = np.maximum.accumulate(np.where(lose, -1, idx), axis=1)
+    return np.stack((curve[:, -1], _max_drawdown(curve), np.where(lose, idx - last_win, 0).max(axis=1)), axis=1)
+
+
+def _collect(chunks: Iterator[np.ndarray], func, cols, **kwargs) -> pd.DataFrame:
+    return pd.DataFrame(np.concatenate([func(chunk, **kwargs) for chunk in chunks]), columns=cols)
+
+
+def _chunks(n_boot: int, chunk: int) -> Iterator[int]:
+    for lo in range(0, n_boot, chunk):
+        yield min(chunk, n_boot - lo)
+
+
+@metrics.timed('significance')
+def block_bootstrap(returns, n_boot: int = 10000, block: int = 24, bar_hours: float = 1.0, seed: int = 0,
+                    chunk: int = 500, start: float = 1.0) -> pd.DataFrame:
+    """
+    收益序列的循环分块自助法：随机取起点、连续 block 根k线为一块拼接成与原序列等长的序列，保留块内的自相关
+    :param returns: (n,) 逐根k线收益，如 curve_returns(equity_curve)
+    :param n_boot: 重采样次数
+    :param block: 块长度（k线数），一般取持仓周期量级
+    :param bar_hours: k线周期（小时），用于年化、月化
+    :param seed: 随机种子
+    :param chunk: 每批重采样次数，控制内存（chunk × n 的矩阵）
+    :param start: 资金曲线第一根k线的净值
+    :return: 每次重采样一行，列同 METRIC_COLS
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    n = len(returns)
+    n_blocks = -(-n // block)
+    offsets = np.arange(block)
+    rng = np.random.default_rng(seed)
+
+    def chunks():
+        for size in _chunks(n_boot, chunk):
+            starts = rng.integers(0, n, (size, n_blocks))
+            idx = ((starts[:, :, None] + offsets) % n).reshape(size, -1)[:, :n]
+            yield returns[idx]
+
+    return _collect(chunks(), _metrics, METRIC_COLS, bar_hours=bar_hours, start=start)
+
+
+def trade_returns(curve, pos) -> np.ndarray:
+    """
+    由资金曲线和仓位得到逐笔收益（开仓k线到平仓k线的复合收益），开平仓规则与 cal_equity_curve 相同
+    :param curve: 资金曲线，如 merge_curve 的 equity_curve 列
+    :param pos: 仓位，如 target 的 pos，空值（cal_position 的第一根k线）视为空仓
+    :return: (m,) 每笔交易一个收益，按开仓时间排序
+    """
+    curve = np.asarray(curve, dtype=np.float64)
+    pos = np.nan_to_num(np.asarray(pos, dtype=np.float64))
+    # 与仓位逐根对齐，第一根相对初始资金 1
+    returns = np.concatenate(([curve[0] - 1], curve_returns(curve)))
+    in_pos, open_pos, _ = (mask[0] for mask in _trade_masks(pos[None, :]))
+    trade_id = np.cumsum(open_pos) - 1
+    log_sum = np.bincount(trade_id[in_pos], weights=np.log1p(returns[in_pos]), minlength=int(open_pos.sum()))
+    return np.expm1(log_sum)
+
+
+@metrics.timed('significance')
+def shuffle_trades(trades, n_boot: int = 10000, replace: bool = False, seed: int = 0,
+                   chunk: int = 2000) -> pd.DataFrame:
+    """
+    交易顺序重排：逐笔收益随机排列后重新复合，得到回撤、连续亏损在不同交易顺序下的分布
+    不放回时累积净值不变，只有路径相关的指标变化；放回（replace=True）时为逐笔自助法，累积净值也有分布
+    :param trades: (m,) 逐笔收益，如 trade_returns 的结果
+    :param n_boot: 重排次数
+    :param replace: 是否有放回抽样
+    :param seed: 随机种子
+    :param chunk: 每批重排次数
+    :return: 每次重排一行，列同 TRADE_COLS
+    """
+    trades = np.asarray(trades, dtype=np.float64)
+    if len(trades) == 0:
+        return pd.DataFrame(np.full((n_boot, len(TRADE_COLS)), np.nan), columns=TRADE_COLS)
+    rng = np.random.default_rng(seed)
+
+    def chunks():
+        for size in _chunks(n_boot, chunk):
+            if replace:
+                yield trades[rng.integers(0, len(trades), (size, len(trades)))]
+            else:
+                yield rng.permuted(np.broadcast_to(trades, (size, len(trades))), axis=1)
+
+    return _collect(chunks(), _trade_metrics, TRADE_COLS)
+
+
+def pair_returns(base: pd.DataFrame, target: pd.DataFrame) -> np.ndarray:
+    """
+    target 仓位为 1（做多 target、做空 base，两条腿各占一半资金）时每根k线的收益
+    与 cal_equity_curve 一致按开盘价成交：第 t 根k线的收益为本根开盘价到下根开盘价，最后一根取收盘价
+    """
+    def leg(df):
+        open_ = df['open'].to_numpy(dtype=np.float64)
+        next_open = np.concatenate((open_[1:], df['close'].to_numpy(dtype=np.float64)[-1:]))
+        return next_open / open_ - 1
+
+    return (leg(target) - leg(base)) / 2
+
+
+def _position_returns(pos: np.ndarray, market: np.ndarray, leverage_rate: float, cost: float) -> np.ndarray:
+    """
+    (B, n) 仓位对应的收益：持仓收益减去换仓成本，不计爆仓和最小下单量
+    """
+    turnover = np.abs(np.diff(pos, axis=1, prepend=0))
+    return leverage_rate * (pos * market - cost * turnover)
+
+
+@metrics.timed('significance')
+def random_entry(pos, market, n_boot: int = 10000, leverage_rate: float = 1, cost: float = 1 / 1000 + 5 / 10000,
+                 bar_hours: float = 1.0, seed: int = 0, chunk: int = 500) -> Tuple[pd.DataFrame, pd.Series]:
+    """
+    随机入场时间：仓位序列整体循环平移随机根k线，交易笔数、持仓时长、多空方向不变，只打乱与行情的对应关系
+    作为零假设分布，与实际仓位在同一收益模型下比较，得到 p 值
+    :param pos: (n,) 实际仓位
+    :param market: (n,) 仓位为 1 时的逐根k线收益，如 pair_returns 的结果
+    :param n_boot: 重采样次数
+    :param leverage_rate: 杠杆倍数
+    :param cost: 单位名义价值换仓一次的成本（手续费 + 滑点）
+    :param bar_hours: k线周期（小时）
+    :param seed: 随机种子
+    :param chunk: 每批重采样次数
+    :return: 每次重采样一行的指标、实际仓位的指标
+    """
+    pos = np.nan_to_num(np.asarray(pos, dtype=np.float64))
+    market = np.nan_to_num(np.asarray(market, dtype=np.float64))
+    n = len(pos)
+    rng = np.random.default_rng(seed)
+    bars = np.arange(n)
+
+    def chunks():
+        for size in _chunks(n_boot, chunk):
+            shift = rng.integers(1, n, size)
+            yield _position_returns(pos[(bars - shift[:, None]) % n], market, leverage_rate, cost)
+
+    samples = _collect(chunks(), _metrics, METRIC_COLS, bar_hours=bar_hours)
+    actual = _metrics(_position_returns(pos[None, :], market, leverage_rate, cost), bar_hours)[0]
+    return samples, pd.Series(actual, index=METRIC_COLS)
+
+
+def summarize(samples: pd.DataFrame, actual: pd.Series, alpha: float = 0.05, null: bool = False) -> pd.DataFrame:
+    """
+    重采样结果汇总为置信区间
+    :param samples: 重采样指标，每次一行
+    :param actual: 实际指标
+    :param alpha: 双侧置信区间外的概率
+    :param null: samples 是否为零假设分布（随机入场），是则附单侧 p 值：零假设下不差于实际的比例，
+                 优劣方向见 BETTER（波动、回撤幅度越小越好）
+    :return: 每个指标一行：actual、mean、std、lower、upper（、p_value）
+    """
+    values = samples.to_numpy(dtype=np.float64)
+    lower, upper = np.nanquantile(values, [alpha / 2, 1 - alpha / 2], axis=0)
+    df = pd.DataFrame({
+        'actual': actual[samples.columns].to_numpy(dtype=np.float64),
+        'mean': np.nanmean(values, axis=0),
+        'std': np.nanstd(values, axis=0),
+        'lower': lower,
+        'upper': upper,
+    }, index=samples.columns)
+    if null:
+        better = np.array([BETTER[col] for col in samples.columns], dtype=np.float64)
+        # 最大回撤为负数，取幅度后与波动一样越小越好
+        magnitude = np.array([col == '最大回撤' for col in samples.columns])
+        score = np.where(magnitude, np.abs(values), values) * better
+        actual_score = np.where(magnitude, np.abs(df['actual'].to_numpy()), df['actual'].to_numpy()) * better
+        df['p_value'] = (1 + (score >= actual_score).sum(axis=0)) / (1 + len(values))
+    return df
+
+
+def significance_report(equity_curve: pd.DataFrame, base: pd.DataFrame, target: pd.DataFrame, target_pos,
+                        n_boot: int = 10000, block: int = 24, leverage_rate: float = 1,
+                        cost: float = 1 / 1000 + 5 / 10000, alpha: float = 0.05, seed: int = 0) -> pd.DataFrame:
+    """
+    配对回测结果的显著性检验，输入为 script/playback.py 的回测结果
+    :param equity_curve: merge_curve 的结果，含 candle_begin_time、equity_curve
+    :param base: base 的k线
+    :param target: target 的k线
+    :param target_pos: target 仓位
+    :param n_boot: 每种方法的重采样次数
+    :param block: 分块自助法的块长度（k线数）
+    :param leverage_rate: 杠杆倍数，同 cal_equity_curve
+    :param cost: 换仓成本，默认为 cal_equity_curve 的滑点 + 手续费
+    :param alpha: 置信区间外的概率
+    :param seed: 随机种子
+    :return: 索引为 (method, metric)：bootstrap（收益分块自助）、shuffle（交易顺序重排）、random_entry（随机入场，附 p 值）
+    """
+    bar_hours = bar_hours_of(equity_curve['candle_begin_time'])
+    curve = equity_curve['equity_curve'].to_numpy(dtype=np.float64)
+    returns = curve_returns(curve)
+    pos = np.asarray(target_pos, dtype=np.float64)
+
+    # 与 cal_evaluate 口径一致：n - 1 个收益，从第一根k线的净值开始
+    actual = pd.Series(_metrics(returns[None, :], bar_hours, curve[0])[0], index=METRIC_COLS)
+    bootstrap = block_bootstrap(returns, n_boot, block, bar_hours, seed, start=curve[0])
+
+    trades = trade_returns(curve, pos)
+    shuffle = shuffle_trades(trades, n_boot, seed=seed)
+    actual_trades = pd.Series(_trade_metrics(trades[None, :])[0] if len(trades) else np.nan, index=TRADE_COLS)
+
+    null, actual_model = random_entry(pos, pair_returns(base, target), n_boot, leverage_rate, cost, bar_hours, seed)
+    return pd.concat({
+        'bootstrap': summarize(bootstrap, actual, alpha),
+        'shuffle': summarize(shuffle, actual_trades, alpha),
+        'random_entry': summarize(null, actual_model, alpha, null=True),
+    }, names=['method', 'metric'])
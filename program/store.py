@@ -0,0 +1,110 @@
+import json
+import os
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+import config
+from program.compact import PRICE_DTYPE
+from program.resample import is_base, resample_data
+
+
+def write_store(data: Dict[str, pd.DataFrame], store_path: str, compact: bool = False):
+    """
+    将 {symbol: DataFrame} 按列写入磁盘，每个币种一个目录、每列一个 .npy 文件
+    各币种上市时间不同，时间列按币种各自保存，缺失k线的信息与原 DataFrame 一致
+    非数值列（如 symbol 字符串）不保存
+    :param data: swap_dict
+    :param store_path: 存储目录
+    :param compact: True 时浮点列保存为 float32，磁盘和映射内存减半
+    """
+    os.makedirs(store_path, exist_ok=True)
+    meta = {}
+    for symbol, df in data.items():
+        symbol_path = os.path.join(store_path, symbol)
+        os.makedirs(symbol_path, exist_ok=True)
+        cols = []
+        for col in df.columns:
+            values = df[col].to_numpy()
+            if values.dtype == object:
+                continue
+            if compact and values.dtype == np.float64:
+                values = values.astype(PRICE_DTYPE)
+            np.save(os.path.join(symbol_path, f'{col}.npy'), values, allow_pickle=False)
+            cols.append(col)
+        meta[symbol] = cols
+    with open(os.path.join(store_path, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+
+def convert_pickle(pkl_path: str = config.swap_path, store_path: str = config.store_path, compact: bool = False):
+    """
+    swap_dict.pkl 转为列式存储，只需运行一次
+    """
+    write_store(pd.read_pickle(pkl_path), store_path, compact)
+
+
+def load_store(store_path: str = config.store_path, symbols: List[str] | None = None,
+               cols: List[str] | None = None) -> Dict[str, pd.DataFrame]:
+    """
+    内存映射方式读取指定币种、指定列，只有实际访问到的数据才会从磁盘读入
+    :param store_path: 存储目录
+    :param symbols: 币种，默认全部
+    :param cols: 列名，默认全部
+    :return: {symbol: DataFrame}，与 swap_dict 结构一致
+    """
+    with open(os.path.join(store_path, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    data = {}
+    for symbol in (symbols if symbols is not None else meta.keys()):
+        symbol_cols = meta[symbol] if cols is None else [col for col in cols if col in meta[symbol]]
+        data[symbol] = pd.DataFrame({
+            col: np.load(os.path.join(store_path, symbol, f'{col}.npy'), mmap_mode='r', allow_pickle=False)
+            for col in symbol_cols
+        }, copy=False)
+        # 重采样缓存以币种为键
+        data[symbol].attrs['symbol'] = symbol
+    return data
+
+
+def timeframe_store_path(timeframe: str, store_path: str = config.store_path) -> str:
+    """
+    重采样后列式存储的目录，如 swap_store/4h
+    """
+    return os.path.join(store_path, str(timeframe))
+
+
+def write_timeframes(timeframes: List[str], store_path: str = config.store_path, compact: bool = False):
+    """
+    由 1h 列式存储生成更大周期的列式存储，之后各次运行直接映射，不再重采样
+    """
+    data = load_store(store_path)
+    for timeframe in timeframes:
+        write_store(resample_data(data, timeframe, cache=None), timeframe_store_path(timeframe, store_path), compact)
+
+
+def load_data(symbols: List[str] | None = None, cols: List[str] | None = None,
+              timeframe: str | None = None) -> Dict[str, pd.DataFrame]:
+    """
+    读取行情数据，列式存储存在时按需映射，否则回退到 swap_dict.pkl
+    :param symbols: 币种，默认全部
+    :param cols: 列名，默认全部
+    :param timeframe: k线周期，默认 1h；已用 write_timeframes 生成的周期直接映射，否则由 1h 数据重采样（进程内缓存）
+    :return: {symbol: DataFrame}
+    """
+    if not is_base(timeframe):
+        path = timeframe_store_path(timeframe)
+        if os.path.exists(os.path.join(path, 'meta.json')):
+            return load_store(path, symbols, cols)
+        return resample_data(load_data(symbols, cols), timeframe)
+    if os.path.exists(os.path.join(config.store_path, 'meta.json')):
+        return load_store(config.store_path, symbols, cols)
+    data = pd.read_pickle(config.swap_path)
+    if symbols is not None:
+        data = {symbol: data[symbol] for symbol in symbols}
+    if cols is not None:
+        data = {symbol: df[[col for col in cols if col in df.columns]] for symbol, df in data.items()}
+    for symbol, df in data.items():
+        df.attrs['symbol'] = symbol
+    return data
@@ -0,0 +1,147 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+from program import metrics
+from program.analyse import scan_pairs
+from program.cache import ResultCache
+from program.common import build_index
+from program.panel import PricePanel
+from program.portfolio import backtest_portfolio
+
+FIELDS = ('open', 'high', 'low', 'close')
+
+
+def align_fields(data: Dict[str, pd.DataFrame], start_time, end_time) -> Dict[str, pd.DataFrame]:
+    """
+    各币种 open high low close 对齐到同一时间轴，缺失k线为空值
+    :param data: {symbol: DataFrame}，load_data 的结果
+    :param start_time: 开始时间
+    :param end_time: 结束时间
+    :return: {field: 价格矩阵}，每列一个币种
+    """
+    frames = {}
+    for symbol, df in data.items():
+        df = df[(df['candle_begin_time'] >= start_time) & (df['candle_begin_time'] <= end_time)]
+        if not df.empty:
+            frames[symbol] = df.set_index('candle_begin_time')
+    index = pd.DatetimeIndex(sorted(set().union(*(df.index for df in frames.values()))))
+    return {field: pd.DataFrame({symbol: df[field].reindex(index) for symbol, df in frames.items()}, index=index)
+            for field in FIELDS}
+
+
+def make_windows(n: int, formation_hours: int, trade_hours: int, warmup: int) -> List[Tuple[int, int, int, int]]:
+    """
+    滚动窗口，均为时间轴下标：形成期 [formation_start, trade_start)，样本外交易期 [trade_start, trade_end)，
+    交易期之前 warmup 根k线用于滚动协整、z-score 预热；相邻窗口的交易期首尾相接
+    :return: [(formation_start, warmup_start, trade_start, trade_end), ...]
+    """
+    windows = []
+    trade_start = max(formation_hours, warmup)
+    while trade_start < n:
+        windows.append((trade_start - formation_hours, trade_start - warmup, trade_start,
+                        min(trade_start + trade_hours, n)))
+        trade_start += trade_hours
+    return windows
+
+
+def _window_task(names: Dict[str, str], window: Tuple[int, int, int, int], top_n: int, params: Dict,
+                 cache: ResultCache | None) -> Tuple[pd.DataFrame, pd.DataFrame] | None:
+    """
+    单个窗口：形成期批量扫描选出协整币对，样本外交易期回测
+    价格从共享矩阵按下标切片，不复制
+    """
+    panels = {field: PricePanel.attach(name) for field, name in names.items()}
+    formation_start, warmup_start, trade_start, trade_end = window
+    index = pd.DatetimeIndex(panels['close'].index)
+
+    # 形成期：数据完整的币种做矩阵化扫描，按 zero_crossings 取前 top_n 个币对，与 tools/1_批量计算协整对.py 一致
+    close = pd.DataFrame(panels['close'].values[formation_start:trade_start], columns=panels['close'].symbols,
+                         copy=False)
+    df_coint, _ = scan_pairs(close.loc[:, close.notna().all().to_numpy()], cache=cache)
+    if df_coint.empty:
+        return None
+    df_coint = df_coint.sort_values('zero_crossings', ascending=False).head(top_n)
+    # 只按交易期开始前的数据判断能否交易：预热期内数据完整的币对才交易，不使用交易期内的数据
+    ready = np.logical_and.reduce([~np.isnan(panels[field].values[warmup_start:trade_start]).any(axis=0)
+                                   for field in FIELDS])
+    tradable = {symbol for symbol, ok in zip(panels['close'].symbols, ready) if ok}
+    pairs = [(a, b) for a, b in zip(df_coint['base'], df_coint['target']) if a in tradable and b in tradable]
+    if not pairs:
+        return None
+
+    # 交易期：只取选中币种，预热期 + 交易期
+    # 交易期内出现缺失（如下架）的币种，第一根缺失k线之后价格固定为最后一根有效k线的收盘价，所在币对在该k线强制平仓
+    loc = panels['close'].loc
+    times = pd.Series(index[warmup_start:trade_end])
+    frames, delisted = {}, {}
+    for symbol in {symbol for pair in pairs for symbol in pair}:
+        values = np.column_stack([panels[field].values[warmup_start:trade_end, loc(symbol)] for field in FIELDS])
+        missing = np.flatnonzero(np.isnan(values).any(axis=1))
+        if len(missing):
+            last = missing[0] - 1
+            values = values.copy()
+            values[last + 1:] = values[last, FIELDS.index('close')]
+            delisted[symbol] = times.iloc[last]
+        frames[symbol] = pd.DataFrame({'candle_begin_time': times, **dict(zip(FIELDS, values.T))}, copy=False)
+    curve, attribution = backtest_portfolio(build_index(frames), pairs, index[warmup_start], index[trade_end - 1],
+                                            trade_start=index[trade_start], n_jobs=1, cache=cache,
+                                            delisted=delisted, **params)
+    attribution.insert(0, 'trade_start', index[trade_start])
+    attribution.insert(0, 'formation_start', index[formation_start])
+    return curve[['candle_begin_time', 'equity_curve']], attribution
+
+
+def walk_forward(data: Dict[str, pd.DataFrame], start_time, end_time, formation_hours: int = 24 * 30,
+                 trade_hours: int = 24 * 7, top_n: int = 20, back_hour: int = 24 * 30, zscore_window: int = 168,
+                 n_jobs: int = -1, cache: ResultCache | None = None, **kwargs) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    滚动样本外回测：每个窗口在形成期选币对，在随后的交易期交易，各交易期资金曲线首尾相接
+    窗口之间相互独立，分发到进程池并行；价格对齐后放入共享内存矩阵一次，各窗口按下标切片，重叠部分不重复读取、复制
+    :param data: {symbol: DataFrame}，load_data 的结果，含 candle_begin_time open high low close
+    :param start_time: 开始时间，第一个窗口的形成期（及预热期）从此开始
+    :param end_time: 结束时间
+    :param formation_hours: 形成期长度
+    :param trade_hours: 交易期长度，也是窗口滚动步长
+    :param top_n: 每个窗口交易的币对数
+    :param back_hour: 滚动协整回看窗口
+    :param zscore_window: z-score 窗口
+    :param n_jobs: 进程数
+    :param cache: 结果缓存
+    :param kwargs: backtest_portfolio 的其余参数，如 upper lower leverage weighting symbol_cap
+    :return: 拼接后的样本外资金曲线，各窗口选中币对及归因
+    """
+    fields = align_fields(data, start_time, end_time)
+    # 交易期开始时 z-score 已有效
+    warmup = back_hour + zscore_window
+    windows = make_windows(len(fields['close']), formation_hours, trade_hours, warmup)
+    params = {'back_hour': back_hour, 'zscore_window': zscore_window, **kwargs}
+
+    panels = {field: PricePanel.create(prices) for field, prices in fields.items()}
+    try:
+        names = {field: panel.name for field, panel in panels.items()}
+        results = Parallel(n_jobs=n_jobs)(
+            delayed(metrics.recorded(_window_task))(names, window, top_n, params, cache) for window in windows)
+        results = [metrics.collect(result) for result in results]
+    finally:
+        for panel in panels.values():
+            panel.unlink()
+
+    # 各交易期资金曲线按上一段期末净值首尾相接，未选出币对的窗口空仓
+    curves, attributions = [], []
+    equity = 1.0
+    for (_, _, trade_start, trade_end), result in zip(windows, results):
+        if result is None:
+            curve = pd.DataFrame({'candle_begin_time': fields['close'].index[trade_start:trade_end],
+                                  'equity_curve': 1.0})
+        else:
+            curve, attribution = result
+            attributions.append(attribution)
+        curve = curve.assign(equity_curve=curve['equity_curve'].to_numpy() * equity)
+        equity = curve['equity_curve'].iloc[-1]
+        curves.append(curve)
+    curve = pd.concat(curves, ignore_index=True)
+    attribution = pd.concat(attributions, ignore_index=True) if attributions else pd.DataFrame()
+    return curve, attribution
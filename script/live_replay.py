@@ -0,0 +1,62 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from program.common import cal_spread, extract_col
+from program.function import cal_zscore, cal_signal, cal_position
+from program.live import LiveEngine, replay_feed
+from program.rolling import rolling_coint
+from program.store import load_data
+
+pd.set_option('display.max_columns', None)  # 显示所有列
+pd.set_option('display.expand_frame_repr', False)  # 不换行
+
+
+if __name__ == '__main__':
+    # 用历史数据逐根推送，检查增量引擎与批量计算逐根一致
+    symbol1 = 'CELO-USDT'
+    symbol2 = 'BAT-USDT'
+    start_date = pd.Timestamp('2024-01-01')
+    end_date = pd.Timestamp('2024-12-01')
+    # 对冲比率：ols / rls / kalman
+    hedge = 'ols'
+    # 每隔几根k线重算协整 adf，1 为逐根
+    refit_every = 1
+    data = load_data([symbol1, symbol2], ['candle_begin_time', 'close'])
+
+    engine = LiveEngine([(symbol1, symbol2)], back_hour=720, zscore_window=168, upper=2, lower=-2, hedge=hedge,
+                        refit_every=refit_every)
+    begin = time.time()
+    rows = []
+    for candle_begin_time, closes in replay_feed(data, engine.symbols, start_date, end_date):
+        out = engine.on_bar(closes)
+        rows.append({'candle_begin_time': candle_begin_time, **{k: v[0] for k, v in out.items()}})
+    live = pd.DataFrame(rows)
+    print(f'live cost {time.time() - begin}, {len(live)} bars')
+
+    # 批量计算
+    base_close = extract_col(data[symbol1], 'close', start_date, end_date)
+    target_close = extract_col(data[symbol2], 'close', start_date, end_date)
+    coint_list, h_ratio_list, _ = rolling_coint(base_close, target_close, 720, fast=True, hedge=hedge,
+                                                 refit_every=refit_every)
+    spread = cal_spread(base_close, target_close, hedge_ratio=h_ratio_list)
+    zscore_series = cal_zscore(spread, 168)
+    signal = cal_signal(zscore_series, coint_list, 2, -2)
+    target_pos = cal_position(signal)
+
+    checks = {
+        'is_coint': (live['is_coint'].iloc[720:].to_numpy(), coint_list.to_numpy(dtype=bool)),
+        'hedge_ratio': (live['hedge_ratio'].to_numpy(), h_ratio_list.reindex(live.index).to_numpy()),
+        'long': (live['long'].to_numpy(), signal['long'].reindex(live.index, fill_value=False).to_numpy(bool)),
+        'short': (live['short'].to_numpy(), signal['short'].reindex(live.index, fill_value=False).to_numpy(bool)),
+        'exit_long': (live['exit_long'].to_numpy(),
+                      signal['exit_long'].reindex(live.index, fill_value=False).to_numpy(bool)),
+        'exit_short': (live['exit_short'].to_numpy(),
+                       signal['exit_short'].reindex(live.index, fill_value=False).to_numpy(bool)),
+        # 引擎输出的是下一根k线的目标仓位；批量结果最后一根k线强制平仓，不参与比较
+        'position': (live['position'].to_numpy()[:-2], target_pos.to_numpy()[1:-1]),
+    }
+    for name, (a, b) in checks.items():
+        print(name, 'mismatch', int((~((a == b) | (pd.isna(a) & pd.isna(b)))).sum()))
+    print('zscore max diff', np.nanmax(np.abs(live['zscore'].to_numpy() - zscore_series.to_numpy())))
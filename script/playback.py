@@ -2,11 +2,14 @@ from scipy.stats import spearmanr
 
 import config
 from program.analyse import cal_cointegration
+from program.cache import ResultCache
 from program.common import cal_spread, extract_cols
 from program.evaluate import cal_evaluate, plot_output
 from program.function import *
 from program.curve import *
 from program.rolling import *
+from program.significance import significance_report
+from program.store import load_data
 
 pd.set_option('display.max_columns', None)  # 显示所有列
 pd.set_option('display.max_rows', None)  # 显示所有行
@@ -14,25 +17,38 @@ pd.set_option('display.expand_frame_repr', False)  # 不换行
 
 
 if __name__ == '__main__':
-    data = pd.read_pickle(config.swap_path)
     symbol1 = 'CELO-USDT'
     symbol2 = 'BAT-USDT'
     start_date = '2024-01-01'
     end_date = '2024-12-01'
+    # k线周期，回看窗口、z-score 窗口按小时数换算为k线数
+    timeframe = '1h'
+    bar_hours = pd.Timedelta(timeframe) / pd.Timedelta('1h')
+    back_bars = int(720 / bar_hours)
+    zscore_bars = int(168 / bar_hours)
+    # 对冲比率：ols 回看窗口OLS，rls 递推最小二乘，kalman 卡尔曼滤波
+    hedge = 'ols'
     cols = ['candle_begin_time', 'close', 'high', 'open', 'low']
+    # 只映射用到的2个币种、5列
+    data = load_data([symbol1, symbol2], cols)
     # 获得2个价格序列
-    base = extract_cols(data[symbol1], cols, pd.Timestamp(start_date), pd.Timestamp(end_date))
-    target = extract_cols(data[symbol2], cols, pd.Timestamp(start_date), pd.Timestamp(end_date))
+    base = extract_cols(data[symbol1], cols, pd.Timestamp(start_date), pd.Timestamp(end_date), timeframe)
+    target = extract_cols(data[symbol2], cols, pd.Timestamp(start_date), pd.Timestamp(end_date), timeframe)
     base_close = base['close']
     target_close = target['close']
-    # 滚动协整、滚动相关系数
-    coint_list, h_ratio_list, corr_list = rolling_coint(base_close, target_close, 720)
+    # 滚动协整、滚动相关系数，数据未变化时直接读取缓存
+    cache = ResultCache()
+    coint_list, h_ratio_list, corr_list = rolling_coint(base_close, target_close, back_bars, fast=True,
+                                                         cache=cache, hedge=hedge)
 
     spread = cal_spread(base_close, target_close, hedge_ratio=h_ratio_list)
-    zscore_series = cal_zscore(spread, 168)
+    zscore_series = cal_zscore(spread, zscore_bars)
+    # 滚动半衰期、穿越0轴次数
+    half_life_list, zero_crossings_list = rolling_reversion(spread, zscore_bars)
     signal = cal_signal(zscore_series, coint_list,2, -2)
 
-    df = pd.concat([base_close, target_close, coint_list, h_ratio_list, corr_list, spread, zscore_series, signal], axis=1)
+    df = pd.concat([base_close, target_close, coint_list, h_ratio_list, corr_list, spread, zscore_series,
+                    half_life_list, zero_crossings_list, signal], axis=1)
     print(df)
     # exit()
     target_pos = cal_position(signal)
@@ -45,4 +61,9 @@ if __name__ == '__main__':
                                1, 1)
     data = cal_evaluate(equity_curve)
     print(data)
+    data.to_csv('data.csv')
+    # 显著性：收益分块自助、交易顺序重排、随机入场各 10000 次，区分运气和真实收益
+    significance = significance_report(equity_curve, base, target, target_pos, leverage_rate=2)
+    print(significance)
+    significance.to_csv('significance.csv')
     plot_output(equity_curve, data, config.plot_path)
@@ -0,0 +1,32 @@
+import os
+import time
+
+import pandas as pd
+
+import config
+from program.cache import ResultCache
+from program.common import build_index
+from program.evaluate import cal_evaluate
+from program.portfolio import load_pairs, backtest_portfolio
+from program.store import load_data
+
+pd.set_option('display.max_columns', None)  # 显示所有列
+pd.set_option('display.expand_frame_repr', False)  # 不换行
+
+
+if __name__ == '__main__':
+    start_date = '2024-01-01'
+    end_date = '2024-12-01'
+    # 批量协整计算结果的前 100 个币对
+    pairs = load_pairs(os.path.join(config.root_path, 'tools', 'coint_pairs.csv'), top_n=100)
+    symbols = sorted({symbol for pair in pairs for symbol in pair})
+    data = build_index(load_data(symbols, ['candle_begin_time', 'open', 'high', 'low', 'close']))
+
+    begin = time.time()
+    curve, attribution = backtest_portfolio(data, pairs, pd.Timestamp(start_date), pd.Timestamp(end_date),
+                                            weighting='equal', symbol_cap=0.2, cache=ResultCache())
+    print(f'cost {time.time() - begin}')
+    print(cal_evaluate(curve[['candle_begin_time', 'equity_curve']]))
+    print(attribution.sort_values('contribution', ascending=False).head(20))
+    curve.to_csv('portfolio_curve.csv', index=False)
+    attribution.to_csv('portfolio_attribution.csv', index=False)
@@ -0,0 +1,37 @@
+import os
+
+import pandas as pd
+
+import config
+from program.common import extract_col
+from program.portfolio import load_pairs
+from program.rolling import recalibration_report
+from program.store import load_data
+
+pd.set_option('display.max_columns', None)  # 显示所有列
+pd.set_option('display.expand_frame_repr', False)  # 不换行
+
+
+if __name__ == '__main__':
+    start_date = pd.Timestamp('2024-01-01')
+    end_date = pd.Timestamp('2024-12-01')
+    # (refit_every, refit_drift)：每 k 根k线重算，或残差均方漂移超过阈值时重算
+    settings = [(6, None), (24, None), (72, None), (None, 0.05), (None, 0.2), (24, 0.05)]
+    pairs = load_pairs(os.path.join(config.root_path, 'tools', 'coint_pairs.csv'), top_n=20)
+    data = load_data(sorted({symbol for pair in pairs for symbol in pair}), ['candle_begin_time', 'close'])
+
+    reports = []
+    for symbol1, symbol2 in pairs:
+        base = extract_col(data[symbol1], 'close', start_date, end_date)
+        target = extract_col(data[symbol2], 'close', start_date, end_date)
+        if base is None or target is None:
+            continue
+        report = recalibration_report(base, target, 720, settings)
+        report['pair'] = f'{symbol1}_{symbol2}'
+        reports.append(report)
+    df = pd.concat(reports, ignore_index=True)
+    df.to_csv('recalibration.csv', index=False)
+    # 各设置在全部币对上的平均：协整标志不一致比例、对冲比率误差、加速倍数
+    summary = df.fillna({'refit_every': 0, 'refit_drift': 0}).groupby(['refit_every', 'refit_drift'])[
+        ['refits', 'flag_diff', 'hedge_ratio_abs', 'speedup']].mean()
+    print(summary)
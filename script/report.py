@@ -0,0 +1,51 @@
+import os
+
+import pandas as pd
+
+import config
+from program.cache import ResultCache
+from program.common import cal_spread, extract_cols
+from program.curve import cal_equity_curve, merge_curve
+from program.evaluate import cal_evaluate
+from program.function import cal_zscore, cal_signal, cal_position, invert_position
+from program.portfolio import load_pairs
+from program.report import write_report
+from program.rolling import rolling_coint
+from program.store import load_data
+
+
+if __name__ == '__main__':
+    start_date = pd.Timestamp('2024-01-01')
+    end_date = pd.Timestamp('2024-12-01')
+    cols = ['candle_begin_time', 'open', 'high', 'low', 'close']
+    # 对冲比率：ols / rls / kalman，与 script/playback.py 相同
+    hedge = 'ols'
+    # 批量协整计算结果的前 20 个币对，一个 html 中下拉切换
+    pairs = load_pairs(os.path.join(config.root_path, 'tools', 'coint_pairs.csv'), top_n=20)
+    data = load_data(sorted({symbol for pair in pairs for symbol in pair}), cols)
+    cache = ResultCache()
+
+    report = {}
+    for symbol1, symbol2 in pairs:
+        base = extract_cols(data[symbol1], cols, start_date, end_date)
+        target = extract_cols(data[symbol2], cols, start_date, end_date)
+        if base is None or target is None:
+            continue
+        coint_list, h_ratio_list, _ = rolling_coint(base['close'], target['close'], 720, fast=True, cache=cache,
+                                                    hedge=hedge)
+        spread = cal_spread(base['close'], target['close'], hedge_ratio=h_ratio_list)
+        zscore_series = cal_zscore(spread, 168)
+        signal = cal_signal(zscore_series, coint_list, 2, -2)
+        target['pos'] = cal_position(signal)
+        base['pos'] = invert_position(target['pos'])
+        df1 = cal_equity_curve(base, leverage_rate=2)
+        df2 = cal_equity_curve(target, leverage_rate=2)
+        equity_curve = merge_curve(df1['equity_curve'], df2['equity_curve'], base['candle_begin_time'], 1, 1)
+        df = pd.DataFrame({'candle_begin_time': base['candle_begin_time'], 'close1': base['close'],
+                           'close2': target['close'], 'spread': spread, 'zscore': zscore_series,
+                           'equity_curve': equity_curve['equity_curve'].to_numpy()})
+        df = pd.concat([df, signal], axis=1)
+        report[f'{symbol1}/{symbol2}'] = (df, cal_evaluate(equity_curve))
+
+    path = write_report(report, os.path.join(config.plot_path, '配对回测.html'))
+    print(path)
@@ -0,0 +1,36 @@
+import time
+
+import pandas as pd
+
+from program.backtest import sweep_pair
+from program.cache import ResultCache
+from program.common import extract_cols
+from program.store import load_data
+
+pd.set_option('display.max_columns', None)  # 显示所有列
+pd.set_option('display.expand_frame_repr', False)  # 不换行
+
+
+if __name__ == '__main__':
+    symbol1 = 'CELO-USDT'
+    symbol2 = 'BAT-USDT'
+    start_date = '2024-01-01'
+    end_date = '2024-12-01'
+    cols = ['candle_begin_time', 'close', 'high', 'open', 'low']
+    data = load_data([symbol1, symbol2], cols)
+    base = extract_cols(data[symbol1], cols, pd.Timestamp(start_date), pd.Timestamp(end_date))
+    target = extract_cols(data[symbol2], cols, pd.Timestamp(start_date), pd.Timestamp(end_date))
+
+    begin = time.time()
+    result = sweep_pair(base, target,
+                        back_hours=[24 * 15, 24 * 30],
+                        zscore_windows=[24, 72, 168],
+                        uppers=[1.5, 2, 2.5],
+                        lowers=[-1.5, -2, -2.5],
+                        leverages=[1, 2],
+                        slippages=[1 / 1000],
+                        cache=ResultCache())
+    print(f'cost {time.time() - begin}')
+    result = result.sort_values('年化收益', ascending=False)
+    print(result.head(20))
+    result.to_csv(f'{symbol1}_{symbol2}_sweep.csv', index=False)
@@ -0,0 +1,30 @@
+import time
+
+import pandas as pd
+
+import config
+from program.cache import ResultCache
+from program.evaluate import cal_evaluate, plot_output
+from program.store import load_data
+from program.walkforward import walk_forward
+
+pd.set_option('display.max_columns', None)  # 显示所有列
+pd.set_option('display.expand_frame_repr', False)  # 不换行
+
+
+if __name__ == '__main__':
+    start_date = '2024-01-01'
+    end_date = '2024-12-01'
+    data = load_data(cols=['candle_begin_time', 'open', 'high', 'low', 'close'])
+
+    begin = time.time()
+    # 形成期 30 天选币对，随后 7 天样本外交易，每 7 天滚动一次
+    curve, attribution = walk_forward(data, pd.Timestamp(start_date), pd.Timestamp(end_date),
+                                      formation_hours=24 * 30, trade_hours=24 * 7, top_n=20,
+                                      back_hour=24 * 30, zscore_window=168, cache=ResultCache())
+    print(f'cost {time.time() - begin}')
+    evaluate = cal_evaluate(curve)
+    print(evaluate)
+    print(attribution.groupby(['base', 'target'])['contribution'].sum().sort_values(ascending=False).head(20))
+    attribution.to_csv('walk_forward_pairs.csv', index=False)
+    plot_output(curve, evaluate, config.plot_path)
@@ -1,7 +1,8 @@
 import joblib
 import pandas as pd
 
-import config
+from program.compact import compact_data
+from program.store import load_data
 
 
 def cut(candle, start, end):
@@ -11,7 +12,9 @@ def cut(candle, start, end):
 
 
 if __name__ == '__main__':
-    data = pd.read_pickle(config.swap_path)
+    # True 时价格保存为 float32、symbol 为 category，文件和加载后的内存约减半
+    compact = False
+    data = load_data()
     start_date = '2023-12-01'
     end_date = '2025-01-01'
     btc = cut(data['BTC-USDT'], start_date, end_date)
@@ -23,4 +26,4 @@ if __name__ == '__main__':
         if len(tmp) == len(btc):
             sample_data[symbol] = tmp
 
-    joblib.dump(sample_data, 'data2024.pkl')
+    joblib.dump(compact_data(sample_data) if compact else sample_data, 'data2024.pkl')
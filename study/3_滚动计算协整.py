@@ -3,9 +3,13 @@ import time
 import joblib
 import pandas as pd
 import statsmodels.api as sm
-from joblib import Parallel, delayed
 from statsmodels.tsa.stattools import adfuller
 
+from program import metrics
+from program.jobs import JobStore, run_jobs
+from program.panel import PricePanel
+from program.rolling import rolling_coint
+
 
 def cal_coint(base: pd.Series, target: pd.Series):
     """
@@ -27,38 +31,60 @@ def cal_coint(base: pd.Series, target: pd.Series):
     return p_value < 0.05 and adf_result[0] < adf_result[4]['5%']
 
 
-def process_pair(a, b, s1: pd.Series, s2: pd.Series, window: int = 24 * 30):
+def process_pair(a, b, s1: pd.Series, s2: pd.Series, window: int = 24 * 30, fast: bool = False):
     """
     滚动计算协整关系
     :param s1: 价格序列 1
     :param s2: 价格序列 2
     :param window: 滚动窗口大小
-    :return: 协整结果序列 (布尔值)
+    :param fast: True 时使用累加和滚动OLS
+    :return: 协整结果序列 (布尔值)、耗时
     """
+    begin = time.time()
+    if fast:
+        coint, _, _ = rolling_coint(s1, s2, window, fast=True)
+        return {'pair': f'{a}_{b}', 'coint': coint, 'cost': time.time() - begin}
     # 初始化结果列表
     coint_results = []
-    begin = time.time()
     # 滚动窗口计算
     for i in range(window, len(s1)):
         base = s1.iloc[i - window:i]  # 取窗口内的 base 数据
         target = s2.iloc[i - window:i]  # 取窗口内的 target 数据
         result = cal_coint(base, target)  # 计算协整关系
         coint_results.append(result)
-    print(f'{a}_{b} cost {time.time() - begin}')
     # 将结果转换为 Series，索引与原始数据对齐
-    return {'pair': f'{a}_{b}', 'coint': pd.Series(coint_results, index=s1.index[window:])}
+    return {'pair': f'{a}_{b}', 'coint': pd.Series(coint_results, index=s1.index[window:]),
+            'cost': time.time() - begin}
+
+
+def process_panel_pair(a, b, name: str, i: int, j: int, window: int = 24 * 30, fast: bool = False):
+    """
+    从共享价格矩阵读取价格后滚动计算协整关系，任务参数只有币种下标
+    :param name: PricePanel 名称
+    :param i: 币种 a 的下标
+    :param j: 币种 b 的下标
+    """
+    panel = PricePanel.attach(name)
+    return process_pair(a, b, panel.series(i), panel.series(j), window, fast)
 
 
 if __name__ == '__main__':
     data = joblib.load('data2024.pkl')
     pairs = joblib.load('pairs.pkl')
-    arg_list = []
-    for a, b in pairs:
-        close1 = data[a]['close'].reset_index(drop=True)
-        close2 = data[b]['close'].reset_index(drop=True)
-        arg_list.append((a, b, close1, close2))
+    fast = True
+    symbols = sorted({symbol for pair in pairs for symbol in pair})
+    closes = pd.DataFrame({symbol: data[symbol]['close'].reset_index(drop=True) for symbol in symbols})
+    times = data[symbols[0]]['candle_begin_time']
     begin = time.time()
+    # worker 内的各环节耗时随结果返回，结束后写入 coint720_report.json
+    metrics.enable()
 
-    results = Parallel(n_jobs=16)(delayed(process_pair)(a, b, close1, close2) for a, b, close1, close2 in arg_list)
-    joblib.dump(results, 'coint720.pkl')
-    print(f'cost {time.time() - begin}')
+    # 每完成一个币对追加写入 coint720.store，中断后重新运行只计算未完成的币对
+    meta = {'window': 24 * 30, 'fast': fast, 'start': str(times.iloc[0]), 'end': str(times.iloc[-1])}
+    with PricePanel.create(closes) as panel, JobStore('coint720.store', meta) as store:
+        jobs = ((f'{a}_{b}', (a, b, panel.name, panel.loc(a), panel.loc(b), 24 * 30, fast)) for a, b in pairs)
+        stats = run_jobs(process_panel_pair, jobs, store, n_jobs=16)
+        cost = pd.Series([result['cost'] for result in store.values()])
+    print(f'cost {time.time() - begin}, per pair mean {cost.mean():.3f} max {cost.max():.3f}')
+    print({key: value for key, value in stats.items() if key != 'failed'}, stats['failed'])
+    print(metrics.format_report(metrics.save_report('coint720_report.json')))
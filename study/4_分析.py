@@ -1,25 +1,23 @@
-import joblib
-import pandas as pd
-
-def len_dist(s: pd.Series):
-    group_marker = s.ne(s.shift()).cumsum()
+import os
 
-    # 2. 过滤出 True 的组，并计算每组长度
-    true_groups = s.groupby(group_marker).sum()
+import pandas as pd
 
-    # 3. 统计不同长度的分布
-    length_distribution = true_groups.value_counts().sort_index()
-    print(length_distribution)
+from program.jobs import JobStore
+from program.regime import RegimeStore, rank_regimes, regime_events, regime_runs, run_length_distribution
 
 if __name__ == '__main__':
-    data = joblib.load('coint720.pkl')
-    stat_list = []
-    for info in data:
-        stat = {'pair': info['pair'], 'sum': info['coint'].astype(int).sum()}
-        stat_list.append(stat)
-        len_dist(info['coint'])
-        break
-    exit()
-    df = pd.DataFrame(stat_list)
-    df = df.sort_values(by='sum', ascending=False)
-    df.to_csv('rank168.csv')
+    window = 24 * 30
+    # study/3 的逐币对结果按位压缩为 (币对 × k线) 矩阵，之后的分析直接读取压缩文件
+    regime_path = f'coint{window}_regime.npz'
+    if os.path.exists(regime_path):
+        store = RegimeStore.load(regime_path)
+    else:
+        store = RegimeStore.from_results(JobStore(f'coint{window}.store').values())
+        store.save(regime_path)
+
+    # 全部币对一次计算
+    runs = regime_runs(store)
+    # 协整区间长度分布（不含首尾截断的区间）
+    print(run_length_distribution(runs, include_censored=False))
+    regime_events(store, runs).to_csv(f'events{window}.csv', index=False)
+    rank_regimes(store, runs).to_csv(f'rank{window}.csv')
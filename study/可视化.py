@@ -1,9 +1,10 @@
-import joblib
 import pandas as pd
 import matplotlib.pyplot as plt
+
+from program.jobs import JobStore
+
 if __name__ == '__main__':
-    data = joblib.load('coint720.pkl')
-    print(data)
+    data = JobStore('coint720.store').values()
     coint = pd.Series
     for d in data:
         if d['pair'] == 'ZIL-USDT_SXP-USDT':
@@ -0,0 +1,239 @@
+"""
+优化前的逐根循环 / DataFrame 实现，原样保留，作为回归测试的参照
+"""
+import itertools
+
+import numpy as np
+import pandas as pd
+
+
+def cal_position(signals: pd.DataFrame):
+    """
+    根据信号计算仓位，考虑平仓和开仓信号同时发生的情况
+    :param signals: 包含开多、平多、开空、平空信号的DataFrame
+    :return: 仓位序列，1表示做多，-1表示做空，0表示空仓
+    """
+    # 初始化仓位序列，初始状态为0（空仓）
+    position = pd.Series(0, index=signals.index)
+
+    # 遍历信号
+    for i in range(1, len(signals)):
+        # 当前仓位状态
+        current_position = position.iloc[i - 1]
+
+        # 信号
+        long = signals['long'].iloc[i]
+        short = signals['short'].iloc[i]
+        exit_long = signals['exit_long'].iloc[i]
+        exit_short = signals['exit_short'].iloc[i]
+
+        # 处理信号
+        if current_position == 1:  # 当前是做多 long 和 exit_short 无效
+            if exit_long:  # 平多
+                current_position = 0
+            if short:  # 做空信号（平多后开空）
+                current_position = -1
+        elif current_position == -1:  # 当前是做空 short 和 exit_long 无效
+            if exit_short:  # 平空
+                current_position = 0
+            if long:  # 做多信号（平空后开多）
+                current_position = 1
+        else:  # 当前是空仓，exit_short 和 exit_long 无效
+            if long:  # 做多信号
+                current_position = 1
+            elif short:  # 做空信号
+                current_position = -1
+
+        # 更新仓位
+        position.iloc[i] = current_position
+    # 仓位在出现信号后下根K线调整
+    position = position.shift()
+    # 最后一根k线平仓
+    position.iloc[-1] = 0
+    return position
+
+
+def cal_equity_curve(df: pd.DataFrame, slippage: float = 1 / 1000, c_rate: float = 5 / 10000,
+                     leverage_rate: float = 1, min_amount: float = 0.01,
+                     min_margin_ratio: float = 1 / 100, initial_cash: float = 1000) -> pd.DataFrame:
+    """
+    邢大资金曲线计算方法
+    :param df: 含 candle_begin_time open close high low pos
+    :param slippage:  滑点 ，可以用百分比，也可以用固定值。建议币圈用百分比，股票用固定值
+    :param c_rate:  手续费，commission fees，默认为万分之5。不同市场手续费的收取方法不同，对结果有影响。比如和股票就不一样。
+    :param leverage_rate:  杠杆倍数
+    :param min_amount:  最小下单量
+    :param min_margin_ratio: 最低保证金率，低于就会爆仓
+    :param initial_cash:
+    :return: curve
+    """
+    # 下根k线开盘价
+    df['next_open'] = df['open'].shift(-1)  # 下根K线的开盘价
+    df['next_open'] = df['next_open'].fillna(value=df['close'])
+
+    # 找出开仓、平仓的k线
+    condition1 = df['pos'] != 0  # 当前周期不为空仓
+    condition2 = df['pos'] != df['pos'].shift(1)  # 当前周期和上个周期持仓方向不一样。
+    open_pos_condition = condition1 & condition2
+
+    condition1 = df['pos'] != 0  # 当前周期不为空仓
+    condition2 = df['pos'] != df['pos'].shift(-1)  # 当前周期和下个周期持仓方向不一样。
+    close_pos_condition = condition1 & condition2
+
+    # 对每次交易进行分组
+    df.loc[open_pos_condition, 'start_time'] = df['candle_begin_time']
+    df['start_time'] = df['start_time'].ffill()
+    df.loc[df['pos'] == 0, 'start_time'] = pd.NaT
+
+    # 开始计算资金曲线
+    # 在open_pos_condition的K线，以开盘价计算买入合约的数量。（当资金量大的时候，可以用5分钟均价）
+    df.loc[open_pos_condition, 'contract_num'] = initial_cash * leverage_rate / (min_amount * df['open'])
+    df['contract_num'] = np.floor(df['contract_num'])  # 对合约张数向下取整
+    # 开仓价格：理论开盘价加上相应滑点
+    df.loc[open_pos_condition, 'open_pos_price'] = df['open'] * (1 + slippage * df['pos'])
+    # 开仓之后剩余的钱，扣除手续费
+    df['cash'] = initial_cash - df['open_pos_price'] * min_amount * df['contract_num'] * c_rate  # 即保证金
+
+    # 开仓之后每根K线结束时
+    # 买入之后cash，contract_num，open_pos_price不再发生变动
+    df['contract_num'] = df['contract_num'].ffill()
+    df['open_pos_price'] = df['open_pos_price'].ffill()
+    df['cash'] = df['cash'].ffill()
+    df.loc[df['pos'] == 0, ['contract_num', 'open_pos_price', 'cash']] = None
+
+    # 在平仓时
+    # 平仓价格
+    df.loc[close_pos_condition, 'close_pos_price'] = df['next_open'] * (1 - slippage * df['pos'])
+    # 平仓之后剩余的钱，扣除手续费
+    df.loc[close_pos_condition, 'close_pos_fee'] = df['close_pos_price'] * min_amount * df['contract_num'] * c_rate
+
+    # 计算利润
+    # 开仓至今持仓盈亏
+    df['profit'] = min_amount * df['contract_num'] * (df['close'] - df['open_pos_price']) * df['pos']
+    # 平仓时理论额外处理
+    df.loc[close_pos_condition, 'profit'] = min_amount * df['contract_num'] * (
+            df['close_pos_price'] - df['open_pos_price']) * df['pos']
+    # 账户净值
+    df['net_value'] = df['cash'] + df['profit']
+
+    # 计算爆仓
+    # 至今持仓盈亏最小值
+    df.loc[df['pos'] == 1, 'price_min'] = df['low']
+    df.loc[df['pos'] == -1, 'price_min'] = df['high']
+    df['profit_min'] = min_amount * df['contract_num'] * (df['price_min'] - df['open_pos_price']) * df['pos']
+    # 账户净值最小值
+    df['net_value_min'] = df['cash'] + df['profit_min']
+    # 计算保证金率
+    df['margin_ratio'] = df['net_value_min'] / (min_amount * df['contract_num'] * df['price_min'])
+    # 计算爆仓
+    df.loc[df['margin_ratio'] <= (min_margin_ratio + c_rate), 'liquidate'] = 1
+
+    # 平仓时扣除手续费
+    df.loc[close_pos_condition, 'net_value'] -= df['close_pos_fee']
+    # 应对偶然情况：下一根K线开盘价格价格突变，在平仓的时候爆仓。此处处理有省略，不够精确。
+    df.loc[close_pos_condition & (df['net_value'] < 0), 'liquidate'] = 1
+
+    # 对爆仓进行处理
+    df['liquidate'] = df.groupby('start_time')['liquidate'].ffill()
+    df.loc[df['liquidate'] == 1, 'net_value'] = 0
+
+    # 计算资金曲线
+    df['equity_change'] = df['net_value'].pct_change(fill_method=None)
+    df.loc[open_pos_condition, 'equity_change'] = df.loc[open_pos_condition, 'net_value'] / initial_cash - 1  # 开仓日的收益率
+    df['equity_change'] = df['equity_change'].fillna(value=0)
+    df['equity_curve'] = (1 + df['equity_change']).cumprod()
+    # 删除不必要的数据，并存储
+    df.drop(['next_open', 'contract_num', 'open_pos_price', 'cash', 'close_pos_price', 'close_pos_fee',
+             'profit', 'net_value', 'price_min', 'profit_min', 'net_value_min', 'margin_ratio', 'liquidate'],
+            axis=1, inplace=True)
+
+    return df
+
+
+def cal_evaluate(df: pd.DataFrame):
+    """
+    F神（FreeStep）策略评价函数
+    :param df: 净值曲线
+    :return: 评价
+    """
+    # 计算统计指标
+    key = '策略评价'
+    eps = 1e-9
+    results = pd.DataFrame()
+    ls_df = df.copy()
+    ls_df.set_index('candle_begin_time', inplace=True)
+    curve = ls_df['equity_curve'].to_frame(key)
+    curve.index.name = 'candle_begin_time'
+    time_diff = curve.index[-1] - curve.index[0]
+    hour_diff = time_diff.total_seconds() / 3600
+    curve_ = curve.copy()
+    curve.reset_index(inplace=True)
+    curve['本周期多空涨跌幅'] = curve[key].pct_change().fillna(0)
+    # 累积净值
+    results.loc[key, '累积净值'] = round(curve[key].iloc[-1], 3)
+    # 计算当日之前的资金曲线的最高点
+    curve['max2here'] = curve[key].expanding().max()
+    # 计算到历史最高值到当日的跌幅,drowdwon
+    curve['dd2here'] = curve[key] / curve['max2here'] - 1
+    # 计算最大回撤,以及最大回撤结束时间
+    end_date, max_draw_down = tuple(curve.sort_values(by=['dd2here']).iloc[0][['candle_begin_time', 'dd2here']])
+    # 计算最大回撤开始时间
+    start_date = curve[curve['candle_begin_time'] <= end_date].sort_values(by=key, ascending=False).iloc[0][
+        'candle_begin_time']
+    # 将无关的变量删除
+    curve.drop(['max2here', 'dd2here'], axis=1, inplace=True)
+    results.loc[key, '最大回撤'] = format(max_draw_down, '.2%')
+    results.loc[key, '最大回撤开始时间'] = str(start_date)
+    results.loc[key, '最大回撤结束时间'] = str(end_date)
+    # ===统计每个周期
+    results.loc[key, '盈利周期数'] = len(curve.loc[curve['本周期多空涨跌幅'] > 0])  # 盈利笔数
+    results.loc[key, '亏损周期数'] = len(curve.loc[curve['本周期多空涨跌幅'] < 0])  # 亏损笔数
+    results.loc[key, '胜率'] = format(
+        results.loc[key, '盈利周期数'] / (results.loc[key, '盈利周期数'] + results.loc[key, '亏损周期数'] + eps),
+        '.2%')  # 胜率
+    results.loc[key, '每周期平均收益'] = format(curve['本周期多空涨跌幅'].mean(), '.3%')  # 每笔交易平均盈亏
+    if curve.loc[curve['本周期多空涨跌幅'] <= 0]['本周期多空涨跌幅'].mean() != 0:
+        results.loc[key, '盈亏收益比'] = round(
+            curve.loc[curve['本周期多空涨跌幅'] > 0]['本周期多空涨跌幅'].mean() / curve
+            .loc[curve['本周期多空涨跌幅'] <= 0]['本周期多空涨跌幅'].mean() * (-1), 2)  # 盈亏比
+    else:
+        results.loc[key, '盈亏收益比'] = np.nan
+    results.loc[key, '单周期最大盈利'] = format(curve['本周期多空涨跌幅'].max(), '.2%')  # 单笔最大盈利
+    results.loc[key, '单周期大亏损'] = format(curve['本周期多空涨跌幅'].min(), '.2%')  # 单笔最大亏损
+    # ===连续盈利亏损
+    results.loc[key, '最大连续盈利周期数'] = max(
+        [len(list(v)) for k, v in itertools.groupby(np.where(curve['本周期多空涨跌幅'] > 0, 1, np.nan))])  # 最大连续盈利次数
+    results.loc[key, '最大连续亏损周期数'] = max(
+        [len(list(v)) for k, v in itertools.groupby(np.where(curve['本周期多空涨跌幅'] <= 0, 1, np.nan))])  # 最大连续亏损次数
+    # ===每年、每月收益率
+    curve.set_index('candle_begin_time', inplace=True)
+
+    # 计算相对年化 最大回撤 信息系数 波动率
+    result_stats = pd.DataFrame(index=['年化收益', '月化收益', '月信息比', '月化波动'], columns=curve_.columns)
+
+    result_stats.loc['年化收益'] = np.power(curve_.iloc[-1], 365 * 24 / hour_diff) - 1
+    result_stats.loc['月化收益'] = np.power(curve_.iloc[-1], 30.4 * 24 / hour_diff) - 1
+    result_stats.loc['月化波动'] = curve_.pct_change().dropna().apply(lambda x: x.std() * np.sqrt(30.5 * 24))
+    result_stats.loc['月信息比'] = (result_stats.loc['月化收益'] / (result_stats.loc['月化波动'] + eps))
+    result_stats = result_stats.astype('float32').round(3)
+
+    data = multi_list_merge([result_stats.T, results])
+    data['月化收益回撤比'] = data['月化收益'] / (abs(data['最大回撤'].str[:-1].astype('float32')) + eps) * 100
+
+    data = data[['累积净值', '年化收益', '月化收益', '月信息比', '月化波动', '月化收益回撤比', '最大回撤',
+                 '最大回撤开始时间', '最大回撤结束时间', '盈利周期数',
+                 '亏损周期数', '胜率', '每周期平均收益', '盈亏收益比', '单周期最大盈利', '单周期大亏损',
+                 '最大连续盈利周期数',
+                 '最大连续亏损周期数']]
+    data.to_csv('data.csv')
+    return data
+
+
+def multi_list_merge(df_list):
+    merge_df = None
+    for i in range(len(df_list) - 1):
+        if i == 0:
+            merge_df = pd.merge(df_list[0], df_list[1], left_index=True, right_index=True, how='inner')
+        else:
+            merge_df = merge_df.merge(df_list[i + 1], left_index=True, right_index=True, how='inner')
+    return merge_df
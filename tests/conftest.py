@@ -0,0 +1,7 @@
+import os
+import sys
+import warnings
+
+# 与各入口脚本一致，从仓库根目录导入 program、bench、config
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.simplefilter('ignore')
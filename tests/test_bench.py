@@ -0,0 +1,12 @@
+from bench import compact, run
+
+
+def test_bench_run_small_medium(capsys):
+    # 中等规模曾因选到有缺陷的合成币种而崩溃
+    assert run.main(['--sizes', 'small', 'medium', '--repeat', '1']) == 0
+    out = capsys.readouterr().out
+    assert 'medium  scan_pairs' in out
+
+
+def test_bench_compact():
+    assert compact.main(['--symbols', '20', '--bars', '2000']) == 0
@@ -0,0 +1,97 @@
+import itertools
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from program import cache as cache_module
+from program.cache import ResultCache, data_hash
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(str(tmp_path / 'cache.sqlite'))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # 访问时间严格递增，淘汰顺序确定
+    ticks = itertools.count()
+    monkeypatch.setattr(cache_module.time, 'time', lambda: float(next(ticks)))
+
+
+def test_hit_and_miss(cache):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {'value': 42}
+
+    assert cache.get_or_compute('k', compute) == {'value': 42}
+    assert cache.get_or_compute('k', compute) == {'value': 42}
+    assert len(calls) == 1
+    assert cache.get('missing') == (False, None)
+    stats = cache.stats()
+    assert (stats['hit'], stats['miss'], stats['entries']) == (1, 2, 1)
+    assert stats['bytes'] == len(pickle.dumps({'value': 42}, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def test_stats_persist_across_processes(cache):
+    cache.set('k', 1)
+    cache.get('k')
+    cache.flush()
+    # 传给 worker 时只带路径和参数
+    other = pickle.loads(pickle.dumps(cache))
+    assert other.get('k') == (True, 1)
+    assert other.stats()['hit'] == 2
+
+
+def test_data_hash_invalidation(cache):
+    s = pd.Series(np.arange(10, dtype=np.float64))
+    calls = []
+
+    def compute(series):
+        calls.append(1)
+        return series.sum()
+
+    for series in (s, s.copy(), s.set_axis(s.index + 1)):
+        cache.get_or_compute(data_hash('sum', series), lambda: compute(series))
+    assert len(calls) == 2
+    changed = s.copy()
+    changed.iloc[3] = -1
+    assert cache.get_or_compute(data_hash('sum', changed), lambda: compute(changed)) == 41
+    assert len(calls) == 3
+
+
+def test_lru_eviction(tmp_path, clock):
+    blob = b'x' * 1000
+    size = len(pickle.dumps(blob, protocol=pickle.HIGHEST_PROTOCOL))
+    cache = ResultCache(str(tmp_path / 'cache.sqlite'), max_bytes=3 * size)
+    for key in 'abc':
+        cache.set(key, blob)
+    # a 最近访问，写入 d 时淘汰最久未访问的 b
+    assert cache.get('a')[0]
+    cache.set('d', blob)
+    assert [cache.get(key)[0] for key in 'abcd'] == [True, False, True, True]
+    stats = cache.stats()
+    assert (stats['entries'], stats['bytes']) == (3, 3 * size)
+    # 覆盖写入不重复计算大小
+    cache.set('a', blob)
+    assert cache.stats()['bytes'] == 3 * size
+    cache.max_bytes = size
+    cache.evict()
+    assert cache.stats()['entries'] == 1
+    cache.clear()
+    assert cache.stats() == {'hit': 0, 'miss': 0, 'bytes': 0, 'entries': 0}
+
+
+def test_lazy_access_flush(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache.sqlite'), flush_every=3)
+    cache.set('k', 1)
+    reader = ResultCache(cache.path)
+    cache.get('k')
+    cache.get('k')
+    assert reader.stats()['hit'] == 0
+    cache.get('k')
+    assert reader.stats()['hit'] == 3
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import baseline
+from bench.synth import make_market
+from program.curve import cal_equity_curve, cal_equity_curve_array
+
+
+@pytest.fixture(scope='module')
+def frame():
+    df = make_market(n_symbols=1, n_bars=3000, n_clusters=0, n_gap=0, n_nan=0, n_late=0, seed=2)['S000-USDT']
+    rng = np.random.default_rng(2)
+    # 随机持仓段，含多空直接反手
+    df['pos'] = rng.choice([-1, 0, 1], p=[0.3, 0.4, 0.3], size=len(df))[np.arange(len(df)) // 25]
+    return df.drop(columns=['symbol'])
+
+
+@pytest.mark.parametrize('leverage_rate', [1, 3, 50])
+def test_equity_curve_matches_dataframe(frame, leverage_rate):
+    expected = baseline.cal_equity_curve(frame.copy(), leverage_rate=leverage_rate)
+    result = cal_equity_curve(frame.copy(), leverage_rate=leverage_rate)
+    pd.testing.assert_frame_equal(result, expected, check_exact=True)
+    if leverage_rate == 50:
+        # 高杠杆下出现爆仓
+        assert (expected['equity_change'] == -1).any()
+
+
+def test_equity_curve_array_rows(frame):
+    # 每行一组杠杆、滑点，一次计算
+    leverage = np.array([1, 2, 5, 50])
+    slippage = np.array([0, 1 / 1000, 2 / 1000, 1 / 1000])
+    cols = [np.tile(frame[col].to_numpy(dtype=np.float64), (4, 1)) for col in ('open', 'high', 'low', 'close')]
+    pos = np.stack([frame['pos'].to_numpy(), -frame['pos'].to_numpy(), frame['pos'].to_numpy(),
+                    frame['pos'].to_numpy()])
+    change, curve = cal_equity_curve_array(*cols, pos, slippage=slippage, leverage_rate=leverage)
+    for i in range(4):
+        df = frame.copy()
+        df['pos'] = pos[i]
+        expected = baseline.cal_equity_curve(df, slippage=slippage[i], leverage_rate=leverage[i])
+        np.testing.assert_array_equal(change[i], expected['equity_change'].to_numpy())
+        np.testing.assert_array_equal(curve[i], expected['equity_curve'].to_numpy())
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import baseline
+from program.evaluate import cal_evaluate, cal_evaluate_array
+
+
+def random_curve(n: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'candle_begin_time': pd.date_range('2024-01-01', periods=n, freq='h'),
+                         'equity_curve': np.cumprod(1 + rng.normal(0.0002, 0.01, n))})
+
+
+@pytest.fixture(autouse=True)
+def tmp_cwd(tmp_path, monkeypatch):
+    # 原实现写 data.csv
+    monkeypatch.chdir(tmp_path)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_evaluate_matches_dataframe(seed):
+    df = random_curve(3000, seed)
+    expected = baseline.cal_evaluate(df)
+    pd.testing.assert_frame_equal(cal_evaluate(df), expected, check_dtype=False, check_exact=True)
+
+
+def test_evaluate_array_rows():
+    frames = [random_curve(1000, seed) for seed in range(4)]
+    data = cal_evaluate_array(np.stack([df['equity_curve'].to_numpy() for df in frames]),
+                              frames[0]['candle_begin_time'])
+    for i, df in enumerate(frames):
+        row = cal_evaluate(df)
+        row.index = [i]
+        pd.testing.assert_frame_equal(data.iloc[[i]], row)
+
+
+def test_evaluate_drawdown_ties_resolve_to_earliest():
+    # 回撤最低点后空仓，多根k线回撤并列，起止时间都取最早的一根
+    values = [1.0, 1.2, 1.2, 0.9, 0.9, 0.9, 1.0, 1.2, 1.1]
+    df = pd.DataFrame({'candle_begin_time': pd.date_range('2024-01-01', periods=len(values), freq='h'),
+                       'equity_curve': values})
+    data = cal_evaluate(df)
+    assert data['最大回撤'].iloc[0] == '-25.00%'
+    assert data['最大回撤开始时间'].iloc[0] == '2024-01-01 01:00:00'
+    assert data['最大回撤结束时间'].iloc[0] == '2024-01-01 03:00:00'
+    # 其余指标与原实现一致
+    cols = [col for col in data.columns if col not in ('最大回撤开始时间', '最大回撤结束时间')]
+    pd.testing.assert_frame_equal(data[cols], baseline.cal_evaluate(df)[cols], check_dtype=False, check_exact=True)
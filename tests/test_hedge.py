@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bench.synth import make_market
+from program.hedge import hedge_panel, hedge_series, recursive_hedge
+from program.live import LiveEngine
+from program.rolling import rolling_coint
+
+WARMUP = 100
+
+
+@pytest.fixture(scope='module')
+def market():
+    data = make_market(n_symbols=6, n_bars=500, n_clusters=2, cluster_size=3, n_gap=0, n_nan=0, n_late=0,
+                       seed=3)
+    return {symbol: df.set_index('candle_begin_time')['close'] for symbol, df in data.items()}
+
+
+def expanding_ols(x: np.ndarray, y: np.ndarray, warmup: int):
+    # 第 i 根k线的结果只用到之前的数据
+    fits = [np.polyfit(x[:i], y[:i], 1) for i in range(warmup, len(x))]
+    return np.array([f[0] for f in fits]), np.array([f[1] for f in fits])
+
+
+@pytest.mark.parametrize('method, params', [('rls', {'lam': 1.0}), ('kalman', {'delta': 0.0})])
+def test_no_forgetting_equals_expanding_ols(market, method, params):
+    x, y = market['S000-USDT'].to_numpy(), market['S001-USDT'].to_numpy()
+    h_ratio, intercept = recursive_hedge(x, y, WARMUP, method, **params)
+    h_ols, a_ols = expanding_ols(x, y, WARMUP)
+    np.testing.assert_allclose(h_ratio, h_ols, rtol=1e-8)
+    np.testing.assert_allclose(intercept, a_ols, rtol=1e-8, atol=1e-8 * np.abs(y).max())
+
+
+@pytest.mark.parametrize('method', ['rls', 'kalman'])
+def test_vectorized_equals_per_pair(market, method):
+    symbols = list(market)
+    pairs = [(symbols[0], symbols[1]), (symbols[0], symbols[3]), (symbols[4], symbols[5])]
+    x = np.stack([market[a].to_numpy() for a, _ in pairs])
+    y = np.stack([market[b].to_numpy() for _, b in pairs])
+    h_ratio, intercept = recursive_hedge(x, y, WARMUP, method)
+    for k in range(len(pairs)):
+        h_single, a_single = recursive_hedge(x[k], y[k], WARMUP, method)
+        np.testing.assert_array_equal(h_ratio[k], h_single)
+        np.testing.assert_array_equal(intercept[k], a_single)
+    panel = hedge_panel(pd.DataFrame(market), pairs, WARMUP, method)
+    for a, b in pairs:
+        np.testing.assert_array_equal(panel[f'{a}_{b}'], hedge_series(market[a], market[b], WARMUP, method))
+
+
+@pytest.mark.parametrize('method', ['rls', 'kalman'])
+def test_live_engine_matches_batch(market, method):
+    symbols = list(market)
+    pairs = [(symbols[0], symbols[1]), (symbols[3], symbols[4])]
+    engine = LiveEngine(pairs, back_hour=WARMUP, zscore_window=24, hedge=method)
+    closes = np.column_stack([market[symbol].to_numpy() for symbol in engine.symbols])
+    live = np.array([engine.on_bar(row)['hedge_ratio'] for row in closes])
+    for k, (a, b) in enumerate(pairs):
+        _, h_ratio, _ = rolling_coint(market[a], market[b], WARMUP, fast=True, hedge=method)
+        assert np.isnan(live[:WARMUP, k]).all()
+        np.testing.assert_array_equal(live[WARMUP:, k], h_ratio.to_numpy())
@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+from program.jobs import JobStore, run_jobs
+
+
+def square(x):
+    return x * x
+
+
+def fail_on(x, bad):
+    if x == bad:
+        raise ValueError(x)
+    return x
+
+
+def test_store_truncates_partial_tail(tmp_path):
+    path = str(tmp_path / 'jobs.store')
+    with JobStore(path) as store:
+        for i in range(5):
+            store.append(f'k{i}', {'i': i})
+    size = os.path.getsize(path)
+    # 模拟写到一半被杀：记录头完整，值不完整
+    with open(path, 'ab') as f:
+        f.write(b'\x02\x00\x00\x00\x00\x01\x00\x00\x00\x00\x00\x00k5\x80')
+    with JobStore(path) as store:
+        assert os.path.getsize(path) == size
+        assert store.keys() == [f'k{i}' for i in range(5)]
+        assert [v['i'] for v in store.values()] == list(range(5))
+        store.append('k5', {'i': 5})
+    with JobStore(path) as store:
+        assert len(store) == 6
+        assert store.get('k5') == {'i': 5}
+
+
+def test_store_meta_mismatch(tmp_path):
+    path = str(tmp_path / 'jobs.store')
+    JobStore(path, meta={'window': 720}).close()
+    JobStore(path, meta={'window': 720}).close()
+    with pytest.raises(ValueError):
+        JobStore(path, meta={'window': 168})
+
+
+def test_run_jobs_resume(tmp_path):
+    path = str(tmp_path / 'jobs.store')
+    jobs = [(f'k{i}', (i,)) for i in range(20)]
+    with JobStore(path) as store:
+        # 已完成的任务不再计算，结果保持原样
+        store.append('k3', 'done')
+        stats = run_jobs(square, jobs[:10], store, n_jobs=1, verbose=False)
+        assert (stats['total'], stats['skipped'], stats['done']) == (10, 1, 9)
+    with JobStore(path) as store:
+        stats = run_jobs(square, jobs, store, n_jobs=1, verbose=False)
+        assert (stats['skipped'], stats['done']) == (10, 10)
+        assert dict(store.items()) == {**{f'k{i}': i * i for i in range(20)}, 'k3': 'done'}
+
+
+def test_run_jobs_failed_retried(tmp_path):
+    path = str(tmp_path / 'jobs.store')
+    jobs = [(f'k{i}', (i, 4)) for i in range(8)]
+    with JobStore(path) as store:
+        stats = run_jobs(fail_on, jobs, store, n_jobs=1, verbose=False)
+        assert list(stats['failed']) == ['k4']
+        assert 'k4' not in store
+    with JobStore(path) as store:
+        stats = run_jobs(fail_on, [(key, (i, -1)) for key, (i, _) in jobs], store, n_jobs=1, verbose=False)
+        assert (stats['skipped'], stats['done']) == (7, 1)
+        assert store.get('k4') == 4
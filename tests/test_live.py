@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bench.synth import make_market
+from program.common import cal_spread
+from program.function import cal_position, cal_signal, cal_zscore
+from program.live import LiveEngine
+from program.rolling import rolling_coint
+
+BACK_HOUR = 150
+ZSCORE_WINDOW = 48
+SIGNALS = ['long', 'short', 'exit_long', 'exit_short']
+
+
+@pytest.fixture(scope='module')
+def market():
+    data = make_market(n_symbols=8, n_bars=700, n_clusters=2, cluster_size=4, n_gap=0, n_nan=0, n_late=0, seed=7)
+    return {symbol: df['close'] for symbol, df in data.items()}
+
+
+def batch(base: pd.Series, target: pd.Series, hedge: str, refit_every: int):
+    coint, h_ratio, _ = rolling_coint(base, target, BACK_HOUR, fast=True, hedge=hedge, refit_every=refit_every)
+    spread = cal_spread(base, target, hedge_ratio=h_ratio)
+    zscore = cal_zscore(spread, ZSCORE_WINDOW)
+    signal = cal_signal(zscore, coint, 1, -1)
+    return coint, h_ratio, zscore, signal, cal_position(signal)
+
+
+@pytest.mark.parametrize('hedge, refit_every', [('ols', 1), ('ols', 6), ('rls', 1), ('kalman', 6)])
+def test_live_engine_matches_batch(market, hedge, refit_every):
+    symbols = list(market)
+    pairs = [(symbols[0], symbols[1]), (symbols[2], symbols[3]), (symbols[4], symbols[6]), (symbols[0], symbols[7])]
+    engine = LiveEngine(pairs, back_hour=BACK_HOUR, zscore_window=ZSCORE_WINDOW, upper=1, lower=-1, hedge=hedge,
+                        refit_every=refit_every)
+    closes = np.column_stack([market[symbol].to_numpy() for symbol in engine.symbols])
+    outputs = [engine.on_bar(row) for row in closes]
+    live = {key: np.array([out[key] for out in outputs]) for key in outputs[0]}
+
+    n_trades = 0
+    for k, (a, b) in enumerate(pairs):
+        coint, h_ratio, zscore, signal, position = batch(market[a], market[b], hedge, refit_every)
+        np.testing.assert_array_equal(live['is_coint'][BACK_HOUR:, k], coint.to_numpy(dtype=bool))
+        np.testing.assert_array_equal(live['hedge_ratio'][BACK_HOUR:, k], h_ratio.to_numpy())
+        np.testing.assert_allclose(live['zscore'][:, k], zscore.to_numpy(), rtol=0, atol=1e-8)
+        for col in SIGNALS:
+            np.testing.assert_array_equal(live[col][:, k], signal[col].to_numpy(dtype=bool), err_msg=col)
+        # 引擎输出下一根k线的目标仓位；批量结果最后一根k线强制平仓
+        np.testing.assert_array_equal(live['position'][:-2, k], position.to_numpy()[1:-1])
+        n_trades += int(signal['long'].sum() + signal['short'].sum())
+    assert n_trades > 0
@@ -0,0 +1,59 @@
+import importlib.util
+import os
+
+import pytest
+
+from bench.synth import make_market
+from program import metrics
+from program.jobs import JobStore, run_jobs
+from program.rolling import rolling_coint
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_tool():
+    spec = importlib.util.spec_from_file_location('coint_pairs', os.path.join(ROOT, 'tools', '1_批量计算协整对.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def rolling_task(s1, s2):
+    return rolling_coint(s1, s2, 100, fast=True)[0].sum()
+
+
+@pytest.fixture
+def recorder():
+    metrics.enable(None)
+    yield
+    metrics.disable()
+
+
+def test_parallel_counters_match_serial(tmp_path, monkeypatch, recorder):
+    monkeypatch.chdir(tmp_path)
+    tool = load_tool()
+    data = make_market(n_symbols=12, n_bars=400, seed=5)
+    start_time, end_time = data['S000-USDT']['candle_begin_time'].iloc[[0, -1]]
+    tool.get_cointegrated_pairs(data, start_time, end_time, parallel=False)
+    serial = metrics.disable()
+    metrics.enable(None)
+    tool.get_cointegrated_pairs(data, start_time, end_time, n_jobs=2)
+    parallel = metrics.report()
+    assert parallel['counters']['process_pair'] == serial['counters']['process_pair']
+    assert parallel['stages']['adf']['calls'] == serial['stages']['adf']['calls']
+
+
+def test_run_jobs_records_worker_stages(tmp_path, recorder):
+    data = make_market(n_symbols=4, n_bars=300, seed=6)
+    closes = [df['close'] for df in data.values()]
+    jobs = [(f'k{i}', (closes[i], closes[i + 1])) for i in range(3)]
+    for _, args in jobs:
+        rolling_task(*args)
+    serial = metrics.disable()
+    metrics.enable(None)
+    with JobStore(str(tmp_path / 'jobs.store')) as store:
+        run_jobs(rolling_task, jobs, store, n_jobs=2, verbose=False)
+    report = metrics.report()
+    assert {name: stage['calls'] for name, stage in report['stages'].items()} == \
+           {name: stage['calls'] for name, stage in serial['stages'].items()}
+    assert report['counters']['jobs'] == {'skipped': 0, 'done': 3, 'failed': 0}
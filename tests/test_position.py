@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import baseline
+from program.function import cal_position, cal_position_array
+
+SIGNALS = ['long', 'short', 'exit_long', 'exit_short']
+
+
+def random_signals(n: int, density: float, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({col: rng.random(n) < density for col in SIGNALS})
+
+
+@pytest.mark.parametrize('density', [0.01, 0.1, 0.5])
+def test_position_table_matches_loop(density):
+    signals = random_signals(2000, density, seed=int(density * 100))
+    expected = baseline.cal_position(signals)
+    pd.testing.assert_series_equal(cal_position(signals), expected, check_dtype=False, check_exact=True)
+    compact = cal_position(signals, compact=True)
+    assert compact.dtype == np.int8
+    np.testing.assert_array_equal(compact.to_numpy()[1:], expected.to_numpy()[1:])
+
+
+def test_position_array_batch_matches_rows():
+    frames = [random_signals(500, 0.05, seed) for seed in range(6)]
+    stacked = [np.stack([df[col].to_numpy() for df in frames]) for col in SIGNALS]
+    position = cal_position_array(*stacked)
+    for row, df in zip(position, frames):
+        np.testing.assert_array_equal(row[1:], baseline.cal_position(df).to_numpy()[1:])
+
+
+@pytest.mark.parametrize('n', [1, 2])
+def test_position_short_input(n):
+    signals = pd.DataFrame({col: [True] * n for col in SIGNALS})
+    pd.testing.assert_series_equal(cal_position(signals), baseline.cal_position(signals), check_dtype=False, check_exact=True)
+
+
+def test_position_empty_input():
+    signals = pd.DataFrame({col: np.zeros(0, dtype=bool) for col in SIGNALS})
+    with pytest.raises(IndexError):
+        baseline.cal_position(signals)
+    with pytest.raises(IndexError):
+        cal_position(signals)
+    assert cal_position_array(*(signals[col].to_numpy() for col in SIGNALS)).shape == (0,)
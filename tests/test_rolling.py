@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from statsmodels.tsa.stattools import adfuller
+
+from bench.synth import make_market
+from program.adf import adf_batch
+from program.rolling import rolling_coint
+
+
+@pytest.fixture(scope='module')
+def market():
+    return make_market(n_symbols=8, n_bars=400, n_gap=0, n_nan=0, n_late=0, seed=1)
+
+
+def test_adf_batch_matches_adfuller():
+    rng = np.random.default_rng(0)
+    n = 200
+    # 平稳 AR(1)、随机游走各一半
+    noise = rng.normal(size=(40, n))
+    windows = np.empty_like(noise)
+    windows[:, 0] = noise[:, 0]
+    phi = np.where(np.arange(40) < 20, 0.5, 1.0)
+    for i in range(1, n):
+        windows[:, i] = phi * windows[:, i - 1] + noise[:, i]
+    for autolag, maxlag in (('AIC', None), (None, 4)):
+        adf_stat, p_value, crit_5, used_lag = adf_batch(windows, maxlag, autolag)
+        for k, row in enumerate(windows):
+            res = adfuller(row, maxlag=maxlag, autolag=autolag)
+            assert used_lag[k] == res[2]
+            assert abs(adf_stat[k] - res[0]) <= 1e-11
+            assert p_value[k] == pytest.approx(res[1], abs=1e-12)
+            assert crit_5[k] == pytest.approx(res[4]['5%'], abs=1e-12)
+
+
+def test_rolling_coint_fast_matches_loop(market):
+    symbols = list(market)
+    back_hour = 120
+    # 同组协整、跨组不协整
+    for a, b in ((symbols[0], symbols[1]), (symbols[0], symbols[4])):
+        s1, s2 = market[a]['close'], market[b]['close']
+        coint, h_ratio, corr = rolling_coint(s1, s2, back_hour)
+        coint_fast, h_ratio_fast, corr_fast = rolling_coint(s1, s2, back_hour, fast=True)
+        assert (coint_fast.index == coint.index).all()
+        assert (coint_fast.astype(bool) == coint.astype(bool)).all()
+        # 对冲比率保留5位小数，舍入边界上可差一位
+        np.testing.assert_allclose(h_ratio_fast, h_ratio, rtol=0, atol=1.1e-5)
+        np.testing.assert_allclose(corr_fast, corr, rtol=0, atol=1e-9)
@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+
+from program.function import cal_position
+from program.significance import trade_returns
+
+
+def test_trade_returns_ignores_leading_nan():
+    curve = [1, 1, 1, 1.1, 1.2, 1.2]
+    np.testing.assert_allclose(trade_returns(curve, [np.nan, 0, 0, 1, 1, 0]), [0.2])
+
+
+def test_trade_returns_counts_cal_position_trades():
+    # 第1根开多、第3根平多、第5根开空，最后一根k线平仓：共2笔
+    signals = pd.DataFrame({'long': [0, 1, 0, 0, 0, 0, 0, 0], 'short': [0, 0, 0, 0, 1, 0, 0, 0],
+                            'exit_long': [0, 0, 0, 1, 0, 0, 0, 0], 'exit_short': [0] * 8}, dtype=bool)
+    pos = cal_position(signals)
+    assert np.isnan(pos.iloc[0])
+    curve = np.cumprod(np.full(len(pos), 1.01))
+    trades = trade_returns(curve, pos)
+    assert len(trades) == 2
+    np.testing.assert_allclose(trades, [1.01 ** 2 - 1, 1.01 ** 2 - 1])
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bench.synth import make_market
+from program.portfolio import backtest_portfolio
+from program.walkforward import walk_forward
+
+PARAMS = dict(back_hour=150, zscore_window=48, n_jobs=1)
+
+
+@pytest.fixture(scope='module')
+def market():
+    return make_market(n_symbols=8, n_bars=1200, n_clusters=2, cluster_size=4, n_gap=0, n_nan=0, n_late=0, seed=4)
+
+
+def test_backtest_portfolio_delisted(market):
+    times = market['S000-USDT']['candle_begin_time']
+    pairs = [('S000-USDT', 'S001-USDT'), ('S000-USDT', 'S002-USDT')]
+    curve, _ = backtest_portfolio(market, pairs, times.iloc[0], times.iloc[-1], **PARAMS)
+    last = 800
+    data = dict(market)
+    df = market['S001-USDT'].copy()
+    df.loc[last + 1:, ['open', 'high', 'low', 'close']] = df['close'].iloc[last]
+    data['S001-USDT'] = df
+    delisted, attribution = backtest_portfolio(data, pairs, times.iloc[0], times.iloc[-1],
+                                               delisted={'S001-USDT': times.iloc[last]}, **PARAMS)
+    assert (curve['gross_exposure'].iloc[:last] > 0).any()
+    # 下架前与未下架一致，之后该币对空仓
+    pd.testing.assert_frame_equal(delisted.iloc[:last], curve.iloc[:last])
+    single, _ = backtest_portfolio(market, pairs[1:], times.iloc[0], times.iloc[-1], **PARAMS)
+    exposure = delisted['gross_exposure'].to_numpy() * delisted['equity_curve'].to_numpy()
+    expected = single['gross_exposure'].to_numpy() * single['equity_curve'].to_numpy() / 2
+    np.testing.assert_allclose(exposure[last + 1:], expected[last + 1:], rtol=1e-9)
+    assert attribution['base'].tolist() == ['S000-USDT', 'S000-USDT']
+
+
+def test_walk_forward_keeps_delisted_pairs(market):
+    start_time, end_time = market['S000-USDT']['candle_begin_time'].iloc[[0, -1]]
+    kw = dict(formation_hours=300, trade_hours=200, top_n=6, back_hour=150, zscore_window=48, n_jobs=1)
+    curve, attribution = walk_forward(market, start_time, end_time, **kw)
+    data = dict(market)
+    data['S001-USDT'] = market['S001-USDT'].iloc[:800]
+    delisted_curve, delisted_attribution = walk_forward(data, start_time, end_time, **kw)
+    delist_time = market['S001-USDT']['candle_begin_time'].iloc[799]
+    # 下架所在交易期及之前，币对选择不变：中途下架的币对照常选入，不按交易期内的数据事后剔除
+    cols = ['trade_start', 'base', 'target']
+    pd.testing.assert_frame_equal(delisted_attribution.loc[delisted_attribution['trade_start'] <= delist_time, cols],
+                                  attribution.loc[attribution['trade_start'] <= delist_time, cols])
+    # 第三个交易期为 [700, 900)
+    assert ((delisted_attribution['trade_start'] == market['S000-USDT']['candle_begin_time'].iloc[700]) &
+            (delisted_attribution['target'] == 'S001-USDT')).any()
+    before = curve['candle_begin_time'] < delist_time
+    np.testing.assert_array_equal(delisted_curve['equity_curve'][before], curve['equity_curve'][before])
@@ -1,41 +1,85 @@
 from typing import Dict
+import numpy as np
 import pandas as pd
 from joblib import Parallel, delayed
 
-import config
 import time
 import itertools
 
-from program.analyse import process_pair
-from program.common import extract_col
+from program import metrics
+from program.analyse import process_pair, process_pair_panel, scan_pairs
+from program.cache import ResultCache
+from program.common import SymbolIndex, build_index, extract_col
+from program.jobs import JobStore, run_jobs
+from program.compact import PRICE_DTYPE
+from program.panel import PricePanel
+from program.store import load_data
 
 
-def get_cointegrated_pairs(all_df: Dict[str, pd.DataFrame],
-                           start_time: pd.Timestamp, end_time: pd.Timestamp, n_jobs=-1, parallel=True):
+def complete_series(all_df: Dict[str, pd.DataFrame | SymbolIndex], start_time, end_time,
+                    timeframe: str | None = None) -> Dict[str, pd.Series]:
+    """
+    数据完整的币种的收盘价：首尾k线存在、无空值、中间不缺k线（SymbolIndex.covers no_gap），其余币种过滤
+    """
+    complete = {}
+    for symbol, df in all_df.items():
+        index = (df if isinstance(df, SymbolIndex) else SymbolIndex(df, symbol)).resampled(timeframe)
+        if index.covers(['close'], start_time, end_time, no_gap=True):
+            complete[symbol] = extract_col(index, 'close', start_time, end_time)
+    return complete
+
+
+def get_cointegrated_pairs(all_df: Dict[str, pd.DataFrame | SymbolIndex],
+                           start_time: pd.Timestamp, end_time: pd.Timestamp, n_jobs=-1, parallel=True,
+                           matrix=False, cache: ResultCache | None = None, compact=False,
+                           store: JobStore | None = None, timeframe: str | None = None):
+    """
+    批量计算协整对
+    :param matrix: True 时使用矩阵化扫描 scan_pairs，逐级淘汰后批量 adf，并打印各级淘汰数量
+    :param cache: 结果缓存，数据未变化时跳过统计计算
+    :param compact: True 时共享价格矩阵、扫描中间结果为 float32，每个 worker 峰值内存约减半
+    :param store: 并行时逐对结果追加写入的文件，中断后重新运行跳过已完成的币对
+    :param timeframe: k线周期，如 '4h'，各币种重采样一次并缓存，多次扫描共用
+    """
     symbols = all_df.keys()
     # 进行币对组合，排除自身组合
     combinations = list(itertools.combinations(symbols, 2))
 
-    # 构建入参列表
-    arg_list = []
-    all_df_range = {}
-    for symbol, df in all_df.items():
-        all_df_range[symbol] = extract_col(all_df[symbol], 'close', start_time, end_time)
-
-    for symbol1, symbol2 in combinations:
-        base = all_df_range[symbol1]
-        target = all_df_range[symbol2]
-        arg_list.append((symbol1, symbol2, base, target))
-
-    # 批量协整行分析
-    if parallel:
-        # 使用 joblib 并行处理
-        results = Parallel(n_jobs=n_jobs)(delayed(process_pair)(arg) for arg in arg_list)
+    if matrix:
+        # 数据不完整的币种整体跳过
+        complete = complete_series(all_df, start_time, end_time, timeframe)
+        df_coint, stats = scan_pairs(pd.DataFrame(complete), cache=cache, compact=compact)
+        stats = {'skip': len(combinations) - stats['pairs'], **stats}
+        print(' '.join(f'{k}: {v}' for k, v in stats.items()))
+        coint_pair_list = df_coint.to_dict('records')
+    elif parallel:
+        # 价格放入共享矩阵，worker 按名称挂载，任务参数只传币种下标
+        complete = complete_series(all_df, start_time, end_time, timeframe)
+        with PricePanel.create(pd.DataFrame(complete), dtype=PRICE_DTYPE if compact else np.float64) as panel:
+            arg_list = []
+            for symbol1, symbol2 in combinations:
+                if symbol1 not in complete or symbol2 not in complete:
+                    metrics.count('process_pair', 'skip')
+                    continue
+                arg_list.append((symbol1, symbol2, panel.name, panel.loc(symbol1), panel.loc(symbol2)))
+            if store is not None:
+                run_jobs(process_pair_panel, ((f'{arg[0]}_{arg[1]}', (arg, cache)) for arg in arg_list), store,
+                         n_jobs=n_jobs)
+                results = store.values()
+            else:
+                # 使用 joblib 并行处理
+                # worker 内的淘汰计数、环节耗时随结果返回，合并到主进程的报告
+                results = Parallel(n_jobs=n_jobs)(delayed(metrics.recorded(process_pair_panel))(arg, cache)
+                                                  for arg in arg_list)
+                results = [metrics.collect(res) for res in results]
     else:
-        # 串行处理
-        results = [process_pair(arg) for arg in arg_list]
-    # 过滤None值
-    coint_pair_list = [res for res in results if res is not None]
+        # 串行处理，数据不完整的币种传 None，由 process_pair 计入 skip
+        complete = complete_series(all_df, start_time, end_time, timeframe)
+        results = [process_pair((symbol1, symbol2, complete.get(symbol1), complete.get(symbol2)), cache)
+                   for symbol1, symbol2 in combinations]
+    if not matrix:
+        # 过滤None值
+        coint_pair_list = [res for res in results if res is not None]
     if coint_pair_list:
         df_coint = pd.DataFrame(coint_pair_list)
         # 按 zero_crossings 排序
@@ -50,9 +94,16 @@ def get_cointegrated_pairs(all_df: Dict[str, pd.DataFrame],
 
 
 if __name__ == '__main__':
-    data = pd.read_pickle(config.swap_path)
+    # 时间索引只构建一次，之后各时间窗口的提取为二分查找
+    # 各环节耗时、淘汰原因计数、内存峰值，结束后写入 coint_pairs_report.json
+    metrics.enable()
+    data = build_index(load_data(cols=['candle_begin_time', 'close']))
     begin = time.time()
     start_date = '2024-05-01'
     end_date = '2024-06-01'
-    get_cointegrated_pairs(all_df=data, start_time=pd.Timestamp(start_date), end_time=pd.Timestamp(end_date))
+    cache = ResultCache()
+    get_cointegrated_pairs(all_df=data, start_time=pd.Timestamp(start_date), end_time=pd.Timestamp(end_date),
+                           matrix=True, cache=cache)
     print(f'cost {time.time() - begin}')
+    print(cache.stats())
+    print(metrics.format_report(metrics.save_report('coint_pairs_report.json')))
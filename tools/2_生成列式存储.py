@@ -0,0 +1,12 @@
+import time
+
+import config
+from program.store import convert_pickle, write_timeframes
+
+if __name__ == '__main__':
+    # swap_dict.pkl 转为列式存储，之后各入口按需映射币种和列
+    begin = time.time()
+    convert_pickle(config.swap_path, config.store_path)
+    # 4h、1d k线，load_data(timeframe=...) 直接映射
+    write_timeframes(['4h', '1d'], config.store_path)
+    print(f'cost {time.time() - begin}')